@@ -1,3 +1,20 @@
 from django.contrib import admin
+from .models import Place, GeocodeCache
 
-# Register your models here.
+
+class PlaceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'parent', 'latitude', 'longitude')
+    list_filter = ('kind',)
+    search_fields = ('name', 'slug')
+    prepopulated_fields = {'slug': ('name',)}
+    raw_id_fields = ('parent',)
+
+
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ('query', 'place', 'created_at')
+    search_fields = ('query',)
+    raw_id_fields = ('place',)
+
+
+admin.site.register(Place, PlaceAdmin)
+admin.site.register(GeocodeCache, GeocodeCacheAdmin)
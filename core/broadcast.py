@@ -0,0 +1,184 @@
+"""
+Push fundi map changes to connected clients.
+
+A Broadcaster fans events out to the subscriptions held by this process
+(one per open Server-Sent Events stream). Publishing goes through a
+pluggable backend named by ``settings.FUNDI_BROADCAST_BACKEND``:
+
+* ``core.broadcast.InProcessBackend`` delivers straight to local subscribers
+  (single worker, development).
+* ``core.broadcast.RedisBackend`` publishes on a Redis channel and every
+  worker relays what it hears to its own subscribers, so several ASGI
+  workers share one stream of changes. Needs the ``redis`` package.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from jobs import skills
+from users.signals import fundi_location_changed
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per slow client before the oldest are dropped
+SUBSCRIPTION_QUEUE_SIZE = 200
+
+
+def _in_bbox(bbox, latitude, longitude):
+    south, west, north, east = bbox
+    return south <= latitude <= north and west <= longitude <= east
+
+
+class Subscription:
+    """One client's filters plus the asyncio queue its stream reads from."""
+
+    def __init__(self, loop, bbox=None, skill_id=None, available_only=False):
+        self.loop = loop
+        self.bbox = bbox
+        # Catalogue skill the fundi must be linked to, as on fundi_locations_api
+        self.skill_id = skill_id
+        self.available_only = available_only
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def _visible(self, latitude, longitude):
+        return self.bbox is None or _in_bbox(self.bbox, latitude, longitude)
+
+    def message_for(self, event):
+        """Return the message this client should see for ``event``, or None."""
+        new = event.get('new')
+        if new and self._visible(new['latitude'], new['longitude']):
+            skill_ok = self.skill_id is None or self.skill_id in event.get('skill_ids', ())
+            if skill_ok and (new['available'] or not self.available_only):
+                return {'type': 'upsert', 'cursor': event['cursor'], 'fundi': new}
+        old = event.get('old')
+        if old and self._visible(old['latitude'], old['longitude']):
+            return {'type': 'remove', 'cursor': event['cursor'], 'id': event['id']}
+        return None
+
+    def offer(self, message):
+        # Called from whichever thread published; hop onto the stream's loop.
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+class Broadcaster:
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, **filters):
+        subscription = Subscription(asyncio.get_running_loop(), **filters)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def deliver(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            message = subscription.message_for(event)
+            if message is not None:
+                subscription.offer(message)
+
+
+class InProcessBackend:
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+
+    def publish(self, event):
+        self.broadcaster.deliver(event)
+
+
+class RedisBackend:
+    channel = 'fundiconnect:fundi-locations'
+
+    def __init__(self, broadcaster):
+        if redis is None:
+            raise ImproperlyConfigured('RedisBackend requires the redis package (pip install redis).')
+        self.broadcaster = broadcaster
+        self.client = redis.Redis.from_url(settings.FUNDI_BROADCAST_REDIS_URL)
+        threading.Thread(target=self._listen, name='fundi-broadcast', daemon=True).start()
+
+    def publish(self, event):
+        self.client.publish(self.channel, json.dumps(event))
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self.broadcaster.deliver(json.loads(message['data']))
+            except Exception:
+                logger.exception('Fundi broadcast listener failed, resubscribing')
+                time.sleep(1)
+
+
+_broadcaster = Broadcaster()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_broadcaster():
+    return _broadcaster
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            backend_class = import_string(settings.FUNDI_BROADCAST_BACKEND)
+            _backend = backend_class(_broadcaster)
+    return _backend
+
+
+def ensure_started():
+    """Start this worker's backend, so events published elsewhere reach its subscribers."""
+    get_backend()
+
+
+def _point(profile, state):
+    latitude, longitude, available, skills = state
+    return {
+        'id': profile.user_id,
+        'name': f'{profile.user.first_name} {profile.user.last_name}',
+        'latitude': latitude,
+        'longitude': longitude,
+        'skills': list(skills),
+        'location': profile.user.location,
+        'available': available,
+    }
+
+
+@receiver(fundi_location_changed)
+def publish_location_change(sender, profile, old, new, **kwargs):
+    event = {
+        'id': profile.user_id,
+        'cursor': profile.location_version,
+        'old': {'latitude': old[0], 'longitude': old[1]} if old else None,
+        'new': _point(profile, new) if new else None,
+        # What the fundi's skill_set will hold, for exact skill filters
+        'skill_ids': skills.skill_ids(new[3]) if new else [],
+    }
+    transaction.on_commit(lambda: get_backend().publish(event))
@@ -0,0 +1,174 @@
+"""
+Server-side clustering for the fundi map.
+
+FundiCluster rows hold per-cell counts and coordinate sums at a few geohash
+precisions. They are adjusted by deltas whenever a fundi's map state changes,
+so a zoomed-out map costs one read of O(clusters) rows instead of shipping
+every marker to the browser. The skill dimension is keyed on catalogue
+skill ids, as FundiProfile.skill_set is, so clusters agree with the points
+and the nearest-fundi filters.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.dispatch import receiver
+
+from core import geo
+from jobs import skills as catalogue
+from users.signals import fundi_location_changed
+
+# Geohash precisions kept in FundiCluster (~630km .. ~600m cells).
+CLUSTER_PRECISIONS = range(2, 7)
+# Above this zoom level the map gets individual markers instead of clusters.
+CLUSTER_MAX_ZOOM = 14
+
+
+def normalize_skill(skill):
+    return str(skill).strip().lower()[:50]
+
+
+def precision_for_zoom(zoom):
+    return min(max(geo.precision_for_zoom(zoom), CLUSTER_PRECISIONS[0]), CLUSTER_PRECISIONS[-1])
+
+
+def _contributions(state, sign, deltas, names):
+    if state is None:
+        return
+    latitude, longitude, available, skills = state
+    geohash = geo.encode(latitude, longitude, CLUSTER_PRECISIONS[-1])
+    keys = [''] + [str(skill_id) for skill_id in catalogue.skill_ids(skills, names)]
+    for precision in CLUSTER_PRECISIONS:
+        for skill in keys:
+            delta = deltas[(precision, geohash[:precision], skill)]
+            delta[0] += sign
+            delta[1] += sign if available else 0
+            delta[2] += sign * latitude
+            delta[3] += sign * longitude
+
+
+def apply_change(old, new, model=None):
+    """Move one fundi's contribution from the ``old`` to the ``new`` map state."""
+    apply_changes([(old, new)], model)
+
+
+def apply_changes(changes, model=None):
+    """Apply several (old, new) moves with one UPDATE per touched cluster."""
+    from core.models import FundiCluster
+    model = model or FundiCluster
+    deltas = defaultdict(lambda: [0, 0, 0.0, 0.0])
+    names = catalogue.names() if changes else None
+    for old, new in changes:
+        _contributions(old, -1, deltas, names)
+        _contributions(new, 1, deltas, names)
+    for (precision, cell, skill), (count, available, lat_sum, lng_sum) in deltas.items():
+        if not (count or available or lat_sum or lng_sum):
+            continue
+        updated = model.objects.filter(precision=precision, cell=cell, skill=skill).update(
+            count=F('count') + count,
+            available_count=F('available_count') + available,
+            latitude_sum=F('latitude_sum') + lat_sum,
+            longitude_sum=F('longitude_sum') + lng_sum,
+        )
+        if not updated:
+            model.objects.create(
+                precision=precision, cell=cell, skill=skill, count=count,
+                available_count=available, latitude_sum=lat_sum, longitude_sum=lng_sum,
+            )
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred():
+    """Collect the cluster changes signalled inside the block and apply
+    them together on exit (used by batched location writes)."""
+    _deferred.changes = []
+    try:
+        yield
+        changes = _deferred.changes
+    finally:
+        _deferred.changes = None
+    apply_changes(changes)
+
+
+@receiver(fundi_location_changed)
+def update_clusters(sender, old, new, **kwargs):
+    changes = getattr(_deferred, 'changes', None)
+    if changes is not None:
+        changes.append((old, new))
+    else:
+        apply_change(old, new)
+
+
+def rebuild(profile_model=None, cluster_model=None, names=None):
+    """Recompute every cluster from FundiProfile (backfill / drift repair).
+
+    Migrations pass ``names`` built from their historical Skill model.
+    """
+    from core.models import FundiCluster
+    from users.models import FundiProfile
+    profile_model = profile_model or FundiProfile
+    cluster_model = cluster_model or FundiCluster
+    names = catalogue.names() if names is None else names
+    deltas = defaultdict(lambda: [0, 0, 0.0, 0.0])
+    rows = profile_model.objects.filter(
+        user__active_role='fundi', latitude__isnull=False, longitude__isnull=False
+    ).values_list(
+        'latitude', 'longitude', 'availability', 'skills'
+    )
+    for latitude, longitude, available, skills in rows.iterator():
+        _contributions((float(latitude), float(longitude), available, tuple(skills or ())), 1, deltas, names)
+    cluster_model.objects.all().delete()
+    cluster_model.objects.bulk_create(
+        [
+            cluster_model(
+                precision=precision, cell=cell, skill=skill, count=count,
+                available_count=available, latitude_sum=lat_sum, longitude_sum=lng_sum,
+            )
+            for (precision, cell, skill), (count, available, lat_sum, lng_sum) in deltas.items()
+        ],
+        batch_size=500,
+    )
+    return len(deltas)
+
+
+def clusters_for_bbox(bbox, zoom, skill=None, available_only=False):
+    """Clusters visible in ``bbox`` at ``zoom``, with count, centroid and dominant skill.
+
+    ``skill`` is resolved through the catalogue; a skill missing from it
+    matches no fundis.
+    """
+    from core.models import FundiCluster
+    wanted = ''
+    if skill:
+        found = catalogue.resolve(skill)
+        if found is None:
+            return []
+        wanted = str(found[0])
+    precision = precision_for_zoom(zoom)
+    cells = geo.cover(bbox, min(geo.precision_for_bbox(bbox, zoom), precision))
+    rows = FundiCluster.objects.filter(geo.prefix_q(cells, 'cell'), precision=precision, count__gt=0)
+    totals = {}
+    dominant = {}
+    for row in rows.values_list('cell', 'skill', 'count', 'available_count', 'latitude_sum', 'longitude_sum'):
+        cell, row_skill, count, available, lat_sum, lng_sum = row
+        shown = available if available_only else count
+        if row_skill == wanted:
+            totals[cell] = (shown, lat_sum / count, lng_sum / count)
+        if row_skill and shown and (cell not in dominant or shown > dominant[cell][1]):
+            dominant[cell] = (row_skill, shown)
+    skill_names = {str(skill_id): name for skill_id, name in catalogue.names().values()} if dominant else {}
+    return [
+        {
+            'cell': cell,
+            'count': shown,
+            'latitude': latitude,
+            'longitude': longitude,
+            'skill': skill_names.get(dominant.get(cell, (None,))[0]),
+        }
+        for cell, (shown, latitude, longitude) in sorted(totals.items())
+        if shown
+    ]
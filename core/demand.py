@@ -0,0 +1,118 @@
+"""
+Job-demand heatmap aggregates.
+
+JobDemandCell rows count open jobs per geohash cell, category and urgency at
+the same precisions as the fundi clusters. Job.save reports each change of
+a job's demand state (opened, closed, moved, recategorized...) and the
+matching cells are adjusted with F() deltas, so the heatmap endpoint reads
+O(cells) rows instead of grouping over the Job table.
+"""
+from collections import defaultdict
+
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core import geo
+from core.clustering import CLUSTER_PRECISIONS, precision_for_zoom
+
+# Columns of Job that make up its demand state
+STATE_FIELDS = ('status', 'latitude', 'longitude', 'category_id', 'urgency')
+
+
+def state(status, latitude, longitude, category_id, urgency):
+    """(latitude, longitude, category_id, urgency) of an open, located job, else None."""
+    if status != 'open' or latitude is None or longitude is None:
+        return None
+    return (float(latitude), float(longitude), category_id, urgency)
+
+
+def _contributions(job_state, sign, deltas):
+    if job_state is None:
+        return
+    latitude, longitude, category_id, urgency = job_state
+    geohash = geo.encode(latitude, longitude, CLUSTER_PRECISIONS[-1])
+    for precision in CLUSTER_PRECISIONS:
+        delta = deltas[(precision, geohash[:precision], category_id, urgency)]
+        delta[0] += sign
+        delta[1] += sign * latitude
+        delta[2] += sign * longitude
+
+
+def apply_change(old, new, model=None):
+    """Move one job's contribution from the ``old`` to the ``new`` state."""
+    from core.models import JobDemandCell
+    model = model or JobDemandCell
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    _contributions(old, -1, deltas)
+    _contributions(new, 1, deltas)
+    for (precision, cell, category_id, urgency), (count, lat_sum, lng_sum) in deltas.items():
+        if not (count or lat_sum or lng_sum):
+            continue
+        updated = model.objects.filter(
+            precision=precision, cell=cell, category_id=category_id, urgency=urgency
+        ).update(
+            count=F('count') + count,
+            latitude_sum=F('latitude_sum') + lat_sum,
+            longitude_sum=F('longitude_sum') + lng_sum,
+        )
+        if not updated:
+            model.objects.create(
+                precision=precision, cell=cell, category_id=category_id, urgency=urgency,
+                count=count, latitude_sum=lat_sum, longitude_sum=lng_sum,
+            )
+
+
+@receiver(post_delete, sender='jobs.Job')
+def remove_deleted_job(sender, instance, **kwargs):
+    apply_change(instance.demand_state(), None)
+
+
+def rebuild(job_model=None, cell_model=None):
+    """Recompute every demand cell from the Job table (backfill / drift repair)."""
+    from core.models import JobDemandCell
+    from jobs.models import Job
+    job_model = job_model or Job
+    cell_model = cell_model or JobDemandCell
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    for row in job_model.objects.filter(status='open').values_list(*STATE_FIELDS).iterator():
+        _contributions(state(*row), 1, deltas)
+    cell_model.objects.all().delete()
+    cell_model.objects.bulk_create(
+        [
+            cell_model(
+                precision=precision, cell=cell, category_id=category_id, urgency=urgency,
+                count=count, latitude_sum=lat_sum, longitude_sum=lng_sum,
+            )
+            for (precision, cell, category_id, urgency), (count, lat_sum, lng_sum) in deltas.items()
+        ],
+        batch_size=500,
+    )
+    return len(deltas)
+
+
+def heatmap(bbox, zoom, category=None, urgency=None):
+    """Open-job counts and centroids per cell visible in ``bbox`` at ``zoom``.
+
+    ``category`` is a category name; both filters are optional.
+    """
+    from core.models import JobDemandCell
+    precision = precision_for_zoom(zoom)
+    cells = geo.cover(bbox, min(geo.precision_for_bbox(bbox, zoom), precision))
+    rows = JobDemandCell.objects.filter(geo.prefix_q(cells, 'cell'), precision=precision, count__gt=0)
+    if category:
+        rows = rows.filter(category__name=category)
+    if urgency:
+        rows = rows.filter(urgency=urgency)
+    rows = rows.values('cell').annotate(
+        total=Sum('count'), lat_sum=Sum('latitude_sum'), lng_sum=Sum('longitude_sum')
+    ).order_by('cell')
+    return [
+        {
+            'cell': row['cell'],
+            'count': row['total'],
+            'latitude': row['lat_sum'] / row['total'],
+            'longitude': row['lng_sum'] / row['total'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,295 @@
+"""
+Materialized "recommended jobs" feed for each fundi.
+
+FundiJobFeed holds one row per (fundi, open job) pair worth showing: the
+job's category is one of the fundi's catalogue skills, the fundi has not
+applied, and the job is within FEED_RADIUS_KM (or either side has no
+location). Rows are rewritten for one job when it opens, closes, moves or
+changes category or urgency, for one fundi when their skills change, and
+dropped when the fundi applies. When a fundi gets FEED_MOVE_KM away from
+where their feed was last measured from (FundiFeedOrigin) only their rows
+whose distance changed are updated, dropped or added. Job changes and
+moves are applied on core.tasks once the saving transaction commits, so a
+save never waits on the feed. The dashboard then reads the top N rows off
+the (fundi, -score) index.
+
+The score never needs recomputing as time passes: it is the posting time in
+hours, plus a head start for urgency, minus HOURS_PER_KM for every km away.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from core import demand, geo, tasks
+from users.signals import fundi_location_changed
+
+FEED_RADIUS_KM = 25
+# Moves shorter than this keep a fundi's feed as it is
+FEED_MOVE_KM = 1
+URGENCY_HOURS = {'low': 0, 'medium': 12, 'high': 36, 'urgent': 72}
+HOURS_PER_KM = 2.0
+# Distance assumed when the job or the fundi has no location
+UNKNOWN_DISTANCE_KM = FEED_RADIUS_KM
+
+# Columns of Job that decide which feeds it is in: the heatmap's, as it happens
+STATE_FIELDS = demand.STATE_FIELDS
+
+
+def state(status, latitude, longitude, category_id, urgency):
+    """What the feeds show of a job: None unless it is open and categorized."""
+    if status != 'open' or category_id is None:
+        return None
+    point = None if latitude is None or longitude is None else (float(latitude), float(longitude))
+    return (point, category_id, urgency)
+
+
+def score(created_at, urgency, distance_km):
+    if distance_km is None:
+        distance_km = UNKNOWN_DISTANCE_KM
+    return created_at.timestamp() / 3600 + URGENCY_HOURS.get(urgency, 0) - distance_km * HOURS_PER_KM
+
+
+def _distance(job_latitude, job_longitude, fundi_latitude, fundi_longitude):
+    # Always measured from the job, so both refresh paths store the same score
+    if None in (job_latitude, job_longitude, fundi_latitude, fundi_longitude):
+        return None
+    return geo.distance_km(job_latitude, job_longitude, fundi_latitude, fundi_longitude)
+
+
+def _nearby(queryset, latitude, longitude):
+    """Rows within the feed radius of a point, plus rows with no location."""
+    if latitude is None or longitude is None:
+        return queryset
+    south, west, north, east = geo.radius_bbox(latitude, longitude, FEED_RADIUS_KM)
+    return queryset.filter(
+        Q(latitude__isnull=True) | Q(longitude__isnull=True)
+        | Q(latitude__range=(south, north), longitude__range=(west, east))
+    )
+
+
+def refresh_job(job):
+    """Rewrite every feed row of one job."""
+    from core.models import FundiJobFeed
+    from users.models import FundiProfile
+    FundiJobFeed.objects.filter(job_id=job.pk).delete()
+    if job.feed_state() is None:
+        return 0
+    profiles = _nearby(
+        FundiProfile.objects.filter(skill_set__category=job.category_id), job.latitude, job.longitude
+    ).exclude(user_id=job.customer_id).exclude(user__job_applications__job=job)
+    rows = []
+    for user_id, latitude, longitude in profiles.values_list('user_id', 'latitude', 'longitude').distinct():
+        distance = _distance(job.latitude, job.longitude, latitude, longitude)
+        if distance is None or distance <= FEED_RADIUS_KM:
+            rows.append(FundiJobFeed(
+                fundi_id=user_id, job_id=job.pk, distance_km=distance,
+                score=score(job.created_at, job.urgency, distance),
+            ))
+    # A fundi's move queued meanwhile may have added some of these already
+    FundiJobFeed.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+    return len(rows)
+
+
+def refresh_job_later(job):
+    """Rewrite ``job``'s feed rows in the background once it is committed."""
+    transaction.on_commit(lambda: tasks.enqueue(_refresh_job, job.pk))
+
+
+def _refresh_job(job_id):
+    from core.models import FundiJobFeed
+    from jobs.models import Job
+    job = Job.objects.filter(pk=job_id).first()
+    if job is None:
+        FundiJobFeed.objects.filter(job_id=job_id).delete()
+        return 0
+    with transaction.atomic():
+        return refresh_job(job)
+
+
+def _candidate_jobs(profile, job_model):
+    """Open jobs in the fundi's skills that they could still take."""
+    return job_model.objects.filter(status='open', category__skills__fundis=profile).exclude(
+        customer_id=profile.user_id
+    ).exclude(applications__fundi_id=profile.user_id)
+
+
+def _point(latitude, longitude):
+    return None if latitude is None or longitude is None else (float(latitude), float(longitude))
+
+
+def _set_origin(profile):
+    from core.models import FundiFeedOrigin
+    latitude, longitude = _point(profile.latitude, profile.longitude) or (None, None)
+    FundiFeedOrigin.objects.update_or_create(
+        fundi_id=profile.user_id, defaults={'latitude': latitude, 'longitude': longitude}
+    )
+
+
+def refresh_fundi(profile, job_model=None, feed_model=None):
+    """Rewrite one fundi's feed."""
+    from core.models import FundiJobFeed
+    from jobs.models import Job
+    if feed_model is None:
+        # Migrations pass historical models; core.0006 records their origins
+        _set_origin(profile)
+    job_model = job_model or Job
+    feed_model = feed_model or FundiJobFeed
+    feed_model.objects.filter(fundi_id=profile.user_id).delete()
+    jobs = _nearby(_candidate_jobs(profile, job_model), profile.latitude, profile.longitude)
+    rows = []
+    for job_id, latitude, longitude, urgency, created_at in jobs.values_list(
+        'pk', 'latitude', 'longitude', 'urgency', 'created_at'
+    ).distinct():
+        distance = _distance(latitude, longitude, profile.latitude, profile.longitude)
+        if distance is None or distance <= FEED_RADIUS_KM:
+            rows.append(feed_model(
+                fundi_id=profile.user_id, job_id=job_id, distance_km=distance,
+                score=score(created_at, urgency, distance),
+            ))
+    feed_model.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def top(user, limit, within_km=None):
+    """The user's best ``limit`` jobs, each with its ``distance_km``."""
+    from core.models import FundiJobFeed
+    entries = FundiJobFeed.objects.filter(fundi=user).select_related('job')
+    if within_km:
+        entries = entries.filter(distance_km__lte=within_km)
+    jobs = []
+    for entry in entries[:limit]:
+        entry.job.distance_km = entry.distance_km
+        jobs.append(entry.job)
+    return jobs
+
+
+@receiver(post_save, sender='jobs.JobApplication')
+def drop_applied_job(sender, instance, created, **kwargs):
+    from core.models import FundiJobFeed
+    if created:
+        FundiJobFeed.objects.filter(fundi_id=instance.fundi_id, job_id=instance.job_id).delete()
+
+
+@receiver(m2m_changed, sender='users.FundiProfile_skill_set')
+def fundi_skills_changed(sender, instance, action, reverse, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        refresh_fundi(instance)
+
+
+def move_fundi(user_id):
+    """Bring a fundi's feed up to date with where they are now.
+
+    Rows of located jobs get their new distance and score, or are dropped
+    once out of range, and located jobs newly in range are added. Rows of
+    jobs without a location keep their place.
+    """
+    from core.models import FundiJobFeed
+    from jobs.models import Job
+    from users.models import FundiProfile
+    profile = FundiProfile.objects.filter(user_id=user_id).first()
+    if profile is None:
+        return
+    if profile.latitude is None or profile.longitude is None:
+        # Every job in their skills is now in range
+        with transaction.atomic():
+            refresh_fundi(profile)
+        return
+    entries = FundiJobFeed.objects.filter(fundi_id=user_id).select_related('job').only(
+        'distance_km', 'score', 'job__latitude', 'job__longitude', 'job__urgency', 'job__created_at'
+    )
+    kept, changed, dropped = set(), [], []
+    for entry in entries:
+        job = entry.job
+        distance = _distance(job.latitude, job.longitude, profile.latitude, profile.longitude)
+        if distance is not None and distance > FEED_RADIUS_KM:
+            dropped.append(entry.pk)
+            continue
+        kept.add(entry.job_id)
+        if distance != entry.distance_km:
+            entry.distance_km, entry.score = distance, score(job.created_at, job.urgency, distance)
+            changed.append(entry)
+    with transaction.atomic():
+        FundiJobFeed.objects.filter(pk__in=dropped).delete()
+        FundiJobFeed.objects.bulk_update(changed, ['distance_km', 'score'], batch_size=500)
+        jobs = _nearby(_candidate_jobs(profile, Job), profile.latitude, profile.longitude).filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).exclude(pk__in=kept)
+        rows = []
+        for job_id, latitude, longitude, urgency, created_at in jobs.values_list(
+            'pk', 'latitude', 'longitude', 'urgency', 'created_at'
+        ).distinct():
+            distance = _distance(latitude, longitude, profile.latitude, profile.longitude)
+            if distance <= FEED_RADIUS_KM:
+                rows.append(FundiJobFeed(
+                    fundi_id=user_id, job_id=job_id, distance_km=distance,
+                    score=score(created_at, urgency, distance),
+                ))
+        FundiJobFeed.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+        _set_origin(profile)
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred():
+    """Collect the moves signalled inside the block and check them against
+    their feed origins together on exit (used by batched location writes)."""
+    _deferred.moves = {}
+    try:
+        yield
+        moves = _deferred.moves
+    finally:
+        _deferred.moves = None
+    _check_moves(moves)
+
+
+def _check_moves(moves):
+    """Queue move_fundi for the fundis in ``moves`` ({user_id: point})
+    now FEED_MOVE_KM or more from where their feed was measured from."""
+    from core.models import FundiFeedOrigin
+    if not moves:
+        return
+    origins = {
+        user_id: _point(latitude, longitude)
+        for user_id, latitude, longitude in FundiFeedOrigin.objects.filter(fundi_id__in=moves).values_list(
+            'fundi_id', 'latitude', 'longitude'
+        )
+    }
+    moved = []
+    for user_id, point in moves.items():
+        if user_id in origins:
+            origin = origins[user_id]
+            if origin == point or (origin and point and geo.distance_km(*origin, *point) < FEED_MOVE_KM):
+                continue
+        moved.append(user_id)
+    for user_id in moved:
+        transaction.on_commit(lambda user_id=user_id: tasks.enqueue(move_fundi, user_id))
+
+
+@receiver(fundi_location_changed)
+def fundi_moved(sender, profile, old, new, **kwargs):
+    old_point, new_point = old and old[:2], new and new[:2]
+    if old_point == new_point:
+        return
+    moves = getattr(_deferred, 'moves', None)
+    if moves is not None:
+        moves[profile.user_id] = new_point
+    else:
+        _check_moves({profile.user_id: new_point})
+
+
+def rebuild(profile_model=None, job_model=None, feed_model=None):
+    """Recompute every feed from scratch (backfill / drift repair)."""
+    from core.models import FundiJobFeed
+    from users.models import FundiProfile
+    profile_model = profile_model or FundiProfile
+    feed_model = feed_model or FundiJobFeed
+    feed_model.objects.all().delete()
+    return sum(
+        refresh_fundi(profile, job_model, feed_model) for profile in profile_model.objects.iterator()
+    )
@@ -0,0 +1,144 @@
+"""
+Resolve free-text locations ("Nairobi, Westlands", "westlands nbi") to a
+gazetteer Place.
+
+Strings are normalized, then matched against place names and aliases held
+in a per-process dict; estates win over towns, and an estate whose town is
+also mentioned wins over a same-named estate elsewhere. Places found for
+saved locations are stored in GeocodeCache. Misses, and anything looked up
+from search input, only go to the cache backend for LOOKUP_TIMEOUT, so
+arbitrary query strings never write to the database.
+
+Editing a Place bumps a version number in the cache. Every worker compares
+it with the version of its dict and rebuilds on a change, and cached
+lookups from older versions are ignored.
+"""
+import hashlib
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.text import slugify
+
+# Words that never help pick a place
+NOISE_WORDS = {'kenya', 'county', 'estate', 'area', 'near', 'the', 'in', 'at'}
+MAX_NGRAM = 3
+LOOKUP_TIMEOUT = 3600
+VERSION_KEY = 'gazetteer-version'
+
+# (version, names) of this worker
+_names = None
+_names_lock = threading.Lock()
+
+
+def normalize(text):
+    text = (text or '').lower().replace("'", '')
+    words = [w for w in re.split(r'[^a-z0-9]+', text) if w and w not in NOISE_WORDS]
+    return ' '.join(words)[:255]
+
+
+def build_names(place_model):
+    """Map normalized names and aliases to (place_id, kind, parent_id) entries."""
+    names = {}
+    for pk, name, kind, parent_id, aliases in place_model.objects.values_list(
+        'pk', 'name', 'kind', 'parent_id', 'aliases'
+    ):
+        for label in [name] + list(aliases or []):
+            names.setdefault(normalize(label), []).append((pk, kind, parent_id))
+    return names
+
+
+def match(normalized, names):
+    """Return the id of the most specific place mentioned in ``normalized``."""
+    words = normalized.split()
+    found = []
+    for size in range(MAX_NGRAM, 0, -1):
+        for start in range(len(words) - size + 1):
+            found.extend(names.get(' '.join(words[start:start + size]), []))
+    if not found:
+        return None
+    mentioned = {pk for pk, _, _ in found}
+    estates = [entry for entry in found if entry[1] == 'estate']
+    for pk, _, parent_id in estates:
+        if parent_id in mentioned:
+            return pk
+    if estates:
+        return estates[0][0]
+    return found[0][0]
+
+
+def version():
+    # Started from the clock, so a version lost from the cache is never reused
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def _bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _get_names():
+    global _names
+    current = version()
+    with _names_lock:
+        if _names is None or _names[0] != current:
+            from core.models import Place
+            _names = (current, build_names(Place))
+        return _names[1]
+
+
+def places_changed():
+    """Make every worker rebuild its names and forget earlier misses after a Place edit."""
+    # Now, for this transaction, and again once the place is visible to everyone
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def _lookup_key(normalized):
+    return f'geocode:{version()}:{hashlib.sha1(normalized.encode()).hexdigest()}'
+
+
+def resolve(text, persist=True):
+    """Return the Place for a free-text location, or None.
+
+    With ``persist`` a place found is stored in GeocodeCache; pass False for
+    search input so that a GET never writes.
+    """
+    from core.models import GeocodeCache, Place
+    normalized = normalize(text)
+    if not normalized:
+        return None
+    # query is unique: a bare LIMIT, as first()'s ORDER BY would sort on SQLite
+    cached = GeocodeCache.objects.select_related('place').filter(query=normalized, place__isnull=False)[:1]
+    if cached:
+        return cached[0].place
+    key = _lookup_key(normalized)
+    place_id = cache.get(key)
+    if place_id is None:
+        # 0 for a miss
+        place_id = match(normalized, _get_names()) or 0
+        cache.set(key, place_id, LOOKUP_TIMEOUT)
+    place = Place.objects.filter(pk=place_id).first() if place_id else None
+    if place is not None and persist:
+        GeocodeCache.objects.get_or_create(query=normalized, defaults={'place': place})
+    return place
+
+
+def load_places(place_model):
+    """Create the bundled towns and estates (used by the data migration)."""
+    from core.gazetteer_data import ESTATES, TOWNS
+    towns = {}
+    for name, latitude, longitude, aliases in TOWNS:
+        towns[name] = place_model.objects.create(
+            name=name, slug=slugify(name), kind='town',
+            latitude=latitude, longitude=longitude, aliases=aliases,
+        )
+    for town, name, latitude, longitude, aliases in ESTATES:
+        place_model.objects.create(
+            name=name, slug=slugify(f'{town} {name}'), kind='estate', parent=towns[town],
+            latitude=latitude, longitude=longitude, aliases=aliases,
+        )
@@ -0,0 +1,103 @@
+"""
+Offline gazetteer of Kenyan towns and the estates people type into location
+fields. Loaded into core.Place by migration; edit places in the admin after
+that. Coordinates are approximate centres.
+"""
+
+# (name, latitude, longitude, aliases)
+TOWNS = [
+    ('Nairobi', -1.286389, 36.817223, ['nbi', 'nrb', 'nairobi city']),
+    ('Mombasa', -4.043500, 39.668200, ['msa']),
+    ('Kisumu', -0.091700, 34.768000, ['ksm']),
+    ('Nakuru', -0.303100, 36.080000, ['nku']),
+    ('Eldoret', 0.514300, 35.269800, ['eld']),
+    ('Thika', -1.033300, 37.069300, []),
+    ('Machakos', -1.517700, 37.263400, []),
+    ('Nyeri', -0.420100, 36.947600, []),
+    ('Meru', 0.046300, 37.655900, []),
+    ('Kakamega', 0.282700, 34.751900, []),
+    ('Kisii', -0.681700, 34.766700, []),
+    ('Kericho', -0.368900, 35.286300, []),
+    ('Naivasha', -0.716700, 36.433300, []),
+    ('Malindi', -3.219200, 40.116900, []),
+    ('Kitale', 1.015700, 35.006200, []),
+    ('Garissa', -0.453200, 39.646100, []),
+    ('Nanyuki', 0.016700, 37.066700, []),
+    ('Embu', -0.531000, 37.450000, []),
+    ('Kiambu', -1.171400, 36.835600, []),
+    ('Ruiru', -1.146600, 36.960900, []),
+    ('Juja', -1.100000, 37.013000, []),
+    ('Kikuyu', -1.246300, 36.662900, []),
+    ('Limuru', -1.113600, 36.642200, []),
+    ('Kitengela', -1.473000, 36.959000, []),
+    ('Athi River', -1.456000, 36.978000, ['mavoko']),
+    ('Ngong', -1.361300, 36.655300, ['ngong town']),
+    ('Kajiado', -1.852400, 36.776800, []),
+    ('Bungoma', 0.563500, 34.560600, []),
+    ('Busia', 0.460800, 34.111500, []),
+    ('Lamu', -2.271700, 40.902000, []),
+    ('Voi', -3.396100, 38.556100, []),
+    ('Kilifi', -3.630500, 39.849900, []),
+    ('Ukunda', -4.279700, 39.594700, ['diani']),
+    ('Isiolo', 0.354600, 37.582200, []),
+    ('Narok', -1.078300, 35.860100, []),
+    ('Homa Bay', -0.527300, 34.457100, ['homabay']),
+    ('Migori', -1.063400, 34.473100, []),
+    ('Kitui', -1.366700, 38.010600, []),
+]
+
+# (town, name, latitude, longitude, aliases)
+ESTATES = [
+    ('Nairobi', 'Westlands', -1.267600, 36.810800, ['westie']),
+    ('Nairobi', 'Kilimani', -1.292100, 36.784000, []),
+    ('Nairobi', 'Kileleshwa', -1.280600, 36.784700, []),
+    ('Nairobi', 'Lavington', -1.277400, 36.769400, []),
+    ('Nairobi', 'Karen', -1.319700, 36.707300, []),
+    ('Nairobi', 'Langata', -1.338000, 36.760000, []),
+    ('Nairobi', 'Parklands', -1.260600, 36.816700, []),
+    ('Nairobi', 'Upper Hill', -1.298900, 36.815500, ['upperhill']),
+    ('Nairobi', 'CBD', -1.283300, 36.821900, ['city centre', 'city center', 'central business district']),
+    ('Nairobi', 'South B', -1.311000, 36.836000, []),
+    ('Nairobi', 'South C', -1.319000, 36.827000, []),
+    ('Nairobi', 'Embakasi', -1.319000, 36.900000, []),
+    ('Nairobi', 'Kasarani', -1.221000, 36.897000, []),
+    ('Nairobi', 'Roysambu', -1.218000, 36.888000, []),
+    ('Nairobi', 'Zimmerman', -1.211000, 36.894000, []),
+    ('Nairobi', 'Kahawa', -1.183000, 36.924000, ['kahawa west', 'kahawa sukari']),
+    ('Nairobi', 'Githurai', -1.203000, 36.913000, []),
+    ('Nairobi', 'Kayole', -1.276000, 36.916000, []),
+    ('Nairobi', 'Komarock', -1.270000, 36.910000, []),
+    ('Nairobi', 'Donholm', -1.297000, 36.889000, []),
+    ('Nairobi', 'Buruburu', -1.286000, 36.877000, ['buru buru']),
+    ('Nairobi', 'Umoja', -1.284000, 36.898000, []),
+    ('Nairobi', 'Utawala', -1.288000, 36.970000, []),
+    ('Nairobi', 'Eastleigh', -1.273000, 36.850000, []),
+    ('Nairobi', 'Pangani', -1.268000, 36.837000, []),
+    ('Nairobi', 'Ngara', -1.274000, 36.823000, []),
+    ('Nairobi', 'Kibera', -1.313300, 36.789200, []),
+    ('Nairobi', 'Dagoretti', -1.295000, 36.730000, []),
+    ('Nairobi', 'Kawangware', -1.287000, 36.748000, []),
+    ('Nairobi', 'Hurlingham', -1.296000, 36.797000, []),
+    ('Nairobi', 'Madaraka', -1.309000, 36.821000, []),
+    ('Nairobi', 'Industrial Area', -1.306000, 36.853000, []),
+    ('Nairobi', 'Runda', -1.218000, 36.808000, []),
+    ('Nairobi', 'Muthaiga', -1.248000, 36.830000, []),
+    ('Nairobi', 'Gigiri', -1.233000, 36.804000, []),
+    ('Nairobi', 'Spring Valley', -1.250000, 36.793000, []),
+    ('Kiambu', 'Ruaka', -1.209000, 36.778000, []),
+    ('Kajiado', 'Rongai', -1.396000, 36.760000, ['ongata rongai']),
+    ('Mombasa', 'Nyali', -4.025000, 39.713000, []),
+    ('Mombasa', 'Bamburi', -3.998000, 39.726000, []),
+    ('Mombasa', 'Shanzu', -3.974000, 39.747000, []),
+    ('Mombasa', 'Likoni', -4.081000, 39.661000, []),
+    ('Mombasa', 'Kisauni', -4.016000, 39.698000, []),
+    ('Mombasa', 'Changamwe', -4.026000, 39.630000, []),
+    ('Kilifi', 'Mtwapa', -3.942000, 39.744000, []),
+    ('Kisumu', 'Milimani', -0.102000, 34.754000, []),
+    ('Kisumu', 'Nyalenda', -0.107000, 34.768000, []),
+    ('Kisumu', 'Kondele', -0.087000, 34.773000, []),
+    ('Nakuru', 'Lanet', -0.300000, 36.150000, []),
+    ('Eldoret', 'Kapsoya', 0.520000, 35.295000, []),
+    ('Eldoret', 'Langas', 0.485000, 35.279000, []),
+    ('Thika', 'Makongeni', -1.050000, 37.090000, []),
+]
@@ -0,0 +1,274 @@
+"""
+Geohash helpers used to index fundi (and job) coordinates.
+
+A geohash interleaves longitude and latitude bits into a base32 string, so
+points that are close on the map share a string prefix. Storing the hash in
+an indexed CharField lets a viewport be answered with a handful of index
+range scans (one per covering cell) instead of a scan over every row.
+"""
+import math
+
+from django.db.models import Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {c: i for i, c in enumerate(BASE32)}
+
+# Precision stored on rows (~5m x 5m cells); queries use shorter prefixes.
+STORED_PRECISION = 9
+# Upper bound on the number of cells used to cover a viewport. Each cell is
+# one index range scan, so this caps the cost of a bbox query.
+MAX_COVER_CELLS = 32
+
+# Leaflet zoom level -> geohash prefix length used to cover the viewport.
+ZOOM_PRECISION = [
+    (5, 2),
+    (8, 3),
+    (10, 4),
+    (13, 5),
+    (15, 6),
+]
+MAX_PRECISION = 7
+
+
+def encode(latitude, longitude, precision=STORED_PRECISION):
+    """Return the geohash of a point."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    latitude, longitude = float(latitude), float(longitude)
+    chars = []
+    bit, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if longitude >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[ch])
+            bit, ch = 0, 0
+    return ''.join(chars)
+
+
+def decode_bounds(geohash):
+    """Return (south, west, north, east) of a geohash cell."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    even = True
+    for c in geohash:
+        value = _DECODE[c]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                if bit:
+                    lng_lo = mid
+                else:
+                    lng_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lng_lo, lat_hi, lng_hi
+
+
+def decode(geohash):
+    """Return the (latitude, longitude) centre of a geohash cell."""
+    south, west, north, east = decode_bounds(geohash)
+    return (south + north) / 2, (west + east) / 2
+
+
+def cell_size(precision):
+    """Return (height, width) in degrees of a cell at ``precision``."""
+    bits = precision * 5
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def parse_bbox(value):
+    """Parse a Leaflet ``toBBoxString()`` value: "west,south,east,north".
+
+    Returns (south, west, north, east) or raises ValueError.
+    """
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox must have four comma separated numbers')
+    west, south, east, north = parts
+    south, north = max(south, -90.0), min(north, 90.0)
+    west, east = max(west, -180.0), min(east, 180.0)
+    if south > north or west > east:
+        raise ValueError('bbox must be west,south,east,north')
+    return south, west, north, east
+
+
+def tile_bounds(z, x, y):
+    """Return (south, west, north, east) of the web mercator tile ``z/x/y``."""
+    n = 1 << z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError('tile is outside the map')
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return latitude(y + 1), x / n * 360.0 - 180.0, latitude(y), (x + 1) / n * 360.0 - 180.0
+
+
+def _cover_count(bbox, precision):
+    south, west, north, east = bbox
+    height, width = cell_size(precision)
+    rows = math.floor(north / height) - math.floor(south / height) + 1
+    cols = math.floor(east / width) - math.floor(west / width) + 1
+    return rows * cols
+
+
+def precision_for_zoom(zoom):
+    for max_zoom, precision in ZOOM_PRECISION:
+        if zoom <= max_zoom:
+            return precision
+    return MAX_PRECISION
+
+
+def precision_for_bbox(bbox, zoom=None):
+    """Pick the finest precision whose covering stays under MAX_COVER_CELLS.
+
+    ``zoom`` caps the precision so a zoomed-out map does not ask for cells
+    finer than it can display.
+    """
+    limit = precision_for_zoom(zoom) if zoom is not None else MAX_PRECISION
+    precision = 1
+    for candidate in range(1, limit + 1):
+        if _cover_count(bbox, candidate) > MAX_COVER_CELLS:
+            break
+        precision = candidate
+    return precision
+
+
+def cover(bbox, precision):
+    """Return the geohash cells of ``precision`` that cover ``bbox``."""
+    south, west, north, east = bbox
+    height, width = cell_size(precision)
+    cells = []
+    row = math.floor(south / height)
+    while row * height <= north:
+        lat = min((row + 0.5) * height, 90.0 - height / 2)
+        col = math.floor(west / width)
+        while col * width <= east:
+            lng = min((col + 0.5) * width, 180.0 - width / 2)
+            cells.append(encode(lat, lng, precision))
+            col += 1
+        row += 1
+    return sorted(set(cells))
+
+
+def prefix_q(cells, field='geohash'):
+    """Build a Q matching rows whose ``field`` starts with one of ``cells``.
+
+    Uses half-open string ranges rather than ``startswith`` so that SQLite
+    can satisfy each term with an index range scan ('{' sorts after 'z').
+    """
+    query = Q()
+    for cell in cells:
+        query |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '{'})
+    return query
+
+
+def bbox_q(bbox, zoom=None, field='geohash', lat_field='latitude', lng_field='longitude'):
+    """Q restricting rows to ``bbox`` via the geohash index plus exact bounds."""
+    south, west, north, east = bbox
+    cells = cover(bbox, precision_for_bbox(bbox, zoom))
+    return prefix_q(cells, field) & Q(**{
+        f'{lat_field}__gte': south,
+        f'{lat_field}__lte': north,
+        f'{lng_field}__gte': west,
+        f'{lng_field}__lte': east,
+    })
+
+
+# Length of one degree of latitude, and of longitude at the equator
+KM_PER_DEGREE = 111.32
+
+
+def radius_bbox(latitude, longitude, km):
+    """Return the (south, west, north, east) box enclosing a circle of ``km``."""
+    latitude, longitude = float(latitude), float(longitude)
+    dlat = km / KM_PER_DEGREE
+    dlng = km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (
+        max(latitude - dlat, -90.0), max(longitude - dlng, -180.0),
+        min(latitude + dlat, 90.0), min(longitude + dlng, 180.0),
+    )
+
+
+def distance_expression(latitude, longitude, lat_field='latitude', lng_field='longitude'):
+    """SQL expression for the km from a point to each row.
+
+    Equirectangular approximation: plain arithmetic that every backend can
+    evaluate, and well within 1% of the great-circle distance at city scale.
+    """
+    from django.db.models import FloatField
+    from django.db.models.functions import Cast, Sqrt
+    latitude, longitude = float(latitude), float(longitude)
+    dlat = Cast(lat_field, FloatField()) - latitude
+    dlng = (Cast(lng_field, FloatField()) - longitude) * math.cos(math.radians(latitude))
+    return Sqrt(dlat * dlat + dlng * dlng) * KM_PER_DEGREE
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """Python counterpart of distance_expression, for two points."""
+    latitude, longitude = float(latitude), float(longitude)
+    dlat = float(other_latitude) - latitude
+    dlng = (float(other_longitude) - longitude) * math.cos(math.radians(latitude))
+    return math.sqrt(dlat * dlat + dlng * dlng) * KM_PER_DEGREE
+
+
+def within_km(queryset, latitude, longitude, km, field='geohash', lat_field='latitude', lng_field='longitude'):
+    """Rows within ``km`` of a point, nearest first, annotated with ``distance_km``.
+
+    The geohash range scans over the enclosing box pick the candidates; the
+    distance is only computed for those.
+    """
+    bbox = radius_bbox(latitude, longitude, km)
+    return queryset.filter(bbox_q(bbox, None, field, lat_field, lng_field)).annotate(
+        distance_km=distance_expression(latitude, longitude, lat_field, lng_field)
+    ).filter(distance_km__lte=km).order_by('distance_km')
+
+
+def parse_km(value):
+    """A positive distance from a query parameter, or None."""
+    try:
+        km = float(value)
+    except (TypeError, ValueError):
+        return None
+    return km if 0 < km < math.inf else None
+
+
+def request_origin(request):
+    """The point to measure distances from: ``lat``/``lng`` query parameters,
+    else the signed-in user's fundi profile or account coordinates."""
+    try:
+        return float(request.GET['lat']), float(request.GET['lng'])
+    except (KeyError, ValueError):
+        pass
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    for source in (getattr(user, 'fundi_profile', None), user):
+        if source is not None and source.latitude is not None and source.longitude is not None:
+            return float(source.latitude), float(source.longitude)
+    return None
@@ -0,0 +1,115 @@
+"""
+Write-behind buffer for fundi location heartbeats.
+
+The heartbeat endpoint only records the latest ping per fundi in memory. A
+background thread flushes the buffer every FUNDI_HEARTBEAT_FLUSH_SECONDS:
+pings that do not move a fundi or change their availability are dropped,
+the rest go out as one bulk UPDATE with one batch of cluster deltas, and
+the usual fundi_location_changed signal still reaches the live map.
+
+Each worker keeps its own buffer. A ping lost in a crash is superseded by
+the fundi's next one, so nothing is persisted outside the database.
+"""
+import logging
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+COORDINATE_STEP = Decimal('0.000001')
+
+
+class HeartbeatBuffer:
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, user_id, latitude, longitude, available=None):
+        """Keep this ping, replacing any earlier one from the same fundi."""
+        point = (Decimal(latitude).quantize(COORDINATE_STEP), Decimal(longitude).quantize(COORDINATE_STEP))
+        with self._lock:
+            self._pending[user_id] = point + (available,)
+        self._start()
+
+    def _start(self):
+        interval = settings.FUNDI_HEARTBEAT_FLUSH_SECONDS
+        if not interval or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, args=(interval,), name='fundi-heartbeat', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Fundi heartbeat flush failed')
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write the buffered pings; returns the number of profiles updated."""
+        from users.models import FundiProfile
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        # Cheap unlocked pass so an idle fleet costs no writes at all
+        profiles = FundiProfile.objects.filter(user_id__in=pending)
+        moved = [profile.user_id for profile, _, _ in self._changes(profiles, pending)]
+        if not moved:
+            return 0
+        return self._write(moved, pending)
+
+    def _changes(self, profiles, pending):
+        for profile in profiles:
+            latitude, longitude, available = pending[profile.user_id]
+            old = profile.map_state()
+            profile.latitude, profile.longitude = latitude, longitude
+            if available is not None:
+                profile.availability = available
+            new = profile.map_state()
+            if new != old:
+                yield profile, old, new
+
+    def _write(self, user_ids, pending):
+        from core import clustering, feed, geo
+        from users.models import FundiProfile, next_location_version
+        from users.signals import deferred_tombstones, fundi_location_changed
+        with transaction.atomic():
+            # Taking the versions first locks the sequence, so profile saves
+            # cannot slip in between the read below and the bulk update.
+            last = next_location_version(len(user_ids))
+            profiles = FundiProfile.objects.select_related('user').filter(user_id__in=user_ids)
+            changes = list(self._changes(profiles, pending))
+            for version, (profile, _, _) in enumerate(changes, start=last - len(user_ids) + 1):
+                profile.geohash = geo.encode(profile.latitude, profile.longitude)
+                profile.location_version = version
+            FundiProfile.objects.bulk_update(
+                [profile for profile, _, _ in changes],
+                ['latitude', 'longitude', 'availability', 'geohash', 'location_version'],
+                batch_size=500,
+            )
+            with clustering.deferred(), feed.deferred(), deferred_tombstones():
+                for profile, old, new in changes:
+                    if profile.on_map():
+                        fundi_location_changed.send(sender=FundiProfile, profile=profile, old=old, new=new)
+        return len(changes)
+
+
+_buffer = HeartbeatBuffer()
+
+
+def get_buffer():
+    return _buffer
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import clustering
+
+
+class Command(BaseCommand):
+    help = 'Recompute the fundi map clusters from FundiProfile coordinates.'
+
+    def handle(self, *args, **options):
+        rows = clustering.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Done. Rebuilt {rows} cluster rows.'))
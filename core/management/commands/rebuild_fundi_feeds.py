@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import feed
+
+
+class Command(BaseCommand):
+    help = "Recompute every fundi's recommended job feed."
+
+    def handle(self, *args, **options):
+        rows = feed.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Done. Rebuilt {rows} feed entries.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import demand
+
+
+class Command(BaseCommand):
+    help = 'Recompute the job-demand heatmap cells from open jobs.'
+
+    def handle(self, *args, **options):
+        rows = demand.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Done. Rebuilt {rows} demand cells.'))
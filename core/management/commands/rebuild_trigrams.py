@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core import trigram
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trigram side table used for fuzzy matching on SQLite.'
+
+    def handle(self, *args, **options):
+        rows = trigram.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Done. Indexed {rows} trigrams.'))
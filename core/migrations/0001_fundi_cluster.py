@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:06
+
+from django.db import migrations, models
+
+
+def build_clusters(apps, schema_editor):
+    from core import clustering
+    # No skill catalogue yet: users.0014 counts the skills once it exists
+    clustering.rebuild(apps.get_model('users', 'FundiProfile'), apps.get_model('core', 'FundiCluster'), names={})
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0011_fundi_location_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundiCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('cell', models.CharField(max_length=12)),
+                ('skill', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('available_count', models.IntegerField(default=0)),
+                ('latitude_sum', models.FloatField(default=0.0)),
+                ('longitude_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'unique_together': {('precision', 'cell', 'skill')},
+            },
+        ),
+        migrations.RunPython(build_clusters, migrations.RunPython.noop),
+    ]
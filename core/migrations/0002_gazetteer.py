@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def load_gazetteer(apps, schema_editor):
+    from core import gazetteer
+    gazetteer.load_places(apps.get_model('core', 'Place'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_fundi_cluster'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Place',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(max_length=120, unique=True)),
+                ('kind', models.CharField(choices=[('town', 'Town'), ('estate', 'Estate')], default='town', max_length=10)),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('aliases', models.JSONField(blank=True, default=list)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='core.place')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('place', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.place')),
+            ],
+        ),
+        migrations.RunPython(load_gazetteer, migrations.RunPython.noop),
+    ]
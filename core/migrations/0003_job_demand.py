@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_demand(apps, schema_editor):
+    from core import demand
+    demand.rebuild(apps.get_model('jobs', 'Job'), apps.get_model('core', 'JobDemandCell'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_gazetteer'),
+        ('jobs', '0008_job_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobDemandCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('cell', models.CharField(max_length=12)),
+                ('urgency', models.CharField(max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('latitude_sum', models.FloatField(default=0.0)),
+                ('longitude_sum', models.FloatField(default=0.0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='jobs.category')),
+            ],
+            options={
+                'unique_together': {('precision', 'cell', 'category', 'urgency')},
+            },
+        ),
+        migrations.RunPython(build_demand, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_feeds(apps, schema_editor):
+    from core import feed
+    feed.rebuild(
+        apps.get_model('users', 'FundiProfile'), apps.get_model('jobs', 'Job'), apps.get_model('core', 'FundiJobFeed')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_job_demand'),
+        ('jobs', '0009_skill'),
+        ('users', '0014_fundiprofile_skill_set'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundiJobFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('distance_km', models.FloatField(blank=True, null=True)),
+                ('fundi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='jobs.job')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['fundi', '-score'], name='core_feed_fundi_score')],
+                'unique_together': {('fundi', 'job')},
+            },
+        ),
+        migrations.RunPython(build_feeds, migrations.RunPython.noop),
+    ]
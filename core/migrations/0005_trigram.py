@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:08
+
+from django.db import migrations, models
+
+
+def build_trigrams(apps, schema_editor):
+    from core import trigram
+    trigram.install(schema_editor.connection)
+    trigram.rebuild(
+        {'jobs.job': apps.get_model('jobs', 'Job'), 'users.user': apps.get_model('users', 'User')},
+        apps.get_model('core', 'Trigram'),
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    from core import trigram
+    trigram.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_fundi_job_feed'),
+        ('jobs', '0011_savedsearch'),
+        ('users', '0014_fundiprofile_skill_set'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('gram', models.CharField(max_length=3)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['field', 'gram', 'object_id'], name='core_trigram_lookup')],
+                'unique_together': {('field', 'object_id', 'gram')},
+            },
+        ),
+        migrations.RunPython(build_trigrams, drop_trigram_indexes),
+    ]
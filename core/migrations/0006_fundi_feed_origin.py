@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-17 23:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_origins(apps, schema_editor):
+    # Every feed so far was built from the fundi's current coordinates
+    FundiProfile = apps.get_model('users', 'FundiProfile')
+    FundiFeedOrigin = apps.get_model('core', 'FundiFeedOrigin')
+    FundiFeedOrigin.objects.bulk_create([
+        FundiFeedOrigin(
+            fundi_id=user_id,
+            latitude=None if latitude is None or longitude is None else float(latitude),
+            longitude=None if latitude is None or longitude is None else float(longitude),
+        )
+        for user_id, latitude, longitude in FundiProfile.objects.values_list('user_id', 'latitude', 'longitude')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_trigram'),
+        ('users', '0015_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundiFeedOrigin',
+            fields=[
+                ('fundi', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(record_origins, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:21
+
+from django.db import migrations
+
+
+def recount_clusters(apps, schema_editor):
+    # Cluster rows were keyed by skill name; recount them by catalogue skill id
+    from core import clustering
+    from jobs import skills
+    clustering.rebuild(
+        apps.get_model('users', 'FundiProfile'), apps.get_model('core', 'FundiCluster'),
+        skills.build_names(apps.get_model('jobs', 'Skill')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_fundi_feed_origin'),
+        ('jobs', '0013_job_counters'),
+        ('users', '0016_tombstone_cell'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_clusters, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,133 @@
 from django.db import models
 
-# Create your models here.
+
+class FundiCluster(models.Model):
+    """Running totals of fundis per geohash cell, used for zoomed-out maps.
+
+    One row per (precision, cell, skill), ``skill`` being a catalogue skill
+    id; ``skill=''`` holds the totals for all fundis in the cell. Maintained
+    incrementally by core.clustering.
+    """
+    precision = models.PositiveSmallIntegerField()
+    cell = models.CharField(max_length=12)
+    skill = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField(default=0)
+    available_count = models.IntegerField(default=0)
+    latitude_sum = models.FloatField(default=0.0)
+    longitude_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        unique_together = ['precision', 'cell', 'skill']
+
+    def __str__(self):
+        return f"{self.cell} ({self.skill or 'all'}): {self.count} fundis"
+
+
+class JobDemandCell(models.Model):
+    """Running totals of open jobs per geohash cell, category and urgency.
+
+    Feeds the job-demand heatmap; maintained incrementally by core.demand.
+    """
+    precision = models.PositiveSmallIntegerField()
+    cell = models.CharField(max_length=12)
+    category = models.ForeignKey('jobs.Category', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    urgency = models.CharField(max_length=10)
+    count = models.IntegerField(default=0)
+    latitude_sum = models.FloatField(default=0.0)
+    longitude_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        unique_together = ['precision', 'cell', 'category', 'urgency']
+
+    def __str__(self):
+        return f"{self.cell} ({self.category_id or 'any'}, {self.urgency}): {self.count} open jobs"
+
+
+class FundiJobFeed(models.Model):
+    """One open job recommended to one fundi, ranked by ``score``.
+
+    Materialized so the fundi dashboard reads its top jobs off the
+    (fundi, -score) index; maintained incrementally by core.feed.
+    """
+    fundi = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='+')
+    job = models.ForeignKey('jobs.Job', on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    distance_km = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ['fundi', 'job']
+        indexes = [models.Index(fields=['fundi', '-score'], name='core_feed_fundi_score')]
+
+    def __str__(self):
+        return f"{self.job_id} for {self.fundi_id} ({self.score:.1f})"
+
+
+class FundiFeedOrigin(models.Model):
+    """Where a fundi was when core.feed last worked out their distances.
+
+    Moves are measured from here rather than from the previous save, so a
+    run of short moves still adds up to a feed update.
+    """
+    fundi = models.OneToOneField('users.User', on_delete=models.CASCADE, primary_key=True, related_name='+')
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Feed of {self.fundi_id} from ({self.latitude}, {self.longitude})"
+
+
+class Place(models.Model):
+    """A town or estate from the offline gazetteer (see core.gazetteer)."""
+    KIND_CHOICES = [
+        ('town', 'Town'),
+        ('estate', 'Estate'),
+    ]
+
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=120, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='town')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    aliases = models.JSONField(default=list, blank=True)  # Other spellings, e.g. ["nbi"]
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name}, {self.parent.name}" if self.parent_id else self.name
+
+    def save(self, *args, **kwargs):
+        from core import gazetteer
+        super().save(*args, **kwargs)
+        gazetteer.places_changed()
+
+    @property
+    def town(self):
+        return self.parent if self.parent_id else self
+
+    def area_ids(self):
+        """Ids of this place and everything inside it (a town and its estates)."""
+        return [self.pk] + list(self.children.values_list('pk', flat=True))
+
+
+class GeocodeCache(models.Model):
+    """Saved free-text locations resolved to a place, keyed by their normalized form."""
+    query = models.CharField(max_length=255, unique=True)
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.query} -> {self.place or 'unresolved'}"
+
+
+class Trigram(models.Model):
+    """One trigram of an indexed text column, for fuzzy matching on SQLite (see core.trigram)."""
+    field = models.CharField(max_length=30)  # e.g. "jobs.job.location"
+    object_id = models.BigIntegerField()
+    gram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ['field', 'object_id', 'gram']
+        indexes = [models.Index(fields=['field', 'gram', 'object_id'], name='core_trigram_lookup')]
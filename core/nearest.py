@@ -0,0 +1,185 @@
+"""
+Nearest-fundi search over an in-memory NumPy index.
+
+Each worker keeps fundi coordinates, availability and skills in contiguous
+arrays and answers k-nearest queries with a vectorized haversine plus
+``argpartition``. The index follows FundiProfile.location_version, so a
+refresh only reads the rows changed since the last one.
+
+Skills are keyed like FundiProfile.skill_set: by catalogue skill id, with
+synonyms resolved, and by normalized text only for skills missing from the
+catalogue. A query on a skill, or on a job category's catalogue skills,
+then picks the same fundis as filtering on skill_set.
+"""
+import threading
+import time
+
+import numpy as np
+
+from core.clustering import normalize_skill
+from jobs import skills as catalogue
+
+EARTH_RADIUS_KM = 6371.0088
+# Minimum seconds between checks of the location sequence
+REFRESH_INTERVAL = 2.0
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Distance in km from one point to arrays of points, all in radians."""
+    dlat = lats - lat
+    dlng = lngs - lng
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _skill_key(skill, names):
+    found = catalogue.lookup(skill, names)
+    return found[0] if found else normalize_skill(skill)
+
+
+class FundiIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.version = None
+        self.checked_at = 0.0
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.latitudes = np.empty(0, dtype=np.float64)
+        self.longitudes = np.empty(0, dtype=np.float64)
+        self.available = np.empty(0, dtype=bool)
+        self.valid = np.empty(0, dtype=bool)
+        # One bit per skill id, 64 skills per column
+        self.skill_bits = np.zeros((0, 1), dtype=np.uint64)
+        self.skill_ids = {}
+        self.row_of = {}
+
+    def reset(self):
+        """Forget everything; the next query reloads from the database."""
+        with self._lock:
+            self._clear()
+
+    def __len__(self):
+        return int(self.valid.sum())
+
+    def refresh(self, force=False):
+        from users.models import FundiProfile, RemovedFundiLocation, current_location_version
+        now = time.monotonic()
+        if not force and now - self.checked_at < REFRESH_INTERVAL:
+            return
+        with self._lock:
+            self.checked_at = now
+            version = current_location_version()
+            if version == self.version:
+                return
+            profiles = FundiProfile.objects.all()
+            removed = []
+            if self.version is not None:
+                profiles = profiles.filter(location_version__gt=self.version)
+                removed = RemovedFundiLocation.objects.filter(location_version__gt=self.version).values_list(
+                    'user_id', flat=True
+                )
+            rows = profiles.values_list(
+                'user_id', 'latitude', 'longitude', 'availability', 'skills', 'user__active_role'
+            )
+            self._apply(list(rows), list(removed))
+            self.version = version
+            # Rebuild from scratch once most rows are dead weight
+            if len(self.valid) > 64 and self.valid.sum() * 2 < len(self.valid):
+                self._clear()
+                self._apply(list(FundiProfile.objects.values_list(
+                    'user_id', 'latitude', 'longitude', 'availability', 'skills', 'user__active_role'
+                )), [])
+                self.version = version
+
+    def _skill_id(self, skill):
+        skill_id = self.skill_ids.get(skill)
+        if skill_id is None:
+            skill_id = self.skill_ids[skill] = len(self.skill_ids)
+            columns = skill_id // 64 + 1
+            if columns > self.skill_bits.shape[1]:
+                self.skill_bits = np.pad(self.skill_bits, ((0, 0), (0, columns - self.skill_bits.shape[1])))
+        return skill_id
+
+    def _apply(self, rows, removed):
+        # Tombstones first, so a profile deleted and recreated ends up valid
+        for user_id in removed:
+            i = self.row_of.get(user_id)
+            if i is not None:
+                self.valid[i] = False
+        new_rows = [row for row in rows if row[0] not in self.row_of]
+        if new_rows:
+            start = len(self.user_ids)
+            grow = len(new_rows)
+            self.user_ids = np.concatenate([self.user_ids, np.array([r[0] for r in new_rows], dtype=np.int64)])
+            self.latitudes = np.concatenate([self.latitudes, np.zeros(grow)])
+            self.longitudes = np.concatenate([self.longitudes, np.zeros(grow)])
+            self.available = np.concatenate([self.available, np.zeros(grow, dtype=bool)])
+            self.valid = np.concatenate([self.valid, np.zeros(grow, dtype=bool)])
+            self.skill_bits = np.concatenate(
+                [self.skill_bits, np.zeros((grow, self.skill_bits.shape[1]), dtype=np.uint64)]
+            )
+            for offset, row in enumerate(new_rows):
+                self.row_of[row[0]] = start + offset
+        names = catalogue.names()
+        for user_id, latitude, longitude, availability, skills, active_role in rows:
+            i = self.row_of[user_id]
+            has_point = latitude is not None and longitude is not None and active_role == 'fundi'
+            self.valid[i] = has_point
+            if not has_point:
+                continue
+            self.latitudes[i] = np.radians(float(latitude))
+            self.longitudes[i] = np.radians(float(longitude))
+            self.available[i] = availability
+            skill_ids = [self._skill_id(_skill_key(s, names)) for s in skills or () if str(s).strip()]
+            self.skill_bits[i] = 0
+            for skill_id in skill_ids:
+                self.skill_bits[i, skill_id // 64] |= np.uint64(1 << (skill_id % 64))
+
+    def nearest(self, latitude, longitude, k=20, skill=None, available_only=True, max_km=None, skill_ids=None):
+        """Return up to ``k`` (user_id, distance_km) pairs, closest first.
+
+        ``skill`` (a typed skill) and ``skill_ids`` (catalogue ids) keep
+        fundis with any of those skills.
+        """
+        self.refresh()
+        lat, lng = np.radians(float(latitude)), np.radians(float(longitude))
+        keys = list(skill_ids or ())
+        if skill:
+            keys.append(_skill_key(skill, catalogue.names()))
+        with self._lock:
+            mask = self.valid.copy()
+            if available_only:
+                mask &= self.available
+            if skill or skill_ids is not None:
+                columns = [self.skill_ids[key] for key in keys if key in self.skill_ids]
+                if not columns:
+                    return []
+                offered = np.zeros(len(mask), dtype=bool)
+                for column in columns:
+                    offered |= (self.skill_bits[:, column // 64] & np.uint64(1 << (column % 64))) != 0
+                mask &= offered
+            if max_km is not None:
+                # Cheap latitude band before the trigonometry
+                band = max_km / EARTH_RADIUS_KM
+                mask &= np.abs(self.latitudes - lat) <= band
+            candidates = np.flatnonzero(mask)
+            distances = haversine_km(lat, lng, self.latitudes[candidates], self.longitudes[candidates])
+            user_ids = self.user_ids[candidates]
+        if max_km is not None:
+            keep = distances <= max_km
+            distances, user_ids = distances[keep], user_ids[keep]
+        if len(distances) > k:
+            top = np.argpartition(distances, k)[:k]
+            distances, user_ids = distances[top], user_ids[top]
+        order = np.argsort(distances, kind='stable')
+        return [(int(user_ids[i]), float(distances[i])) for i in order]
+
+
+_index = FundiIndex()
+
+
+def get_fundi_index():
+    """The per-worker index; callers share it across requests."""
+    return _index
@@ -0,0 +1,160 @@
+"""
+Compact binary encoding of fundi map payloads.
+
+The JSON map responses repeat every key, name, location and skill list for
+each marker. The packed form is columnar instead: one header, one table of
+distinct strings, then fixed-width columns. All integers are little-endian.
+
+Header (``HEADER``)::
+
+    magic       4s   b'FCM1'
+    flags       u8   FLAG_DELTA | FLAG_CLUSTERS
+    index_size  u8   2 or 4, width of every string index below
+    strings     u32  entries in the string table
+    rows        u32  fundis or clusters
+    removed     u32  ids in the trailing removed column
+    cursor      u64  location cursor, as in the JSON responses
+
+The string table follows: each entry is a u8 byte length and UTF-8 bytes
+(cut at 255 bytes). Then, for fundis::
+
+    id u32, latitude i32, longitude i32, available u8, name idx,
+    location idx, skill_count u8, then sum(skill_count) skill idx
+
+and for clusters::
+
+    count u32, latitude i32, longitude i32, skill idx ('' for none)
+
+Coordinates are degrees * COORD_SCALE (about 1m). The ``removed`` user
+ids (u32) close the payload. static/fundi-packed.js decodes it in the
+browser.
+"""
+import struct
+
+import numpy as np
+
+MAGIC = b'FCM1'
+HEADER = struct.Struct('<4sBBIIIQ')
+CONTENT_TYPE = 'application/octet-stream'
+COORD_SCALE = 100000
+FLAG_DELTA = 1
+FLAG_CLUSTERS = 2
+MAX_SKILLS = 255
+
+
+class _StringTable:
+    def __init__(self):
+        self.index = {}
+
+    def __call__(self, value):
+        return self.index.setdefault(value or '', len(self.index))
+
+    @property
+    def dtype(self):
+        return '<u2' if len(self.index) <= 0xFFFF else '<u4'
+
+    def encode(self):
+        parts = []
+        for value in self.index:
+            data = value.encode('utf-8')[:255].decode('utf-8', 'ignore').encode('utf-8')
+            parts.append(bytes([len(data)]) + data)
+        return b''.join(parts)
+
+
+def _coordinates(values):
+    return np.round(np.asarray(values, dtype=np.float64) * COORD_SCALE).astype('<i4')
+
+
+def _pack(flags, strings, rows, columns, cursor, removed):
+    removed = np.asarray(list(removed), dtype='<u4')
+    header = HEADER.pack(
+        MAGIC, flags, np.dtype(strings.dtype).itemsize, len(strings.index), rows, len(removed), cursor
+    )
+    return b''.join([header, strings.encode()] + [column.tobytes() for column in columns] + [removed.tobytes()])
+
+
+def encode_fundis(fundis, cursor, delta=False, removed=()):
+    """Pack the ``fundis`` list built by fundi_locations_api."""
+    strings = _StringTable()
+    names = [strings(fundi['name']) for fundi in fundis]
+    locations = [strings(fundi['location']) for fundi in fundis]
+    skills = [[strings(str(skill)) for skill in (fundi['skills'] or [])[:MAX_SKILLS]] for fundi in fundis]
+    index = strings.dtype
+    columns = [
+        np.asarray([fundi['id'] for fundi in fundis], dtype='<u4'),
+        _coordinates([fundi['latitude'] for fundi in fundis]),
+        _coordinates([fundi['longitude'] for fundi in fundis]),
+        np.asarray([bool(fundi['available']) for fundi in fundis], dtype='u1'),
+        np.asarray(names, dtype=index),
+        np.asarray(locations, dtype=index),
+        np.asarray([len(ids) for ids in skills], dtype='u1'),
+        np.asarray([i for ids in skills for i in ids], dtype=index),
+    ]
+    return _pack(FLAG_DELTA if delta else 0, strings, len(fundis), columns, cursor, removed)
+
+
+def encode_clusters(clusters, cursor):
+    """Pack the cluster dicts returned by clustering.clusters_for_bbox."""
+    strings = _StringTable()
+    strings('')
+    skills = [strings(cluster['skill']) for cluster in clusters]
+    columns = [
+        np.asarray([cluster['count'] for cluster in clusters], dtype='<u4'),
+        _coordinates([cluster['latitude'] for cluster in clusters]),
+        _coordinates([cluster['longitude'] for cluster in clusters]),
+        np.asarray(skills, dtype=strings.dtype),
+    ]
+    return _pack(FLAG_CLUSTERS, strings, len(clusters), columns, cursor, ())
+
+
+def decode(data):
+    """Inverse of the encoders, returning the JSON response shape."""
+    magic, flags, index_size, string_count, rows, removed_count, cursor = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('not a packed map payload')
+    offset = HEADER.size
+    strings = []
+    for _ in range(string_count):
+        length = data[offset]
+        strings.append(data[offset + 1:offset + 1 + length].decode('utf-8'))
+        offset += 1 + length
+    index = '<u2' if index_size == 2 else '<u4'
+
+    def column(dtype, count=rows):
+        nonlocal offset
+        values = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += values.nbytes
+        return values.tolist()
+
+    if flags & FLAG_CLUSTERS:
+        counts, lats, lngs, skills = column('<u4'), column('<i4'), column('<i4'), column(index)
+        result = {'clusters': [
+            {
+                'count': counts[i],
+                'latitude': lats[i] / COORD_SCALE,
+                'longitude': lngs[i] / COORD_SCALE,
+                'skill': strings[skills[i]] or None,
+            }
+            for i in range(rows)
+        ]}
+    else:
+        ids, lats, lngs, available = column('<u4'), column('<i4'), column('<i4'), column('u1')
+        names, locations, skill_counts = column(index), column(index), column('u1')
+        skill_ids = iter(column(index, sum(skill_counts)))
+        result = {'fundis': [
+            {
+                'id': ids[i],
+                'name': strings[names[i]],
+                'latitude': lats[i] / COORD_SCALE,
+                'longitude': lngs[i] / COORD_SCALE,
+                'skills': [strings[next(skill_ids)] for _ in range(skill_counts[i])],
+                'location': strings[locations[i]],
+                'available': bool(available[i]),
+            }
+            for i in range(rows)
+        ]}
+    result['cursor'] = cursor
+    result['delta'] = bool(flags & FLAG_DELTA)
+    if flags & FLAG_DELTA:
+        result['removed'] = column('<u4', removed_count)
+    return result
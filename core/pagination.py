@@ -0,0 +1,155 @@
+"""
+Keyset ("cursor") pagination.
+
+Django's Paginator counts every row and skips to a page with OFFSET, so
+page 500 reads and throws away everything before it. CursorPaginator asks
+for the rows *after* the last one shown instead, e.g. "created_at, id below
+the previous page's last (created_at, id)", which an index answers in the
+same time however deep the reader goes.
+
+Cursors are opaque url-safe tokens holding the ordering values of the row at
+the edge of a page. The ordering comes from the queryset (or the model's
+Meta) with the primary key added as a tiebreaker; every key must be a
+non-null field or annotation name. Totals are optional and capped.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.db.models import Q
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return datetime.date.fromisoformat(value['d'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+        raise ValueError('unknown cursor value')
+    return value
+
+
+class CursorPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, total=None, total_capped=False):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+        self.total_capped = total_capped
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """Pages of ``per_page`` rows of ``queryset``, addressed by cursor tokens.
+
+    With ``count_limit`` each page also carries ``total``: the number of rows,
+    counted no further than ``count_limit`` (``total_capped`` is then True).
+    """
+
+    def __init__(self, queryset, per_page, ordering=None, count_limit=None):
+        keys = list(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+        if not all(isinstance(key, str) for key in keys):
+            raise ValueError('CursorPaginator needs field or annotation names to order by.')
+        pk_names = {'pk', queryset.model._meta.pk.name}
+        if not any(key.lstrip('-') in pk_names for key in keys):
+            keys.append('-pk' if keys and keys[0].startswith('-') else 'pk')
+        self.keys = keys
+        self.queryset = queryset.order_by(*keys)
+        self.per_page = per_page
+        self.count_limit = count_limit
+
+    def _values(self, obj):
+        values = []
+        for key in self.keys:
+            value = obj
+            for name in key.lstrip('-').split('__'):
+                value = getattr(value, name)
+            values.append(_encode_value(value))
+        return values
+
+    def _token(self, direction, obj):
+        data = json.dumps([direction, self._values(obj)], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+    def _parse(self, token):
+        """(direction, values) from a token, or None for a missing or bad one."""
+        if not token:
+            return None
+        try:
+            data = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            direction, values = json.loads(data)
+            values = [_decode_value(value) for value in values]
+        except (ValueError, TypeError):
+            return None
+        if direction not in ('n', 'p') or len(values) != len(self.keys):
+            return None
+        return direction, values
+
+    @staticmethod
+    def _beyond(keys, values):
+        """Rows strictly after ``values`` in the order given by ``keys``."""
+        condition = Q()
+        for i, key in enumerate(keys):
+            name = key.lstrip('-')
+            clause = Q(**{f"{name}__{'lt' if key.startswith('-') else 'gt'}": values[i]})
+            for earlier, value in zip(keys[:i], values):
+                clause &= Q(**{earlier.lstrip('-'): value})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        parsed = self._parse(cursor)
+        if parsed is None:
+            rows = list(self.queryset[:self.per_page + 1])
+            has_next, has_previous = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        elif parsed[0] == 'n':
+            rows = list(self.queryset.filter(self._beyond(self.keys, parsed[1]))[:self.per_page + 1])
+            has_next, has_previous = len(rows) > self.per_page, True
+            rows = rows[:self.per_page]
+        else:
+            # Walk backwards from the cursor, then put the rows back in order
+            reverse = [key[1:] if key.startswith('-') else f'-{key}' for key in self.keys]
+            rows = list(self.queryset.order_by(*reverse).filter(self._beyond(reverse, parsed[1]))[:self.per_page + 1])
+            has_next, has_previous = True, len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+        total, capped = None, False
+        if self.count_limit:
+            total = self.queryset[:self.count_limit + 1].count()
+            total, capped = min(total, self.count_limit), total > self.count_limit
+        return CursorPage(
+            rows,
+            next_cursor=self._token('n', rows[-1]) if has_next and rows else None,
+            previous_cursor=self._token('p', rows[0]) if has_previous and rows else None,
+            total=total,
+            total_capped=capped,
+        )
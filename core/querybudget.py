@@ -0,0 +1,132 @@
+"""
+Queries per request, N+1 detection and per-view query budgets.
+
+With settings.QUERY_INSPECTION on (the default under DEBUG),
+QueryInspectionMiddleware records every query a request runs, on every
+database. Queries are grouped by their SQL with the parameters left out. A
+lookup run once per row of a list then shows up as one SELECT template
+repeated many times: the N+1 pattern. Writes are not flagged, since some
+repeat by design (one demand cell per geohash precision). Views declare how
+many queries they may run with ``@query_budget(n)``.
+
+Responses carry X-Query-Count. They also carry X-Query-Warning, and the
+warning is logged, when a template repeats N_PLUS_ONE_THRESHOLD times or the
+view goes over its budget. Tests hold views to their budgets through
+``response.query_report`` (core.tests.QueryBudgetTests).
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 5
+MAX_HEADER = 500
+MAX_SQL = 120
+
+
+def template(sql):
+    """``sql`` with IN lists of any length folded together."""
+    return re.sub(r'%s(?:, %s)+', '%s, ...', ' '.join(sql.split()))
+
+
+def query_budget(queries):
+    """Declare the most queries a view may run per request."""
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+class QueryReport:
+    """Query templates run during one request, and how often."""
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.templates = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.templates[template(sql)] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return sum(self.templates.values())
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(template, times)] of SELECTs run at least ``threshold`` times, most first."""
+        return [
+            (sql, times) for sql, times in self.templates.most_common()
+            if times >= threshold and sql.upper().startswith('SELECT')
+        ]
+
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def warnings(self):
+        found = []
+        if self.over_budget():
+            found.append(f'{self.count} queries, budget {self.budget}')
+        for sql, times in self.repeated():
+            found.append(f'N+1: {times}x {sql[:MAX_SQL]}')
+        return found
+
+    def record(self):
+        """Context manager that feeds every database's queries to this report."""
+        stack = ExitStack()
+        for db in connections.all():
+            stack.enter_context(db.execute_wrapper(self))
+        return stack
+
+
+class QueryInspectionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not getattr(settings, 'QUERY_INSPECTION', False):
+            return self.get_response(request)
+        report = request.query_report = QueryReport()
+        with report.record():
+            response = self.get_response(request)
+        return self.finish(request, response, report)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'QUERY_INSPECTION', False):
+            return await self.get_response(request)
+        report = request.query_report = QueryReport()
+        # Connections belong to threads: record on the one sync_to_async runs
+        # this request's queries on
+        recording = await sync_to_async(report.record)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.close)()
+        return self.finish(request, response, report)
+
+    def finish(self, request, response, report):
+        response.query_report = report
+        response['X-Query-Count'] = str(report.count)
+        problems = report.warnings()
+        if problems:
+            response['X-Query-Warning'] = '; '.join(problems)[:MAX_HEADER]
+            logger.warning('%s %s: %s', request.method, request.path, '; '.join(problems))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        report = getattr(request, 'query_report', None)
+        if report is not None:
+            report.budget = getattr(view_func, 'query_budget', None)
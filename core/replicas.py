@@ -0,0 +1,128 @@
+"""
+Read replicas for the read-heavy views.
+
+Views wrapped in ``reads_from_replica`` (the job lists, the landing page and
+dashboards, the map APIs) send their reads to one of
+settings.DATABASE_REPLICAS, picked at random once per request. Every write,
+and every read anywhere else, goes to 'default'.
+
+Users must see their own writes. Once a request has written to the primary,
+the rest of its reads go there too. ReplicaPinMiddleware then sets a cookie
+that keeps the client on the primary for REPLICA_PIN_SECONDS, which should
+cover the replicas' lag. Sessions are always read from the primary, so a
+fresh login is never lost to a lagging replica.
+"""
+import functools
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+# Apps whose rows are always read from the primary
+PRIMARY_ONLY_APPS = {'sessions'}
+
+# The replica this request reads from, if any
+_replica = ContextVar('replica', default=None)
+# Whether this request has written to the primary
+_wrote = ContextVar('wrote', default=False)
+
+
+def _location(alias):
+    settings_dict = connections[alias].settings_dict
+    return settings_dict['HOST'], settings_dict['PORT'], settings_dict['NAME']
+
+
+def replicas():
+    # A replica that is the primary database itself (a test mirror of the
+    # SQLite test database) is read through the primary's connection, which
+    # also sees the test's open transaction
+    return [
+        alias for alias in getattr(settings, 'DATABASE_REPLICAS', [])
+        if alias not in connections or _location(alias) != _location(DEFAULT_DB_ALIAS)
+    ]
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica.get() is None:
+            return None
+        if _wrote.get() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            # Explicit, so related lookups don't follow a replica-read instance
+            return DEFAULT_DB_ALIAS
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in replicas():
+            return False
+        return None
+
+
+def reads_from_replica(view):
+    """Serve ``view``'s reads from a replica unless the client is pinned to the primary."""
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        aliases = replicas()
+        if not aliases or PIN_COOKIE in request.COOKIES:
+            return view(request, *args, **kwargs)
+        token = _replica.set(random.choice(aliases))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapped
+
+
+class ReplicaPinMiddleware:
+    """Pin a client to the primary for a while after any request that writes."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            _wrote.reset(token)
+        return self.pin(response, wrote)
+
+    async def __acall__(self, request):
+        # Writes made in sync_to_async threads come back through the context
+        token = _wrote.set(False)
+        try:
+            response = await self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            _wrote.reset(token)
+        return self.pin(response, wrote)
+
+    def pin(self, response, wrote):
+        if wrote and replicas():
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds(), httponly=True, samesite='Lax')
+        return response
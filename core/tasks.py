@@ -0,0 +1,60 @@
+"""
+In-process background queue for work that should not hold up a request,
+such as notification emails.
+
+One daemon worker thread per process drains the queue. Tasks are
+fire-and-forget and are lost if the process exits, so only queue work that
+is safe to drop. Set BACKGROUND_TASKS_INLINE to run tasks immediately in
+the caller instead.
+"""
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def enqueue(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on the background worker."""
+    if settings.BACKGROUND_TASKS_INLINE:
+        _run(func, args, kwargs)
+        return
+    _queue.put((func, args, kwargs))
+    _start()
+
+
+def drain():
+    """Block until every queued task has run."""
+    _queue.join()
+
+
+def _start():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name='background-tasks', daemon=True)
+            _worker.start()
+
+
+def _work():
+    while True:
+        func, args, kwargs = _queue.get()
+        try:
+            _run(func, args, kwargs)
+        finally:
+            close_old_connections()
+            _queue.task_done()
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(func, '__name__', func))
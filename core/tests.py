@@ -1,3 +1,1115 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import os
+import re
+import runpy
+import tempfile
+from asgiref.sync import iscoroutinefunction
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import broadcast, clustering, demand, feed, gazetteer, geo, heartbeat, packed, querybudget, replicas, trigram, views
+from core.models import FundiCluster, FundiFeedOrigin, FundiJobFeed, GeocodeCache, JobDemandCell, Place, Trigram
+from core.nearest import get_fundi_index
+from core.pagination import CursorPaginator
+from jobs import skills
+from jobs.models import Category, Job, JobApplication, Message, Payment
+from users.models import User, FundiProfile, Notification
+
+
+def make_fundi(username, latitude, longitude, **profile_fields):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pass')
+    user.roles = ['customer', 'fundi']
+    user.active_role = 'fundi'
+    user.save()
+    profile = FundiProfile.objects.create(user=user, latitude=latitude, longitude=longitude, **profile_fields)
+    return user, profile
+
+
+class GeohashTests(TestCase):
+    def test_encode_decode_round_trip(self):
+        lat, lng = geo.decode(geo.encode(-1.286389, 36.817223))
+        self.assertAlmostEqual(lat, -1.286389, places=4)
+        self.assertAlmostEqual(lng, 36.817223, places=4)
+
+    def test_cover_contains_points_inside_bbox(self):
+        bbox = (-1.35, 36.70, -1.20, 36.95)
+        cells = geo.cover(bbox, geo.precision_for_bbox(bbox))
+        self.assertLessEqual(len(cells), geo.MAX_COVER_CELLS)
+        point = geo.encode(-1.2921, 36.8219)
+        self.assertTrue(any(point.startswith(cell) for cell in cells))
+
+
+class FundiLocationsApiTests(TestCase):
+    def setUp(self):
+        self.westlands, _ = make_fundi('westlands', -1.2676, 36.8108, skills=['Plumbing'])
+        self.mombasa, _ = make_fundi('mombasa', -4.0435, 39.6682, skills=['Electrical'])
+
+    def test_profile_save_sets_geohash(self):
+        self.assertTrue(self.westlands.fundi_profile.geohash.startswith(geo.encode(-1.2676, 36.8108, 5)))
+
+    def test_without_bbox_returns_all_fundis(self):
+        resp = self.client.get(reverse('fundi_locations_api'))
+        ids = {f['id'] for f in resp.json()['fundis']}
+        self.assertEqual(ids, {self.westlands.id, self.mombasa.id})
+
+    def test_bbox_limits_result_to_viewport(self):
+        resp = self.client.get(reverse('fundi_locations_api'), {'bbox': '36.70,-1.35,36.95,-1.20', 'zoom': 12})
+        ids = [f['id'] for f in resp.json()['fundis']]
+        self.assertEqual(ids, [self.westlands.id])
+
+    def test_invalid_bbox_is_rejected(self):
+        resp = self.client.get(reverse('fundi_locations_api'), {'bbox': 'nairobi'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class FundiLocationsDeltaTests(TestCase):
+    def setUp(self):
+        self.fundi, self.profile = make_fundi('delta', -1.2676, 36.8108, skills=['Plumbing'])
+        self.url = reverse('fundi_locations_api')
+
+    def test_unchanged_cursor_returns_304(self):
+        cursor = self.client.get(self.url).json()['cursor']
+        self.assertEqual(self.client.get(self.url, {'since': cursor}).status_code, 304)
+
+    def test_delta_returns_only_changed_fundis(self):
+        other, _ = make_fundi('other', -1.30, 36.80)
+        cursor = self.client.get(self.url).json()['cursor']
+        self.profile.latitude = -1.2700
+        self.profile.save()
+        data = self.client.get(self.url, {'since': cursor}).json()
+        self.assertTrue(data['delta'])
+        self.assertEqual([f['id'] for f in data['fundis']], [self.fundi.id])
+        self.assertGreater(data['cursor'], cursor)
+
+    def test_unavailable_and_deleted_fundis_are_removed(self):
+        other, other_profile = make_fundi('gone', -1.30, 36.80)
+        cursor = self.client.get(self.url).json()['cursor']
+        self.profile.availability = False
+        self.profile.save()
+        other_profile.delete()
+        data = self.client.get(self.url, {'since': cursor, 'available': 'true'}).json()
+        self.assertEqual(data['fundis'], [])
+        self.assertEqual(data['removed'], sorted([self.fundi.id, other.id]))
+
+    def test_removals_stay_inside_the_viewport(self):
+        nairobi = {'bbox': '36.70,-1.35,36.95,-1.20', 'zoom': 12}
+        _, coast = make_fundi('coast', -4.0435, 39.6682)
+        cursor = self.client.get(self.url, nairobi).json()['cursor']
+        coast.latitude = -4.0500
+        coast.save()
+        coast.delete()
+        data = self.client.get(self.url, {**nairobi, 'since': cursor}).json()
+        self.assertEqual((data['fundis'], data['removed']), ([], []))
+        # Several moves between polls: the cell it was seen in still counts
+        for latitude in (-1.5, -2.5, -4.0):
+            self.profile.latitude = latitude
+            self.profile.save()
+        data = self.client.get(self.url, {**nairobi, 'since': cursor}).json()
+        self.assertEqual((data['fundis'], data['removed']), ([], [self.fundi.id]))
+
+    def test_role_and_name_changes_reach_delta_clients(self):
+        cursor = self.client.get(self.url).json()['cursor']
+        fundi = User.objects.get(pk=self.fundi.pk)
+        fundi.switch_role('customer')
+        data = self.client.get(self.url, {'since': cursor}).json()
+        self.assertEqual((data['fundis'], data['removed']), ([], [self.fundi.id]))
+        cursor = data['cursor']
+        fundi.active_role = 'fundi'
+        fundi.first_name = 'Juma'
+        fundi.save()
+        data = self.client.get(self.url, {'since': cursor}).json()
+        self.assertEqual([f['name'] for f in data['fundis']], ['Juma '])
+        fundi.phone_number = '0700000000'
+        fundi.save()
+        self.assertEqual(self.client.get(self.url, {'since': data['cursor']}).status_code, 304)
+
+    def test_saves_the_map_does_not_show_keep_the_cursor(self):
+        cursor = self.client.get(self.url).json()['cursor']
+        profile = FundiProfile.objects.get(pk=self.profile.pk)
+        profile.description = 'Twenty years of pipes'
+        profile.save()
+        profile.verification_status = 'approved'
+        profile.save(update_fields=['verification_status'])
+        self.assertEqual(self.client.get(self.url, {'since': cursor}).status_code, 304)
+        profile.skills = ['Plumbing', 'Tiling']
+        profile.save()
+        self.assertEqual(self.client.get(self.url, {'since': cursor}).status_code, 200)
+
+
+class FundiClusterTests(TestCase):
+    bbox = '36.0,-2.0,37.5,-0.5'
+
+    def clusters(self, **params):
+        params = {'bbox': self.bbox, 'zoom': 8, 'clusters': 'true', **params}
+        return self.client.get(reverse('fundi_locations_api'), params).json()['clusters']
+
+    def test_clusters_follow_profile_changes(self):
+        _, first = make_fundi('c1', -1.2676, 36.8108, skills=['Plumbing'])
+        _, second = make_fundi('c2', -1.2700, 36.8100, skills=['Plumbing', 'Electrical'])
+        [cluster] = self.clusters()
+        self.assertEqual(cluster['count'], 2)
+        self.assertEqual(cluster['skill'], 'Plumbing')
+        self.assertAlmostEqual(cluster['latitude'], (-1.2676 - 1.2700) / 2, places=4)
+
+        second.availability = False
+        second.save()
+        self.assertEqual(self.clusters(available='true')[0]['count'], 1)
+
+        first.latitude, first.longitude = -4.0435, 39.6682
+        first.save()
+        self.assertEqual(self.clusters()[0]['count'], 1)
+        self.assertEqual(self.clusters(skill='Electrical')[0]['count'], 1)
+
+    def test_skills_match_the_catalogue_like_points(self):
+        user, _ = make_fundi('c6', -1.2676, 36.8108, skills=['plumber', 'Welding and stuff'])
+        [cluster] = self.clusters(skill='Plumbing')
+        self.assertEqual((cluster['count'], cluster['skill']), (1, 'Plumbing'))
+        self.assertEqual(self.clusters(skill='fundi wa maji')[0]['count'], 1)
+        points = self.client.get(reverse('fundi_locations_api'), {'bbox': self.bbox, 'skill': 'Plumbing'}).json()
+        self.assertEqual([fundi['id'] for fundi in points['fundis']], [user.pk])
+        # Skills missing from the catalogue match nobody, as for points
+        self.assertEqual(self.clusters(skill='Welding and stuff'), [])
+
+    def test_role_switches_leave_and_rejoin_clusters(self):
+        user, profile = make_fundi('c5', -1.2676, 36.8108, skills=['Plumbing'])
+        user = User.objects.get(pk=user.pk)
+        user.switch_role('customer')
+        self.assertEqual(self.clusters(), [])
+        # Moves out of fundi mode stay off the map
+        profile = FundiProfile.objects.get(pk=profile.pk)
+        profile.latitude = -1.2800
+        profile.save()
+        self.assertEqual(self.clusters(), [])
+        clustering.rebuild()
+        self.assertEqual(self.clusters(), [])
+        user.switch_role('fundi')
+        [cluster] = self.clusters()
+        self.assertEqual(cluster['count'], 1)
+        self.assertAlmostEqual(cluster['latitude'], -1.2800, places=4)
+
+    def test_high_zoom_returns_points(self):
+        make_fundi('c3', -1.2676, 36.8108)
+        data = self.client.get(reverse('fundi_locations_api'), {'bbox': self.bbox, 'zoom': 16, 'clusters': 'true'}).json()
+        self.assertNotIn('clusters', data)
+        self.assertEqual(len(data['fundis']), 1)
+
+    def test_rebuild_matches_incremental_counts(self):
+        _, profile = make_fundi('c4', -1.2676, 36.8108, skills=['Plumbing'])
+        profile.latitude = -1.2800
+        profile.save()
+        before = self.clusters()
+        clustering.rebuild()
+        [after] = self.clusters()
+        self.assertEqual((after['cell'], after['count'], after['skill']), (before[0]['cell'], 1, 'Plumbing'))
+        self.assertAlmostEqual(after['latitude'], before[0]['latitude'])
+
+
+class FundiBroadcastTests(TestCase):
+    def test_subscription_receives_matching_changes(self):
+        async def listen():
+            broadcaster = broadcast.Broadcaster()
+            nairobi = broadcaster.subscribe(bbox=(-1.5, 36.6, -1.1, 37.1), skill_id=3)
+            mombasa = broadcaster.subscribe(bbox=(-4.2, 39.5, -3.9, 39.8))
+            point = {'id': 7, 'latitude': -1.27, 'longitude': 36.81, 'available': True, 'skills': ['plumber']}
+            # Published from another thread, as a sync view saving a profile would
+            await asyncio.to_thread(
+                broadcaster.deliver, {'id': 8, 'cursor': 2, 'old': None, 'new': point, 'skill_ids': [30]}
+            )
+            await asyncio.to_thread(
+                broadcaster.deliver, {'id': 7, 'cursor': 3, 'old': None, 'new': point, 'skill_ids': [3]}
+            )
+            await asyncio.to_thread(
+                broadcaster.deliver,
+                {'id': 7, 'cursor': 4, 'old': point, 'new': {**point, 'latitude': -4.04, 'longitude': 39.67},
+                 'skill_ids': [3]},
+            )
+            first = await asyncio.wait_for(nairobi.queue.get(), 1)
+            second = await asyncio.wait_for(nairobi.queue.get(), 1)
+            moved_in = await asyncio.wait_for(mombasa.queue.get(), 1)
+            return first, second, moved_in
+
+        first, second, moved_in = asyncio.run(listen())
+        self.assertEqual((first['type'], first['fundi']['id']), ('upsert', 7))
+        self.assertEqual((second['type'], second['id']), ('remove', 7))
+        self.assertEqual((moved_in['type'], moved_in['cursor']), ('upsert', 4))
+
+    @override_settings(BACKGROUND_TASKS_INLINE=True)
+    def test_events_carry_catalogue_skills(self):
+        published = []
+        with mock.patch.object(broadcast, 'get_backend') as get_backend, self.captureOnCommitCallbacks(execute=True):
+            get_backend.return_value.publish = published.append
+            make_fundi('caster', -1.27, 36.81, skills=['fundi wa mabomba', 'Electric', 'Juggling'])
+        plumbing, electrical = skills.resolve('Plumbing')[0], skills.resolve('Electrical')[0]
+        self.assertEqual(published[-1]['skill_ids'], sorted([plumbing, electrical]))
+
+    @override_settings(FUNDI_BROADCAST_BACKEND='core.broadcast.InProcessBackend')
+    def test_streams_start_the_backend(self):
+        with mock.patch.object(broadcast, '_backend', None):
+            broadcast.ensure_started()
+            self.assertIsInstance(broadcast._backend, broadcast.InProcessBackend)
+            self.assertIs(broadcast._backend.broadcaster, broadcast.get_broadcaster())
+
+    def test_stream_requires_asgi(self):
+        resp = self.client.get(reverse('fundi_locations_stream'))
+        self.assertEqual(resp.status_code, 501)
+
+    async def test_stream_rejects_unknown_skills(self):
+        resp = await self.async_client.get(reverse('fundi_locations_stream'), {'skill': 'plumb'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class NearestFundiTests(TestCase):
+    def setUp(self):
+        get_fundi_index().reset()
+        self.westlands, _ = make_fundi('near1', -1.2676, 36.8108, skills=['Plumbing'])
+        self.kilimani, self.kilimani_profile = make_fundi('near2', -1.2921, 36.7840, skills=['Plumbing', 'Electrical'])
+        self.mombasa, _ = make_fundi('near3', -4.0435, 39.6682, skills=['Plumbing'])
+
+    def nearest(self, **params):
+        params = {'lat': -1.2864, 'lng': 36.8172, **params}
+        return self.client.get(reverse('nearest_fundis_api'), params).json()['fundis']
+
+    def test_results_are_ranked_by_distance(self):
+        ids = [f['id'] for f in self.nearest(k=2)]
+        self.assertEqual(ids, [self.westlands.id, self.kilimani.id])
+
+    def test_skill_radius_and_availability_filters(self):
+        self.assertEqual([f['id'] for f in self.nearest(skill='electrical')], [self.kilimani.id])
+        self.assertEqual(len(self.nearest(radius_km=50)), 2)
+        self.kilimani_profile.availability = False
+        self.kilimani_profile.save()
+        get_fundi_index().refresh(force=True)
+        self.assertEqual([f['id'] for f in self.nearest(radius_km=50)], [self.westlands.id])
+
+    def test_index_picks_up_moves_and_deletions(self):
+        index = get_fundi_index()
+        index.refresh(force=True)
+        self.kilimani_profile.latitude, self.kilimani_profile.longitude = -1.2865, 36.8173
+        self.kilimani_profile.save()
+        self.westlands.delete()
+        index.refresh(force=True)
+        self.assertEqual(index.nearest(-1.2864, 36.8172, k=1)[0][0], self.kilimani.id)
+        self.assertEqual(len(index), 2)
+
+    def test_missing_coordinates_are_rejected(self):
+        resp = self.client.get(reverse('nearest_fundis_api'))
+        self.assertEqual(resp.status_code, 400)
+
+    def test_out_of_range_parameters_are_rejected(self):
+        for params in ({'lat': 'nan'}, {'lng': 'inf'}, {'lat': 91}, {'lng': -180.5}, {'radius_km': 'nan'},
+                       {'radius_km': -5}, {'radius_km': 'inf'}):
+            params = {'lat': -1.2864, 'lng': 36.8172, **params}
+            self.assertEqual(self.client.get(reverse('nearest_fundis_api'), params).status_code, 400, params)
+        self.assertEqual(len(self.nearest(k=0)), 1)
+        self.assertEqual(len(self.nearest(k=-3)), 1)
+        with mock.patch('core.views.MAX_NEAREST', 2):
+            self.assertEqual(len(self.nearest(k=10**6)), 2)
+
+
+class GazetteerTests(TestCase):
+    def test_normalize_strips_punctuation_and_noise(self):
+        self.assertEqual(gazetteer.normalize("  Westlands Estate, Nairobi - Kenya "), 'westlands nairobi')
+
+    def test_estate_beats_town_and_aliases_match(self):
+        self.assertEqual(gazetteer.resolve('Westlands, Nairobi').slug, 'nairobi-westlands')
+        self.assertEqual(gazetteer.resolve('westlands nbi').slug, 'nairobi-westlands')
+        self.assertEqual(gazetteer.resolve('NBI').slug, 'nairobi')
+        self.assertIsNone(gazetteer.resolve('Atlantis'))
+
+    def test_results_and_misses_are_cached(self):
+        gazetteer.resolve('Kilimani, Nairobi')
+        gazetteer.resolve('Somewhere Unknown')
+        with self.assertNumQueries(1):
+            self.assertEqual(gazetteer.resolve('kilimani nairobi').slug, 'nairobi-kilimani')
+        with self.assertNumQueries(1):
+            self.assertIsNone(gazetteer.resolve('somewhere unknown'))
+        # Only saved hits reach the table
+        self.assertEqual(list(GeocodeCache.objects.values_list('query', flat=True)), ['kilimani nairobi'])
+
+    def test_search_input_never_writes(self):
+        for name in ('job_list', 'jobs:jobs'):
+            self.client.get(reverse(name), {'location': 'Westlands xyz'})
+            self.client.get(reverse(name), {'location': 'Nowhere at all'})
+        self.assertFalse(GeocodeCache.objects.exists())
+        with self.assertNumQueries(2):
+            self.assertEqual(gazetteer.resolve('westlands xyz', persist=False).slug, 'nairobi-westlands')
+
+    def test_other_workers_see_new_places(self):
+        self.addCleanup(gazetteer.places_changed)
+        self.assertIsNone(gazetteer.resolve('Tatu City'))
+        # Added by another worker: this one's names and cached miss are stale...
+        Place.objects.bulk_create([Place(
+            name='Tatu City', slug='kiambu-tatu-city', kind='estate',
+            parent=Place.objects.get(slug='kiambu'), latitude=-1.16, longitude=36.94,
+        )])
+        self.assertIsNone(gazetteer.resolve('Tatu City'))
+        # ...until that worker's Place.save bumps the shared version
+        gazetteer._bump()
+        self.assertEqual(gazetteer.resolve('Tatu City').slug, 'kiambu-tatu-city')
+
+    def test_new_place_clears_cached_misses(self):
+        # The rolled-back place must not linger in the in-memory names
+        self.addCleanup(gazetteer.places_changed)
+        self.assertIsNone(gazetteer.resolve('Tatu City'))
+        Place.objects.create(
+            name='Tatu City', slug='kiambu-tatu-city', kind='estate',
+            parent=Place.objects.get(slug='kiambu'), latitude=-1.16, longitude=36.94,
+        )
+        self.assertFalse(GeocodeCache.objects.filter(query='tatu city').exists())
+        self.assertEqual(gazetteer.resolve('Tatu City').slug, 'kiambu-tatu-city')
+
+    def test_user_location_fills_place_and_coordinates(self):
+        user = User.objects.create_user(username='placed', email='placed@example.com', password='pass')
+        user.location = 'Kilimani'
+        user.save()
+        user.refresh_from_db()
+        self.assertEqual(user.place.slug, 'nairobi-kilimani')
+        self.assertIsNotNone(user.latitude)
+        profile = FundiProfile.objects.create(user=user)
+        self.assertEqual(profile.latitude, user.latitude)
+
+    def test_job_list_location_filter_includes_estates(self):
+        customer = User.objects.create_user(username='poster', email='poster@example.com', password='pass')
+        inside = Job.objects.create(title='Fix tap', description='Leaking', customer=customer, location='Westlands')
+        Job.objects.create(title='Paint wall', description='Blue', customer=customer, location='Mombasa')
+        for name in ('job_list', 'jobs:jobs'):
+            resp = self.client.get(reverse(name), {'location': 'nairobi'})
+            self.assertEqual([job.pk for job in resp.context['page_obj']], [inside.pk])
+
+
+class PackedMapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.westlands, _ = make_fundi('pack1', -1.2676, 36.8108, skills=['Plumbing', 'Electrical'])
+        self.kilimani, _ = make_fundi('pack2', -1.2921, 36.7840, skills=['Plumbing'], availability=False)
+
+    def test_packed_matches_json(self):
+        url = reverse('fundi_locations_api')
+        params = {'bbox': '36.7,-1.4,36.9,-1.2', 'zoom': '15'}
+        expected = self.client.get(url, params).json()
+        resp = self.client.get(url, {**params, 'format': 'packed'})
+        self.assertEqual(resp['Content-Type'], packed.CONTENT_TYPE)
+        self.assertEqual(packed.decode(resp.content), expected)
+
+    def test_packed_delta_and_clusters(self):
+        url = reverse('fundi_locations_api')
+        cursor = self.client.get(url).json()['cursor']
+        removed_id = self.westlands.id
+        self.westlands.delete()
+        data = packed.decode(self.client.get(url, {'since': cursor, 'format': 'packed'}).content)
+        self.assertEqual((data['fundis'], data['removed'], data['delta']), ([], [removed_id], True))
+        params = {'bbox': '36.0,-2.0,37.5,-0.5', 'zoom': '8', 'clusters': 'true', 'format': 'packed'}
+        clusters = packed.decode(self.client.get(url, params).content)['clusters']
+        self.assertEqual(sum(cluster['count'] for cluster in clusters), 1)
+
+    def test_packed_is_much_smaller_than_json(self):
+        for i in range(40):
+            make_fundi(f'bulk{i}', -1.28 + i * 0.001, 36.81, skills=['Plumbing', 'Masonry'])
+        url = reverse('fundi_locations_api')
+        json_size = len(self.client.get(url).content)
+        packed_size = len(self.client.get(url, {'format': 'packed'}).content)
+        self.assertLess(packed_size * 3, json_size)
+
+    def test_tiles_hold_clusters_then_points(self):
+        # Nairobi falls in tile 12/2466/2062 and 16/39469/32998
+        resp = self.client.get(reverse('fundi_tile_api', args=[12, 2466, 2062]))
+        self.assertEqual(resp['Cache-Control'], f'public, max-age={views.TILE_MAX_AGE}')
+        clusters = packed.decode(resp.content)['clusters']
+        self.assertEqual(sum(cluster['count'] for cluster in clusters), 2)
+        south, west, north, east = geo.tile_bounds(16, 39469, 32998)
+        self.assertTrue(south <= -1.2676 <= north and west <= 36.8108 <= east)
+        fundis = packed.decode(self.client.get(reverse('fundi_tile_api', args=[16, 39469, 32998])).content)['fundis']
+        self.assertEqual([fundi['id'] for fundi in fundis], [self.westlands.id])
+
+    def test_tiles_are_cached_per_cursor(self):
+        url = reverse('fundi_tile_api', args=[12, 2466, 2062])
+        resp = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        make_fundi('pack3', -1.2700, 36.8000)
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(sum(cluster['count'] for cluster in packed.decode(fresh.content)['clusters']), 3)
+
+    def test_tile_outside_map_is_404(self):
+        self.assertEqual(self.client.get(reverse('fundi_tile_api', args=[2, 4, 0])).status_code, 404)
+
+
+@override_settings(FUNDI_HEARTBEAT_FLUSH_SECONDS=0)
+class FundiHeartbeatTests(TestCase):
+    def setUp(self):
+        self.buffer = heartbeat.get_buffer()
+        self.buffer.flush()
+        self.fundi, self.profile = make_fundi('beat', -1.2676, 36.8108, skills=['Plumbing'])
+        self.client.force_login(self.fundi)
+
+    def ping(self, latitude, longitude, **extra):
+        return self.client.post(reverse('fundi_heartbeat_api'), {'lat': latitude, 'lng': longitude, **extra})
+
+    def test_pings_are_coalesced_until_flush(self):
+        url = reverse('fundi_locations_api')
+        cursor = self.client.get(url).json()['cursor']
+        for step in range(3):
+            self.assertEqual(self.ping(-1.2800 - step / 1000, 36.8200).status_code, 202)
+        self.ping(-1.2921, 36.7840, available='false')
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.client.get(url, {'since': cursor}).status_code, 304)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.profile.refresh_from_db()
+        self.assertEqual((float(self.profile.latitude), float(self.profile.longitude)), (-1.2921, 36.7840))
+        self.assertFalse(self.profile.availability)
+        self.assertEqual(self.profile.geohash, geo.encode(-1.2921, 36.7840))
+        data = self.client.get(url, {'since': cursor}).json()
+        self.assertEqual([fundi['id'] for fundi in data['fundis']], [self.fundi.id])
+        cell = FundiCluster.objects.get(precision=6, cell=geo.encode(-1.2921, 36.7840, 6), skill='')
+        self.assertEqual((cell.count, cell.available_count), (1, 0))
+        self.assertFalse(FundiCluster.objects.filter(precision=6, cell=geo.encode(-1.2676, 36.8108, 6), count__gt=0))
+
+    def test_stationary_pings_cost_one_read(self):
+        self.ping(-1.2676, 36.8108)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 0)
+
+    def test_flush_cost_does_not_grow_with_fundis(self):
+        def flush_queries(count, offset):
+            for i in range(count):
+                user, _ = make_fundi(f'fleet{offset + i}', -1.2676, 36.8108, skills=['Plumbing'])
+                self.buffer.record(user.pk, '-1.2680', '36.8110')
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.buffer.flush(), count)
+            return len(queries)
+        self.assertEqual(flush_queries(3, 0), flush_queries(12, 100))
+
+    def test_only_fundis_can_ping(self):
+        self.assertEqual(self.client.get(reverse('fundi_heartbeat_api')).status_code, 405)
+        self.assertEqual(self.ping('north', 36.8).status_code, 400)
+        customer = User.objects.create_user(username='watcher', email='watcher@example.com', password='pass')
+        self.client.force_login(customer)
+        self.assertEqual(self.ping(-1.28, 36.82).status_code, 403)
+        self.assertEqual(len(self.buffer), 0)
+
+
+class JobDemandTests(TestCase):
+    KENYA = (-5.0, 33.5, 5.0, 42.0)
+
+    def setUp(self):
+        self.customer = User.objects.create_user(username='demand', email='demand@example.com', password='pass')
+        self.plumbing = Category.objects.create(name='Plumbing')
+        self.electrical = Category.objects.create(name='Electrical')
+        self.westlands = self.post('Westlands', self.plumbing, 'high')
+        self.kilimani = self.post('Kilimani', self.plumbing, 'low')
+        self.mombasa = self.post('Mombasa', self.electrical, 'high')
+
+    def post(self, location, category, urgency):
+        return Job.objects.create(
+            title=f'Job in {location}', description='Work', customer=self.customer,
+            category=category, location=location, urgency=urgency,
+        )
+
+    def total(self, **filters):
+        return sum(cell['count'] for cell in demand.heatmap(self.KENYA, 6, **filters))
+
+    def test_heatmap_counts_open_jobs_by_category_and_urgency(self):
+        self.assertEqual(self.total(), 3)
+        self.assertEqual(self.total(category='Plumbing'), 2)
+        self.assertEqual(self.total(urgency='high'), 2)
+        self.assertEqual(self.total(category='Electrical', urgency='low'), 0)
+        nairobi = demand.heatmap((-1.4, 36.6, -1.2, 36.9), 10)
+        self.assertEqual(sum(cell['count'] for cell in nairobi), 2)
+
+    def test_cells_follow_status_moves_and_deletes(self):
+        self.westlands.status = 'completed'
+        self.westlands.save()
+        self.mombasa.location = 'Kisumu'
+        self.mombasa.save()
+        self.kilimani.delete()
+        self.assertEqual(self.total(), 1)
+        cells = demand.heatmap(self.KENYA, 6)
+        self.assertAlmostEqual(cells[0]['latitude'], float(Place.objects.get(slug='kisumu').latitude))
+        self.westlands.status = 'open'
+        self.westlands.save(update_fields=['status'])
+        self.assertEqual(self.total(), 2)
+
+    def test_deferred_loads_and_rebuild_agree(self):
+        job = Job.objects.only('status').get(pk=self.mombasa.pk)
+        job.status = 'cancelled'
+        job.save()
+        self.assertEqual(self.total(), 2)
+        before = sorted(JobDemandCell.objects.filter(count__gt=0).values_list('precision', 'cell', 'category', 'urgency', 'count'))
+        demand.rebuild()
+        after = sorted(JobDemandCell.objects.values_list('precision', 'cell', 'category', 'urgency', 'count'))
+        self.assertEqual(before, after)
+
+    def test_endpoint(self):
+        url = reverse('job_demand_api')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        resp = self.client.get(url, {'bbox': '33.5,-5,42,5', 'zoom': '6', 'category': 'Plumbing'})
+        self.assertEqual(resp['Cache-Control'], f'public, max-age={views.DEMAND_MAX_AGE}')
+        self.assertEqual(sum(cell['count'] for cell in resp.json()['cells']), 2)
+
+
+@override_settings(BACKGROUND_TASKS_INLINE=True)
+class FundiJobFeedTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='feeder', email='feeder@example.com', password='pass')
+        self.plumbing = Category.objects.create(name='Plumbing')
+        self.painting = Category.objects.create(name='Painting')
+        with self.committed():
+            self.fundi, self.profile = make_fundi('fixer', -1.2650, 36.8050, skills=['Plumbing'])
+            self.westlands = self.post('Westlands', self.plumbing, 'medium')
+            self.kilimani = self.post('Kilimani', self.plumbing, 'urgent')
+            self.mombasa = self.post('Mombasa', self.plumbing, 'urgent')
+            self.painting_job = self.post('Westlands', self.painting, 'high')
+
+    def committed(self):
+        """Run the feed's background work queued inside the block."""
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def post(self, location, category, urgency):
+        return Job.objects.create(
+            title=f'Job in {location}', description='Work', customer=self.customer,
+            category=category, location=location, urgency=urgency,
+        )
+
+    def feed(self):
+        return [job.pk for job in feed.top(self.fundi, 10)]
+
+    def test_ranked_by_urgency_distance_and_recency(self):
+        self.assertEqual(self.feed(), [self.kilimani.pk, self.westlands.pk])
+        with self.committed():
+            newer = self.post('Westlands', self.plumbing, 'medium')
+            # Not until the job is committed
+            self.assertEqual(self.feed(), [self.kilimani.pk, self.westlands.pk])
+        self.assertEqual(self.feed(), [self.kilimani.pk, newer.pk, self.westlands.pk])
+        jobs = feed.top(self.fundi, 1, within_km=1)
+        self.assertEqual([job.pk for job in jobs], [newer.pk])
+        self.assertLess(jobs[0].distance_km, 1)
+
+    def test_applying_and_closing_remove_jobs(self):
+        JobApplication.objects.create(job=self.kilimani, fundi=self.fundi, message='Me')
+        self.westlands.status = 'completed'
+        with self.committed():
+            self.westlands.save()
+        self.assertEqual(self.feed(), [])
+        self.westlands.status = 'open'
+        with self.committed():
+            self.westlands.save(update_fields=['status'])
+        self.assertEqual(self.feed(), [self.westlands.pk])
+
+    def test_follows_skills_and_moves(self):
+        self.profile.skills = ['painter']
+        self.profile.save()
+        self.assertEqual(self.feed(), [self.painting_job.pk])
+        self.profile.skills = ['Plumbing']
+        self.profile.latitude, self.profile.longitude = -4.0435, 39.6682
+        with self.committed():
+            self.profile.save()
+        self.assertEqual(self.feed(), [self.mombasa.pk])
+
+    def test_moves_only_touch_rows_whose_distance_changed(self):
+        with self.committed():
+            unplaced = self.post('Kwa Mzee Ndogo', self.plumbing, 'low')
+        rows = dict(FundiJobFeed.objects.filter(fundi=self.fundi).values_list('job', 'pk'))
+        self.assertEqual(set(rows), {self.westlands.pk, self.kilimani.pk, unplaced.pk})
+        self.profile.latitude, self.profile.longitude = -1.2921, 36.7840
+        with self.committed(), mock.patch.object(feed, 'refresh_fundi') as refresh_fundi:
+            self.profile.save()
+        refresh_fundi.assert_not_called()
+        moved = FundiJobFeed.objects.filter(fundi=self.fundi)
+        self.assertEqual(dict(moved.values_list('job', 'pk')), rows)
+        before = sorted(moved.values_list('job', 'distance_km', 'score'))
+        feed.refresh_fundi(self.profile)
+        self.assertEqual(sorted(moved.values_list('job', 'distance_km', 'score')), before)
+        rows = dict(moved.values_list('job', 'pk'))
+        self.profile.latitude, self.profile.longitude = -4.0435, 39.6682
+        with self.committed():
+            self.profile.save()
+        self.assertEqual(set(moved.values_list('job', flat=True)), {self.mombasa.pk, unplaced.pk})
+        self.assertEqual(moved.get(job=unplaced).pk, rows[unplaced.pk])
+
+    def test_short_moves_add_up(self):
+        row = FundiJobFeed.objects.filter(fundi=self.fundi, job=self.westlands)
+        start = row.get().distance_km
+        # Six steps of about 0.5 km, each under FEED_MOVE_KM
+        for step in range(1, 7):
+            self.profile.latitude = -1.2650 + 0.0045 * step
+            with self.committed():
+                self.profile.save()
+            if step == 1:
+                self.assertEqual(row.get().distance_km, start)
+        origin = FundiFeedOrigin.objects.values_list('latitude', 'longitude').get(fundi=self.fundi)
+        self.assertLess(geo.distance_km(*origin, -1.2650 + 0.0045 * 6, 36.8050), feed.FEED_MOVE_KM)
+        distance = geo.distance_km(self.westlands.latitude, self.westlands.longitude, *origin)
+        self.assertAlmostEqual(row.get().distance_km, distance)
+        self.assertNotEqual(row.get().distance_km, start)
+
+    def test_dashboard_reads_the_feed_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(feed.top(self.fundi, 6)), 2)
+        before = sorted(FundiJobFeed.objects.values_list('fundi', 'job', 'score'))
+        feed.rebuild()
+        self.assertEqual(sorted(FundiJobFeed.objects.values_list('fundi', 'job', 'score')), before)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='pager', email='pager@example.com', password='pass')
+        category = Category.objects.create(name='Plumbing')
+        self.jobs = [
+            Job.objects.create(title=f'Job {i}', description='Work', customer=self.customer, category=category, location='Karen')
+            for i in range(25)
+        ]
+        # Ties on created_at must still page cleanly
+        Job.objects.filter(pk__in=[job.pk for job in self.jobs[5:15]]).update(created_at=self.jobs[5].created_at)
+
+    def walk(self, paginator):
+        seen, page = [], paginator.page()
+        while True:
+            seen.extend(job.pk for job in page)
+            if not page.has_next:
+                return seen, page
+            page = paginator.page(page.next_cursor)
+
+    def test_pages_cover_everything_once_in_order(self):
+        queryset = Job.objects.all()
+        seen, last = self.walk(CursorPaginator(queryset, 10))
+        self.assertEqual(seen, list(queryset.order_by('-created_at', '-pk').values_list('pk', flat=True)))
+        back = CursorPaginator(queryset, 10).page(last.previous_cursor)
+        self.assertEqual([job.pk for job in back], seen[10:20])
+        first = CursorPaginator(queryset, 10).page(back.previous_cursor)
+        self.assertEqual([job.pk for job in first], seen[:10])
+        self.assertFalse(first.has_previous)
+
+    def test_deep_pages_skip_offset_and_counts_are_capped(self):
+        paginator = CursorPaginator(Job.objects.all(), 10, count_limit=20)
+        cursor = paginator.page().next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.page(cursor)
+        self.assertNotIn('OFFSET', queries[0]['sql'].upper())
+        self.assertEqual((page.total, page.total_capped), (20, True))
+        self.assertEqual(len(CursorPaginator(Job.objects.all(), 10).page('not-a-cursor')), 10)
+
+    def test_job_list_links_keep_filters(self):
+        resp = self.client.get(reverse('job_list'), {'search': 'job'})
+        page = resp.context['page_obj']
+        self.assertContains(resp, f'search=job&amp;cursor={page.next_cursor}')
+        resp = self.client.get(reverse('job_list'), {'search': 'job', 'cursor': page.next_cursor})
+        self.assertEqual(len(resp.context['page_obj']), 12)
+
+    def test_my_jobs_shows_the_total(self):
+        self.customer.active_role = 'customer'
+        self.customer.save()
+        self.client.force_login(self.customer)
+        resp = self.client.get(reverse('jobs:my_jobs'))
+        self.assertContains(resp, '25 jobs')
+        self.assertEqual(len(resp.context['page_obj']), 10)
+
+
+class TrigramTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='fuzzy', email='fuzzy@example.com', password='pass')
+        self.near = Job.objects.create(
+            title='Plumber for a leaking tap', description='Work', customer=self.customer, location='Kitengela Phase 2',
+        )
+        self.far = Job.objects.create(title='Weld a gate', description='Work', customer=self.customer, location='Isinya')
+
+    def matches(self, model, column, text, threshold=trigram.DEFAULT_THRESHOLD):
+        return list(model.objects.filter(trigram.condition(model, column, text, threshold)).values_list('pk', flat=True))
+
+    def test_misspellings_match(self):
+        self.assertEqual(self.matches(Job, 'location', 'Kitengla'), [self.near.pk])
+        self.assertEqual(self.matches(Job, 'location', 'kitengela phase'), [self.near.pk])
+        self.assertEqual(self.matches(Job, 'title', 'plumbr'), [self.near.pk])
+        self.assertEqual(self.matches(Job, 'title', 'plumbr', threshold=1.0), [])
+        self.assertEqual(self.matches(Job, 'location', ''), [])
+        self.assertEqual(trigram.parse_threshold('0.1'), trigram.MIN_THRESHOLD)
+        self.assertEqual(trigram.parse_threshold('nan'), trigram.DEFAULT_THRESHOLD)
+
+    def test_side_table_follows_saves_and_deletes(self):
+        self.far.location = 'Kitengela'
+        self.far.save()
+        self.assertEqual(set(self.matches(Job, 'location', 'Kitengla')), {self.near.pk, self.far.pk})
+        self.near.delete()
+        self.assertEqual(self.matches(Job, 'location', 'Kitengla'), [self.far.pk])
+        self.customer.location = 'Rongai'
+        self.customer.save(update_fields=['location'])
+        self.assertEqual(self.matches(User, 'location', 'Ongata Rongia', threshold=0.3), [self.customer.pk])
+        self.assertEqual(trigram.rebuild(), Trigram.objects.count())
+        self.assertEqual(self.matches(Job, 'location', 'Kitengla'), [self.far.pk])
+
+    def test_saves_that_keep_the_text_skip_the_index(self):
+        job = Job.objects.get(pk=self.far.pk)
+        customer = User.objects.get(pk=self.customer.pk)
+        with mock.patch.object(trigram, 'reindex') as reindex:
+            job.status = 'completed'
+            job.save()
+            customer.otp_code = '123456'
+            customer.save()
+            customer.save(update_fields=['location', 'otp_code'])
+        reindex.assert_not_called()
+        job.title = 'Weld a steel gate'
+        with mock.patch.object(trigram, 'reindex', wraps=trigram.reindex) as reindex:
+            job.save()
+            job.save()
+        reindex.assert_called_once_with(job, ('title',))
+        self.assertEqual(self.matches(Job, 'title', 'steal gate'), [self.far.pk])
+
+    def test_job_lists_match_misspellings(self):
+        resp = self.client.get(reverse('job_list'), {'location': 'Kitengla'})
+        self.assertEqual([job.pk for job in resp.context['page_obj']], [self.near.pk])
+        resp = self.client.get(reverse('jobs:jobs'), {'search': 'plumbr'})
+        self.assertEqual([job.pk for job in resp.context['page_obj']], [self.near.pk])
+        resp = self.client.get(reverse('jobs:jobs'), {'search': 'plumbr', 'similarity': '1'})
+        self.assertEqual(list(resp.context['page_obj']), [])
+
+
+# Lookup tables small enough that reading them whole is the right plan
+SMALL_TABLES = {'jobs_category', 'core_place', 'jobs_skill', 'django_site', 'socialaccount_socialapp'}
+
+
+def plan_problems(sql, params):
+    """Full scans of big tables and temp B-tree sorts in SQLite's plan for a query."""
+    big_tables = set(connection.introspection.table_names()) - SMALL_TABLES
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        details = [row[-1] for row in cursor.fetchall()]
+    # Sorting rows of the small tables (or of a bounded subquery over an index) is fine
+    tables = {detail.split()[1] for detail in details if detail.split()[0] in ('SCAN', 'SEARCH')}
+    if not tables & big_tables:
+        return []
+    problems = []
+    for detail in details:
+        words = detail.split()
+        if 'TEMP B-TREE' in detail:
+            problems.append(detail)
+        elif words[0] == 'SCAN' and words[1] in big_tables and 'USING' not in words:
+            # A full-text MATCH shows as a virtual table scan with a constraint
+            if not re.search(r'VIRTUAL TABLE INDEX \d+:\S', detail):
+                problems.append(detail)
+    return problems
+
+
+@skipUnless(connection.vendor == 'sqlite', 'reads SQLite query plans')
+class QueryPlanTests(TestCase):
+    """Every query the hot pages run must be answered from an index, without a sort."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='planner', email='planner@example.com', password='pass')
+        cls.customer.active_role = 'customer'
+        cls.customer.is_verified = True
+        cls.customer.save()
+        cls.fundi, _ = make_fundi('planfundi', -1.28, 36.82)
+        cls.fundi.is_verified = True
+        cls.fundi.onboarding_complete = True
+        cls.fundi.save()
+        category = Category.objects.create(name='Plumbing')
+        now = timezone.now()
+        statuses = ['open', 'completed', 'cancelled', 'in_progress']
+        Job.objects.bulk_create([
+            Job(
+                title=f'Job {i}', description='Work', customer=cls.customer, category=category, location='Karen',
+                status=statuses[i % 4], created_at=now - datetime.timedelta(minutes=i),
+            )
+            for i in range(400)
+        ])
+        jobs = list(Job.objects.order_by('pk')[:200])
+        JobApplication.objects.bulk_create([JobApplication(job=job, fundi=cls.fundi, message='Hi') for job in jobs])
+        Notification.objects.bulk_create([Notification(user=cls.customer, message=f'Note {i}') for i in range(200)])
+        Message.objects.bulk_create([
+            Message(job=jobs[i % 20], sender=cls.customer, recipient=cls.fundi, content='Hello') for i in range(200)
+        ])
+        Payment.objects.bulk_create([
+            Payment(amount=100, commission=10, fundi_amount=90, customer=cls.customer, fundi=cls.fundi, job=jobs[i % 50])
+            for i in range(200)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def capture(self, func):
+        """(sql, params) of every SELECT ``func`` runs."""
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            func()
+        return queries
+
+    def assertIndexed(self, queries, sorts=False):
+        """``sorts`` lets relevance and radius queries sort the rows their index found."""
+        self.assertTrue(queries)
+        for sql, params in queries:
+            problems = plan_problems(sql, params)
+            if sorts:
+                problems = [problem for problem in problems if 'TEMP B-TREE' not in problem]
+            self.assertEqual(problems, [], sql)
+
+    def get(self, user, url, params=None):
+        self.client.force_login(user)
+        return self.capture(lambda: self.assertEqual(self.client.get(url, params).status_code, 200))
+
+    def test_checker_catches_scans_and_sorts(self):
+        problems = [plan_problems(sql, params) for sql, params in self.capture(lambda: list(Job.objects.order_by('title')))]
+        self.assertEqual(problems, [['SCAN jobs_job', 'USE TEMP B-TREE FOR ORDER BY']])
+
+    def test_job_lists(self):
+        self.assertIndexed(self.get(self.fundi, reverse('job_list')))
+        self.assertIndexed(self.get(self.fundi, reverse('jobs:jobs'), {'category': 'Plumbing', 'urgency': 'high'}))
+
+    def test_job_list_filters(self):
+        radius = {'within_km': '5', 'lat': '-1.32', 'lng': '36.70'}
+        for url in (reverse('job_list'), reverse('jobs:jobs')):
+            with self.subTest(url=url):
+                # A gazetteer place, and a misspelt one matched by trigram
+                self.assertIndexed(self.get(self.fundi, url, {'location': 'Karen'}))
+                self.assertIndexed(self.get(self.fundi, url, {'location': 'Karn Estate'}))
+                # Ranked by relevance, or bounded by the radius, then sorted
+                self.assertIndexed(self.get(self.fundi, url, {'search': 'job'}), sorts=True)
+                self.assertIndexed(self.get(self.fundi, url, radius), sorts=True)
+                self.assertIndexed(self.get(self.fundi, url, {'search': 'job', 'location': 'Karen', **radius}), sorts=True)
+
+    def test_customer_pages(self):
+        self.assertIndexed(self.get(self.customer, reverse('jobs:my_jobs')))
+        self.assertIndexed(self.get(self.customer, reverse('customer_dashboard')))
+
+    def test_fundi_pages(self):
+        self.assertIndexed(self.get(self.fundi, reverse('jobs:my_applications')))
+
+    def test_conversation_and_payment_lookups(self):
+        # The shapes jobs.views.job_messages and the payment views query
+        job = Job.objects.order_by('pk').first()
+        fundi, customer = self.fundi, self.customer
+        self.assertIndexed(self.capture(lambda: list(
+            Message.objects.filter(job=job, sender__in=[customer, fundi], recipient__in=[customer, fundi]).order_by('created_at')
+        )))
+        self.assertIndexed(self.capture(lambda: job.payments.filter(fundi=fundi).order_by('-created_at').first()))
+        self.assertIndexed(self.capture(lambda: job.payments.filter(
+            fundi=fundi, status__in=['pending', 'completed']
+        ).order_by('-created_at').first()))
+        self.assertIndexed(self.capture(lambda: job.payments.filter(status='completed').exists()))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'checks the SQLite profile')
+class SQLiteProfileTests(TestCase):
+    def connect(self, environ):
+        """PRAGMAs and transaction mode of a fresh database under the settings ``environ`` gives."""
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        environ = {'DATABASE_ENGINE': 'sqlite', 'SQLITE_REPLICA_PATHS': '', **environ}
+        with mock.patch.dict(os.environ, environ):
+            for name in {'SQLITE_PATH', 'SQLITE_WAL'} - set(environ):
+                os.environ.pop(name, None)
+            database = runpy.run_path(settings.BASE_DIR / 'fundiconnect' / 'settings.py')['DATABASES']['default']
+        with tempfile.TemporaryDirectory() as workdir:
+            wrapper = DatabaseWrapper({**connection.settings_dict, **database, 'NAME': os.path.join(workdir, 'profile.sqlite3')})
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {
+                        name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                        for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size')
+                    }
+            finally:
+                wrapper.close()
+        return pragmas, wrapper.transaction_mode
+
+    def test_configured_databases_use_wal(self):
+        pragmas, mode = self.connect({'SQLITE_PATH': '/srv/fundiconnect.sqlite3'})
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000, 'mmap_size': 134217728})
+        self.assertEqual(mode, 'IMMEDIATE')
+        self.assertEqual(self.connect({'SQLITE_WAL': 'True'})[0]['journal_mode'], 'wal')
+
+    def test_the_tracked_database_keeps_its_journal(self):
+        pragmas, mode = self.connect({})
+        self.assertEqual(pragmas, {'journal_mode': 'delete', 'synchronous': 2, 'busy_timeout': 20000, 'mmap_size': 134217728})
+        self.assertEqual(mode, 'IMMEDIATE')
+        self.assertEqual(self.connect({'SQLITE_PATH': '/srv/db.sqlite3', 'SQLITE_WAL': 'False'})[0]['journal_mode'], 'delete')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_a'], REPLICA_PIN_SECONDS=7)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False):
+        """Where Job and Session reads go inside a replica-reading view."""
+        routes = []
+
+        @replicas.reads_from_replica
+        def view(request):
+            if write:
+                self.router.db_for_write(Notification)
+            routes.extend([self.router.db_for_read(Job), self.router.db_for_read(Session)])
+            return HttpResponse()
+        replicas.ReplicaPinMiddleware(view)(request)
+        return tuple(routes)
+
+    def test_reads_go_to_a_replica_inside_decorated_views_only(self):
+        self.assertEqual(self.route(self.factory.get('/')), ('replica_a', 'default'))
+        self.assertIsNone(self.router.db_for_read(Job))
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        self.assertEqual(self.route(self.factory.get('/'), write=True), ('default', 'default'))
+
+    def test_pinned_clients_read_from_the_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[replicas.PIN_COOKIE] = '1'
+        self.assertEqual(self.route(request), (None, None))
+
+    def test_writing_requests_pin_the_client(self):
+        user = User.objects.create_user(username='pinned', email='pinned@example.com', password='pass')
+
+        def write(request):
+            Notification.objects.create(user=user, message='Hi')
+            return HttpResponse()
+        response = replicas.ReplicaPinMiddleware(write)(self.factory.post('/'))
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], 7)
+        response = replicas.ReplicaPinMiddleware(lambda request: HttpResponse())(self.factory.get('/'))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    async def test_async_requests_that_write_pin_the_client(self):
+        user = await User.objects.acreate(username='apinned', email='apinned@example.com')
+
+        async def write(request):
+            # As an async view does, through sync_to_async
+            await Notification.objects.acreate(user=user, message='Hi')
+            return HttpResponse()
+
+        async def read(request):
+            return HttpResponse()
+        middleware = replicas.ReplicaPinMiddleware(write)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(self.factory.post('/'))
+        self.assertEqual(response.cookies[replicas.PIN_COOKIE]['max-age'], 7)
+        response = await replicas.ReplicaPinMiddleware(read)(self.factory.get('/'))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_a_replica_that_is_the_primary_is_read_through_it(self):
+        # As a test mirror is
+        self.assertEqual(replicas.replicas(), [])
+        self.assertEqual(self.route(self.factory.get('/')), (None, None))
+
+    def test_replicas_are_never_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica_a', 'jobs'))
+        self.assertIsNone(self.router.allow_migrate('default', 'jobs'))
+
+
+@override_settings(QUERY_INSPECTION=True)
+class QueryBudgetTests(TestCase):
+    """Budgeted pages stay within budget, however many rows they list."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='budgeter', email='budgeter@example.com', password='pass')
+        cls.customer.active_role = 'customer'
+        cls.customer.is_verified = True
+        cls.customer.save()
+        cls.fundi, _ = make_fundi('budgetfundi', -1.28, 36.82)
+        cls.fundi.is_verified = True
+        cls.fundi.onboarding_complete = True
+        cls.fundi.save()
+        categories = [Category.objects.create(name=name) for name in ('Plumbing', 'Electrical', 'Painting')]
+        for i in range(12):
+            fundi, _ = make_fundi(f'budgetother{i}', -1.28 + i / 100, 36.82)
+            job = Job.objects.create(
+                title=f'Fix tap {i}', description='Leaking tap', customer=cls.customer, category=categories[i % 3],
+                location='Westlands', urgency='high',
+            )
+            JobApplication.objects.create(job=job, fundi=cls.fundi, message='Hi', status=('pending', 'accepted')[i % 2])
+            JobApplication.objects.create(job=job, fundi=fundi, message='Hi')
+            Message.objects.create(job=job, sender=cls.customer, recipient=cls.fundi, content='Hello')
+            Notification.objects.create(user=cls.customer, message=f'Note {i}')
+        cls.job = job
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, user, url, params=None):
+        if user is not None:
+            self.client.force_login(user)
+        response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response.query_report
+
+    def assertWithinBudget(self, report):
+        self.assertIsNotNone(report.budget, 'view has no @query_budget')
+        self.assertLessEqual(report.count, report.budget, report.templates)
+        self.assertEqual(report.repeated(), [])
+
+    def test_public_pages(self):
+        self.assertWithinBudget(self.get(None, reverse('dashboard')))
+        self.assertWithinBudget(self.get(None, reverse('job_list'), {'search': 'tap', 'location': 'Westlands'}))
+        self.assertWithinBudget(self.get(None, reverse('jobs:jobs'), {'category': 'Plumbing'}))
+        self.assertWithinBudget(self.get(None, reverse('fundi_locations_api'), {'bbox': '36,-2,37,-1', 'zoom': 12}))
+
+    def test_search_is_applied_within_budget(self):
+        # Fails if the view stops reading these parameters
+        found = self.client.get(reverse('job_list'), {'search': 'tap', 'location': 'Westlands'})
+        self.assertEqual(len(found.context['page_obj']), 12)
+        self.assertWithinBudget(found.query_report)
+        missed = self.client.get(reverse('job_list'), {'search': 'gate', 'location': 'Westlands'})
+        self.assertEqual(len(missed.context['page_obj']), 0)
+        self.assertWithinBudget(missed.query_report)
+
+    def test_customer_pages(self):
+        for url in (reverse('dashboard'), reverse('jobs:my_jobs'), reverse('job_detail', args=[self.job.pk]), reverse('profile')):
+            self.assertWithinBudget(self.get(self.customer, url))
+
+    def test_fundi_pages(self):
+        for url in (reverse('dashboard'), reverse('jobs:my_applications'), reverse('jobs:saved_searches'), reverse('profile')):
+            self.assertWithinBudget(self.get(self.fundi, url))
+
+    def test_repeated_queries_are_flagged(self):
+        @querybudget.query_budget(3)
+        def view(request):
+            titles = [application.job.title for application in JobApplication.objects.filter(fundi=self.fundi)]
+            return HttpResponse(', '.join(titles))
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+        middleware = querybudget.QueryInspectionMiddleware(get_response)
+        with self.assertLogs('core.querybudget', 'WARNING'):
+            response = middleware(RequestFactory().get('/'))
+        self.assertEqual(response['X-Query-Count'], '13')
+        self.assertEqual(response.query_report.repeated()[0][1], 12)
+        self.assertIn('13 queries, budget 3; N+1: 12x SELECT', response['X-Query-Warning'])
+
+    def test_in_lists_of_any_length_are_one_template(self):
+        self.assertEqual(
+            querybudget.template('SELECT * FROM t WHERE id IN (%s, %s,\n %s)'),
+            querybudget.template('SELECT * FROM t WHERE id IN (%s, %s)'),
+        )
+
+    async def test_async_requests_are_inspected(self):
+        @querybudget.query_budget(1)
+        async def view(request):
+            return HttpResponse(str(await JobApplication.objects.filter(fundi=self.fundi).acount()))
+
+        async def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return await view(request)
+        middleware = querybudget.QueryInspectionMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertEqual((response.content, response['X-Query-Count']), (b'12', '1'))
+        self.assertNotIn('X-Query-Warning', response)
+
+    @override_settings(QUERY_INSPECTION=False)
+    def test_off_without_inspection(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertNotIn('X-Query-Count', response)
@@ -0,0 +1,188 @@
+"""
+Typo-tolerant ("Westland" ~ "Westlands") matching of job titles, job
+locations and user locations by trigram similarity.
+
+Text is split into words, each padded pg_trgm-style ("  westlands ") and cut
+into three-letter grams. A value matches when at least ``threshold`` of the
+query's grams occur in it, which is close to pg_trgm's word_similarity.
+
+On PostgreSQL this is pg_trgm itself: ``word_similarity`` backed by a GIN
+gin_trgm_ops index on each column. On SQLite the core_trigram side table
+holds one row per (field, gram, object), rewritten when a save changes the
+text (compared with the value loaded from the database), so a match
+is a single indexed GROUP BY. Other databases fall back to icontains.
+"""
+import math
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Columns indexed for fuzzy matching, by model label
+INDEXED = {
+    'jobs.job': ('title', 'location'),
+    'users.user': ('location',),
+}
+DEFAULT_THRESHOLD = 0.6
+MIN_THRESHOLD = 0.3
+MAX_GRAMS = 60
+# pg_trgm's own default; the <% operator only uses the index above it
+PG_WORD_SIMILARITY_THRESHOLD = 0.6
+
+
+def grams(text):
+    """The set of padded trigrams of ``text``, pg_trgm-style."""
+    found = set()
+    for word in re.findall(r'[a-z0-9]+', (text or '').lower()):
+        padded = f'  {word} '
+        found.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return found
+
+
+def parse_threshold(value):
+    """A similarity threshold from the query string, or the default."""
+    try:
+        threshold = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_THRESHOLD
+    if math.isnan(threshold):
+        return DEFAULT_THRESHOLD
+    return min(max(threshold, MIN_THRESHOLD), 1.0)
+
+
+def _key(label, column):
+    return f'{label}.{column}'
+
+
+def condition(model, column, text, threshold=DEFAULT_THRESHOLD):
+    """A Q for rows of ``model`` whose ``column`` fuzzily contains ``text``."""
+    query = sorted(grams(text))[:MAX_GRAMS]
+    if not query:
+        return Q(pk__in=[])
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        needed = max(1, math.ceil(threshold * len(query)))
+        placeholders = ', '.join(['%s'] * len(query))
+        return Q(pk__in=RawSQL(
+            f'SELECT object_id FROM core_trigram WHERE field = %s AND gram IN ({placeholders}) '
+            f'GROUP BY object_id HAVING COUNT(*) >= %s',
+            [_key(model._meta.label_lower, column), *query, needed],
+        ))
+    if vendor == 'postgresql':
+        target = f'"{model._meta.db_table}"."{column}"'
+        sql = f'word_similarity(%s, {target}) >= %s'
+        params = [text, threshold]
+        if threshold >= PG_WORD_SIMILARITY_THRESHOLD:
+            sql = f'%s <%% {target} AND {sql}'
+            params = [text] + params
+        return Q(RawSQL(sql, params, output_field=BooleanField()))
+    return Q(**{f'{column}__icontains': text})
+
+
+def _rows(trigram_model, key, pk, text):
+    return [trigram_model(field=key, object_id=pk, gram=gram) for gram in grams(text)]
+
+
+def reindex(instance, columns=None, trigram_model=None):
+    """Rewrite the side-table rows of one object (SQLite only)."""
+    from core.models import Trigram
+    trigram_model = trigram_model or Trigram
+    if connection.vendor != 'sqlite':
+        return
+    columns = INDEXED[instance._meta.label_lower] if columns is None else columns
+    keys = [_key(instance._meta.label_lower, column) for column in columns]
+    trigram_model.objects.filter(field__in=keys, object_id=instance.pk).delete()
+    rows = []
+    for key, column in zip(keys, columns):
+        rows.extend(_rows(trigram_model, key, instance.pk, getattr(instance, column)))
+    trigram_model.objects.bulk_create(rows, batch_size=500)
+
+
+def rebuild(models=None, trigram_model=None):
+    """Recompute the whole side table (backfill / drift repair)."""
+    from django.apps import apps
+    from core.models import Trigram
+    trigram_model = trigram_model or Trigram
+    if connection.vendor != 'sqlite':
+        return 0
+    trigram_model.objects.all().delete()
+    total = 0
+    for label, columns in INDEXED.items():
+        model = (models or {}).get(label) or apps.get_model(label)
+        batch = []
+        for row in model.objects.values_list('pk', *columns).iterator():
+            for column, text in zip(columns, row[1:]):
+                batch.extend(_rows(trigram_model, _key(label, column), row[0], text))
+            if len(batch) >= 5000:
+                total += len(trigram_model.objects.bulk_create(batch, batch_size=500))
+                batch = []
+        total += len(trigram_model.objects.bulk_create(batch, batch_size=500))
+    return total
+
+
+def install(db=connection):
+    """pg_trgm and a GIN index per fuzzy-matched column (PostgreSQL only)."""
+    from django.apps import apps
+    if db.vendor != 'postgresql':
+        return
+    with db.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for label, columns in INDEXED.items():
+            table = apps.get_model(label)._meta.db_table
+            for column in columns:
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} USING GIN ({column} gin_trgm_ops)'
+                )
+
+
+def uninstall(db=connection):
+    from django.apps import apps
+    if db.vendor != 'postgresql':
+        return
+    with db.cursor() as cursor:
+        for label, columns in INDEXED.items():
+            table = apps.get_model(label)._meta.db_table
+            for column in columns:
+                cursor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+def indexed_text(instance):
+    """The loaded values of the object's indexed columns (for from_db)."""
+    return {
+        column: instance.__dict__[column]
+        for column in INDEXED[instance._meta.label_lower] if column in instance.__dict__
+    }
+
+
+def _changed_columns(instance, update_fields):
+    columns = INDEXED[instance._meta.label_lower]
+    if update_fields is not None:
+        columns = tuple(column for column in columns if column in update_fields)
+    # Columns still holding the text they were loaded or indexed with are skipped
+    indexed = getattr(instance, '_indexed_text', {})
+    return tuple(
+        column for column in columns if column not in indexed or indexed[column] != getattr(instance, column)
+    )
+
+
+@receiver(post_save, sender='jobs.Job')
+@receiver(post_save, sender='users.User')
+def object_saved(sender, instance, update_fields=None, raw=False, **kwargs):
+    columns = _changed_columns(instance, update_fields)
+    if columns and not raw:
+        reindex(instance, columns)
+        instance._indexed_text = {**getattr(instance, '_indexed_text', {}), **indexed_text(instance)}
+
+
+@receiver(post_delete, sender='jobs.Job')
+@receiver(post_delete, sender='users.User')
+def object_deleted(sender, instance, **kwargs):
+    from core.models import Trigram
+    if connection.vendor == 'sqlite':
+        label = instance._meta.label_lower
+        Trigram.objects.filter(
+            field__in=[_key(label, column) for column in INDEXED[label]], object_id=instance.pk
+        ).delete()
@@ -10,4 +10,10 @@ urlpatterns = [
     path('about/', views.about, name='about'),
     path('contact/', views.contact, name='contact'),
     path('api/fundi-locations/', views.fundi_locations_api, name='fundi_locations_api'),
-]
\ No newline at end of file
+    path('api/fundi-locations/stream/', views.fundi_locations_stream, name='fundi_locations_stream'),
+    path('api/fundi-locations/heartbeat/', views.fundi_heartbeat_api, name='fundi_heartbeat_api'),
+    path('api/fundi-tiles/<int:z>/<int:x>/<int:y>.bin', views.fundi_tile_api, name='fundi_tile_api'),
+    path('api/job-demand/', views.job_demand_api, name='job_demand_api'),
+    path('api/fundis/nearest/', views.nearest_fundis_api, name='nearest_fundis_api'),
+    path('api/autocomplete/', views.autocomplete_api, name='autocomplete_api'),
+]
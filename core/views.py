@@ -1,35 +1,362 @@
-from django.http import JsonResponse
+import asyncio
+import json
+import math
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from core import broadcast, clustering, demand, feed, gazetteer, geo, heartbeat, packed, trigram
+from core.nearest import get_fundi_index
+from core.querybudget import query_budget
+from core.replicas import reads_from_replica
+from jobs import autocomplete, facets, search, similar, skills
+
+
 # API endpoint for live fundi locations
+@query_budget(4)
+@reads_from_replica
 def fundi_locations_api(request):
-    skill_filter = request.GET.get('skill')
-    available_filter = request.GET.get('available')
-    fundis = User.objects.filter(active_role='fundi', fundi_profile__latitude__isnull=False, fundi_profile__longitude__isnull=False)
-    if skill_filter:
-        fundis = fundis.filter(fundi_profile__skills__icontains=skill_filter)
-    if available_filter == 'true':
-        fundis = fundis.filter(fundi_profile__availability=True)
+    """Fundi markers for the dashboard maps.
+
+    ``bbox`` (Leaflet ``west,south,east,north``) restricts the result to the
+    visible map area using the geohash index on FundiProfile; ``zoom`` caps
+    the precision of the covering cells. Without ``bbox`` every fundi with
+    coordinates is returned, as before.
+
+    Every response carries a ``cursor``. Polling with ``since=<cursor>``
+    returns only fundis changed after it (``delta: true``) plus the ids to
+    drop under ``removed``, or 304 when nothing changed at all.
+
+    With ``clusters=true`` and a ``zoom`` up to CLUSTER_MAX_ZOOM the response
+    is a list of precomputed ``clusters`` (count, centroid, dominant skill)
+    instead of individual fundis.
+
+    ``format=packed`` returns the same data in the compact binary layout
+    described in core.packed.
+    """
+    compact = request.GET.get('format') == 'packed'
+    since = request.GET.get('since')
+    try:
+        since = int(since) if since else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid since cursor.'}, status=400)
+    cursor = current_location_version()
+    if since is not None and since >= cursor:
+        return HttpResponseNotModified()
+
+    if request.GET.get('clusters') == 'true' and request.GET.get('bbox') and request.GET.get('zoom'):
+        try:
+            bbox = geo.parse_bbox(request.GET['bbox'])
+            zoom = int(request.GET['zoom'])
+        except ValueError:
+            return JsonResponse({'error': 'Invalid bbox or zoom.'}, status=400)
+        if zoom <= clustering.CLUSTER_MAX_ZOOM:
+            clusters = clustering.clusters_for_bbox(
+                bbox, zoom,
+                skill=skills.canonical_name(request.GET.get('skill')),
+                available_only=request.GET.get('available') == 'true',
+            )
+            if compact:
+                return HttpResponse(packed.encode_clusters(clusters, cursor), content_type=packed.CONTENT_TYPE)
+            return JsonResponse({'clusters': clusters, 'cursor': cursor, 'delta': False})
+
+    profiles = FundiProfile.objects.all()
+    if since is not None:
+        profiles = profiles.filter(location_version__gt=since)
+    try:
+        matching = _filter_fundi_locations(request, profiles)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid bbox or zoom.'}, status=400)
+    data = _fundi_points(matching)
+    response = {'fundis': data, 'cursor': cursor, 'delta': since is not None}
+    if since is not None:
+        # Fundis that changed or were deleted where this view could have shown
+        # them (moved out of view, became unavailable, switched role...). A
+        # changed filter field may be what drops them, so only the place counts.
+        tombstones = RemovedFundiLocation.objects.filter(location_version__gt=since)
+        if request.GET.get('bbox'):
+            bbox = geo.parse_bbox(request.GET['bbox'])
+            zoom = int(request.GET['zoom']) if request.GET.get('zoom') else None
+            precision = min(geo.precision_for_bbox(bbox, zoom), TOMBSTONE_PRECISION)
+            tombstones = tombstones.filter(geo.prefix_q(geo.cover(bbox, precision), 'cell'))
+        kept = {fundi['id'] for fundi in data}
+        response['removed'] = sorted(set(tombstones.values_list('user_id', flat=True)) - kept)
+    if compact:
+        body = packed.encode_fundis(data, cursor, delta=since is not None, removed=response.get('removed', ()))
+        return HttpResponse(body, content_type=packed.CONTENT_TYPE)
+    return JsonResponse(response)
+
+
+# Seconds a rendered tile stays in the cache, and the public max-age on it
+TILE_CACHE_TIMEOUT = 300
+TILE_MAX_AGE = 10
+
+
+@query_budget(4)
+@reads_from_replica
+def fundi_tile_api(request, z, x, y):
+    """One web mercator tile of the fundi map, packed as in core.packed.
+
+    Tiles up to CLUSTER_MAX_ZOOM hold the clusters whose centroid falls in
+    the tile; deeper tiles hold the fundis themselves. ``skill`` and
+    ``available`` filter as in fundi_locations_api. A rendered tile is
+    cached under the current location cursor and served with an ETag and a
+    short public max-age, so a CDN in front can share it between clients.
+    """
+    try:
+        bbox = geo.tile_bounds(z, x, y)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid tile.'}, status=404)
+    cursor = current_location_version()
+    etag = f'"{cursor}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    skill = skills.canonical_name(request.GET.get('skill', ''))
+    available_only = request.GET.get('available') == 'true'
+    key = 'fundi-tile:{}:{}:{}:{}:{}:{}'.format(
+        cursor, z, x, y, int(available_only), quote(clustering.normalize_skill(skill))
+    )
+    body = cache.get(key)
+    if body is None:
+        if z <= clustering.CLUSTER_MAX_ZOOM:
+            south, west, north, east = bbox
+            clusters = [
+                cluster
+                for cluster in clustering.clusters_for_bbox(bbox, z, skill=skill, available_only=available_only)
+                if south <= cluster['latitude'] < north and west <= cluster['longitude'] < east
+            ]
+            body = packed.encode_clusters(clusters, cursor)
+        else:
+            profiles = _filter_fundi_locations(request, FundiProfile.objects.all(), bbox=bbox, zoom=z)
+            body = packed.encode_fundis(_fundi_points(profiles), cursor)
+        cache.set(key, body, TILE_CACHE_TIMEOUT)
+    response = HttpResponse(body, content_type=packed.CONTENT_TYPE)
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={TILE_MAX_AGE}'
+    return response
+
+
+# Seconds between keep-alive comments on an idle stream
+STREAM_KEEPALIVE = 15
+# Largest k accepted by nearest_fundis_api
+MAX_NEAREST = 200
+
+
+async def fundi_locations_stream(request):
+    """Server-Sent Events stream of fundi map changes.
+
+    Accepts the same ``bbox``, ``skill`` and ``available`` filters as
+    fundi_locations_api; a skill that is not in the catalogue is rejected
+    with a 400. Each event is ``{"type": "upsert", "fundi": {...}}``
+    or ``{"type": "remove", "id": ...}`` with the location cursor it was
+    published at. Only served under ASGI; WSGI deployments keep polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Live updates require an ASGI server.'}, status=501)
+    try:
+        bbox = geo.parse_bbox(request.GET['bbox']) if request.GET.get('bbox') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid bbox.'}, status=400)
+    skill = None
+    if request.GET.get('skill'):
+        # Synonyms resolve to their catalogue skill, as in fundi_locations_api
+        skill = await sync_to_async(skills.resolve)(request.GET['skill'])
+        if skill is None:
+            return JsonResponse({'error': 'Unknown skill.'}, status=400)
+    broadcast.ensure_started()
+    broadcaster = broadcast.get_broadcaster()
+    subscription = broadcaster.subscribe(
+        bbox=bbox,
+        skill_id=skill[0] if skill else None,
+        available_only=request.GET.get('available') == 'true',
+    )
+
+    async def events():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'data: {json.dumps(message)}\n\n'
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_POST
+def fundi_heartbeat_api(request):
+    """Position (``lat``, ``lng``) and optional ``available`` ping from a fundi.
+
+    Pings are buffered and written in batches by core.heartbeat, so the
+    response only acknowledges receipt (202) and the map catches up within
+    FUNDI_HEARTBEAT_FLUSH_SECONDS.
+    """
+    if not request.user.is_authenticated or request.user.active_role != 'fundi':
+        return JsonResponse({'error': 'Only fundis can send location heartbeats.'}, status=403)
+    if not hasattr(request.user, 'fundi_profile'):
+        return JsonResponse({'error': 'Complete your fundi profile first.'}, status=409)
+    try:
+        latitude = float(request.POST['lat'])
+        longitude = float(request.POST['lng'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat and lng are required numbers.'}, status=400)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return JsonResponse({'error': 'lat or lng out of range.'}, status=400)
+    available = request.POST.get('available')
+    available = available == 'true' if available in ('true', 'false') else None
+    heartbeat.get_buffer().record(request.user.pk, str(latitude), str(longitude), available)
+    return JsonResponse({'queued': True}, status=202)
+
+
+# Public max-age of the job-demand heatmap
+DEMAND_MAX_AGE = 60
+
+
+def job_demand_api(request):
+    """Open-job heatmap cells for ``bbox`` at ``zoom``.
+
+    Optional ``category`` (name) and ``urgency`` narrow the counts. Served
+    from the JobDemandCell aggregates maintained by core.demand.
+    """
+    try:
+        bbox = geo.parse_bbox(request.GET['bbox'])
+        zoom = int(request.GET['zoom'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'bbox and zoom are required.'}, status=400)
+    cells = demand.heatmap(
+        bbox, zoom,
+        category=request.GET.get('category'),
+        urgency=request.GET.get('urgency'),
+    )
+    response = JsonResponse({'cells': cells})
+    response['Cache-Control'] = f'public, max-age={DEMAND_MAX_AGE}'
+    return response
+
+
+# Public max-age of autocomplete suggestions
+AUTOCOMPLETE_MAX_AGE = 60
+
+
+def autocomplete_api(request):
+    """Suggestions for the prefix ``q`` from the per-worker prefix index.
+
+    Optional ``kind`` (title, category or location, comma separated) limits
+    what is suggested, e.g. ``kind=location`` for a location box.
+    """
+    kinds = tuple(kind for kind in request.GET.get('kind', '').split(',') if kind in autocomplete.KINDS)
+    suggestions = autocomplete.suggest(request.GET.get('q', ''), kinds or autocomplete.KINDS)
+    response = JsonResponse({'suggestions': suggestions})
+    response['Cache-Control'] = f'public, max-age={AUTOCOMPLETE_MAX_AGE}'
+    return response
+
+
+def nearest_fundis_api(request):
+    """The ``k`` fundis closest to ``lat``/``lng``, nearest first.
+
+    Optional ``skill``, ``radius_km`` and ``available`` (defaults to true)
+    narrow the candidates. Ranking runs on the per-worker NumPy index, so
+    the database is only asked for the details of the fundis returned.
+    """
+    try:
+        latitude = float(request.GET['lat'])
+        longitude = float(request.GET['lng'])
+        k = min(max(int(request.GET.get('k', 20)), 1), MAX_NEAREST)
+        radius_km = float(request.GET['radius_km']) if request.GET.get('radius_km') else None
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat and lng are required numbers.'}, status=400)
+    # NaN fails every comparison, so it is rejected here too
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return JsonResponse({'error': 'lat or lng out of range.'}, status=400)
+    if radius_km is not None and not 0 < radius_km < math.inf:
+        return JsonResponse({'error': 'radius_km must be a positive number.'}, status=400)
+    ranked = get_fundi_index().nearest(
+        latitude, longitude, k=k,
+        skill=skills.canonical_name(request.GET.get('skill')),
+        available_only=request.GET.get('available', 'true') == 'true',
+        max_km=radius_km,
+    )
+    profiles = FundiProfile.objects.select_related('user').in_bulk([user_id for user_id, _ in ranked], field_name='user_id')
     data = []
-    for fundi in fundis:
-        fp = fundi.fundi_profile
+    for user_id, distance in ranked:
+        profile = profiles.get(user_id)
+        if profile is None:
+            continue
         data.append({
-            'id': fundi.id,
-            'name': f'{fundi.first_name} {fundi.last_name}',
-            'latitude': float(fp.latitude),
-            'longitude': float(fp.longitude),
-            'skills': fp.skills,
-            'location': fundi.location,
-            'available': fp.availability,
+            'id': user_id,
+            'name': f'{profile.user.first_name} {profile.user.last_name}',
+            'latitude': float(profile.latitude),
+            'longitude': float(profile.longitude),
+            'distance_km': round(distance, 3),
+            'skills': profile.skills,
+            'location': profile.user.location,
+            'available': profile.availability,
         })
     return JsonResponse({'fundis': data})
+
+
+def _filter_fundi_locations(request, profiles, bbox=None, zoom=None):
+    """Apply the map's query-string filters; raises ValueError on a bad bbox.
+
+    An explicit ``bbox`` (and ``zoom``) replaces the query-string ones.
+    """
+    profiles = profiles.filter(
+        user__active_role='fundi', latitude__isnull=False, longitude__isnull=False
+    )
+    if bbox is None and request.GET.get('bbox'):
+        bbox = geo.parse_bbox(request.GET['bbox'])
+        zoom = int(request.GET['zoom']) if request.GET.get('zoom') else None
+    if bbox is not None:
+        profiles = profiles.filter(geo.bbox_q(bbox, zoom))
+    skill_filter = request.GET.get('skill')
+    if skill_filter:
+        # Indexed join through the catalogue; synonyms resolve to their skill
+        skill = skills.resolve(skill_filter)
+        profiles = profiles.filter(skill_set=skill[0]) if skill else profiles.none()
+    if request.GET.get('available') == 'true':
+        profiles = profiles.filter(availability=True)
+    return profiles
+
+
+def _fundi_points(profiles):
+    rows = profiles.values_list(
+        'user_id', 'user__first_name', 'user__last_name', 'latitude', 'longitude',
+        'skills', 'user__location', 'availability',
+    )
+    return [
+        {
+            'id': user_id,
+            'name': f'{first_name} {last_name}',
+            'latitude': float(latitude),
+            'longitude': float(longitude),
+            'skills': skills,
+            'location': location,
+            'available': available,
+        }
+        for user_id, first_name, last_name, latitude, longitude, skills, location, available in rows
+    ]
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
 from jobs.models import Job, Category
-from users.models import User
-from django.core.paginator import Paginator
+from users.models import TOMBSTONE_PRECISION, User, FundiProfile, RemovedFundiLocation, current_location_version
+from core.pagination import CursorPaginator
 
 
+@query_budget(10)
+@reads_from_replica
 def dashboard(request):
     """Main dashboard view - shows different content based on user role"""
     if not request.user.is_authenticated:
@@ -38,7 +365,9 @@ def dashboard(request):
         categories = Category.objects.all()[:8]
         return render(request, 'core/landing.html', {
             'jobs': jobs,
-            'categories': categories
+            'categories': categories,
+            'demand_categories': Category.objects.values_list('name', flat=True),
+            'urgency_choices': Job.URGENCY_CHOICES,
         })
     
     # Enforce email verification for all logged-in users
@@ -68,16 +397,10 @@ def dashboard(request):
         })
 
     elif request.user.active_role == 'fundi':
-        # Fundi dashboard - show available jobs filtered by fundi skills/category
-        fundi_skills = request.user.fundi_profile.skills if hasattr(request.user, 'fundi_profile') else []
-        available_jobs = Job.objects.filter(
-            status='open',
-            category__name__in=fundi_skills
-        ).exclude(
-            applications__fundi=request.user
-        ).order_by('-created_at')[:6]
-
-        my_applications = request.user.job_applications.all().order_by('-created_at')[:5]
+        # Fundi dashboard - top of the fundi's materialized job feed (core.feed)
+        available_jobs = feed.top(request.user, 6, within_km=geo.parse_km(request.GET.get('within_km')))
+
+        my_applications = request.user.job_applications.select_related('job').order_by('-created_at')[:5]
         assigned_jobs = request.user.assigned_jobs.filter(
             status__in=['in_progress', 'completed']
         ).order_by('-updated_at')[:5]
@@ -92,39 +415,63 @@ def dashboard(request):
     return render(request, 'core/dashboard.html')
 
 
+@query_budget(12)
+@reads_from_replica
 def job_list(request):
     """List all available jobs with filtering and search"""
     jobs = Job.objects.filter(status='open')
     categories = Category.objects.all()
     
+    # How close a misspelt title or location must be, 0.3 to 1
+    similarity = trigram.parse_threshold(request.GET.get('similarity'))
+    
     # Search functionality
     search_query = request.GET.get('search', '')
     if search_query:
-        jobs = jobs.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(location__icontains=search_query)
-        )
+        # Full-text index, most relevant first, plus titles that are near misses
+        jobs = search.search(jobs, search_query, fuzzy_threshold=similarity)
+    
+    # Faceted filters, applied after the sidebar counts below
+    filters = {'category': Q(), 'urgency': Q(), 'location': Q()}
     
     # Category filter
     category_filter = request.GET.get('category', '')
     if category_filter:
-        jobs = jobs.filter(category__name=category_filter)
+        filters['category'] = Q(category__name=category_filter)
     
     # Location filter
     location_filter = request.GET.get('location', '')
+    location_key = None
     if location_filter:
-        jobs = jobs.filter(location__icontains=location_filter)
+        place = gazetteer.resolve(location_filter, persist=False)
+        if place is not None:
+            filters['location'] = Q(place__in=place.area_ids())
+            location_key = place.pk
+        else:
+            # Unknown place: trigram match, so "Westland" finds "Westlands"
+            filters['location'] = trigram.condition(Job, 'location', location_filter, similarity)
+            location_key = location_filter.lower()
     
     # Urgency filter
     urgency_filter = request.GET.get('urgency', '')
     if urgency_filter:
-        jobs = jobs.filter(urgency=urgency_filter)
+        filters['urgency'] = Q(urgency=urgency_filter)
+    
+    # Distance filter, from lat/lng or the signed-in user's position
+    within_km = geo.parse_km(request.GET.get('within_km'))
+    origin = geo.request_origin(request) if within_km else None
+    if origin:
+        jobs = geo.within_km(jobs, *origin, within_km)
+    
+    # Category, urgency and town counts in one cached aggregate
+    facet_counts = facets.counts(jobs, filters, [
+        'core', search.terms(search_query), category_filter, urgency_filter, location_key, within_km, origin,
+        similarity,
+    ])
+    jobs = jobs.filter(*filters.values())
     
-    # Pagination
-    paginator = Paginator(jobs, 12)  # Show 12 jobs per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: deep pages cost the same as the first
+    page_obj = CursorPaginator(jobs, 12).page(request.GET.get('cursor'))  # Show 12 jobs per page
     
     context = {
         'page_obj': page_obj,
@@ -133,11 +480,14 @@ def job_list(request):
         'category_filter': category_filter,
         'location_filter': location_filter,
         'urgency_filter': urgency_filter,
+        'within_km': within_km,
+        'facets': facet_counts,
     }
     
     return render(request, 'core/job_list.html', context)
 
 
+@query_budget(10)
 def job_detail(request, job_id):
     """Show detailed view of a specific job"""
     job = get_object_or_404(Job, id=job_id)
@@ -149,6 +499,8 @@ def job_detail(request, job_id):
     context = {
         'job': job,
         'user_has_applied': user_has_applied,
+        # Precomputed neighbours: one cache lookup (see jobs.similar)
+        'similar_jobs': similar.similar_jobs(job),
     }
     
     return render(request, 'core/job_detail.html', context)
@@ -48,6 +48,9 @@ DEBUG = os.environ.get('DJANGO_DEBUG', 'True') == 'True'
 if DEBUG:
     print('WARNING: DEBUG mode is ON. Do not use DEBUG=True in production!')
 
+# Count queries per request and flag N+1s and budget overruns (core.querybudget)
+QUERY_INSPECTION = os.environ.get('QUERY_INSPECTION', str(DEBUG)) == 'True'
+
 ALLOWED_HOSTS = []
 
 
@@ -76,6 +79,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.querybudget.QueryInspectionMiddleware',
+    'core.replicas.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -109,12 +114,81 @@ WSGI_APPLICATION = 'fundiconnect.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_ENGINE picks the profile: 'sqlite' (default) or 'postgres'.
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgres':
+    # Either a psycopg pool per worker (POSTGRES_POOL, needs psycopg[pool])
+    # or one persistent connection per thread kept for CONN_MAX_AGE seconds.
+    # Django refuses both at once; health checks apply to either.
+    POSTGRES_POOL = os.environ.get('POSTGRES_POOL', 'True') == 'True'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': get_env_variable('POSTGRES_DB', 'fundiconnect'),
+            'USER': get_env_variable('POSTGRES_USER', 'fundiconnect'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD') or read_secret_file('POSTGRES_PASSWORD') or '',
+            'HOST': get_env_variable('POSTGRES_HOST', 'localhost'),
+            'PORT': get_env_variable('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if POSTGRES_POOL else int(get_env_variable('POSTGRES_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if POSTGRES_POOL:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(get_env_variable('POSTGRES_POOL_MIN_SIZE', '2')),
+            'max_size': int(get_env_variable('POSTGRES_POOL_MAX_SIZE', '10')),
+            'timeout': int(get_env_variable('POSTGRES_POOL_TIMEOUT', '10')),
+        }
+elif DATABASE_ENGINE == 'sqlite':
+    # Write transactions start IMMEDIATE so a busy database waits on
+    # busy_timeout instead of failing mid-transaction. WAL lets readers run
+    # alongside the writer and synchronous=NORMAL only syncs at checkpoints,
+    # but journal_mode is stored in the database file itself. It is only
+    # turned on for a database configured with SQLITE_PATH (or SQLITE_WAL),
+    # never for the db.sqlite3 tracked in the repository.
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', str('SQLITE_PATH' in os.environ)) == 'True'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': get_env_variable('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    ('PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL;' if SQLITE_WAL else '')
+                    + 'PRAGMA mmap_size=134217728;'
+                    'PRAGMA busy_timeout=20000;'
+                ),
+            },
+        }
     }
-}
+else:
+    raise ImproperlyConfigured(f"DATABASE_ENGINE must be 'sqlite' or 'postgres', not {DATABASE_ENGINE!r}")
+
+# Read replicas (core.replicas): comma-separated SQLite files, or PostgreSQL
+# host[:port]s serving a streaming-replicated copy of POSTGRES_DB.
+if DATABASE_ENGINE == 'postgres':
+    _replica_locations = os.environ.get('POSTGRES_REPLICA_HOSTS', '')
+else:
+    _replica_locations = os.environ.get('SQLITE_REPLICA_PATHS', '')
+DATABASE_REPLICAS = []
+for _number, _location in enumerate(filter(None, map(str.strip, _replica_locations.split(','))), 1):
+    _replica = {**DATABASES['default'], 'OPTIONS': dict(DATABASES['default']['OPTIONS'])}
+    if DATABASE_ENGINE == 'postgres':
+        _replica['HOST'], _, _port = _location.partition(':')
+        _replica['PORT'] = _port or _replica['PORT']
+    else:
+        _replica['NAME'] = _location
+        _replica['OPTIONS']['init_command'] += 'PRAGMA query_only=ON;'
+    # Tests see the test database through every replica
+    _replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica{_number}'] = _replica
+    DATABASE_REPLICAS.append(f'replica{_number}')
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# How long a client reads from the primary after writing, covering replica lag
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '5'))
 
 
 # Password validation
@@ -230,6 +304,18 @@ if not GMAIL_SMTP_PORT:
         except ValueError:
             GMAIL_SMTP_PORT = 587
 
+# Live fundi map updates (Server-Sent Events, needs an ASGI server).
+# Use 'core.broadcast.RedisBackend' when running more than one worker.
+FUNDI_BROADCAST_BACKEND = get_env_variable('FUNDI_BROADCAST_BACKEND', 'core.broadcast.InProcessBackend')
+FUNDI_BROADCAST_REDIS_URL = get_env_variable('FUNDI_BROADCAST_REDIS_URL', 'redis://localhost:6379/0')
+# Seconds between bulk writes of buffered location heartbeats (0 disables the
+# background flush; call core.heartbeat.get_buffer().flush() yourself).
+FUNDI_HEARTBEAT_FLUSH_SECONDS = float(get_env_variable('FUNDI_HEARTBEAT_FLUSH_SECONDS', '2'))
+
+# Run core.tasks jobs (notification emails) in the calling thread instead of
+# the background worker; handy for tests and one-off scripts.
+BACKGROUND_TASKS_INLINE = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Job, JobImage, JobApplication, Review
+from .models import Category, Job, JobImage, JobApplication, Review, SavedSearch, Skill
 
 
 class JobImageInline(admin.TabularInline):
@@ -17,6 +17,7 @@ class JobApplicationInline(admin.TabularInline):
 
 class JobAdmin(admin.ModelAdmin):
     list_display = ('title', 'customer', 'category', 'status', 'urgency', 'budget_min', 'budget_max', 'created_at')
+    list_select_related = ('customer', 'category')
     list_filter = ('status', 'urgency', 'category', 'created_at')
     search_fields = ('title', 'customer__email', 'description', 'location')
     readonly_fields = ('created_at', 'updated_at')
@@ -46,8 +47,15 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
 
 
+class SkillAdmin(admin.ModelAdmin):
+    list_display = ('name', 'category')
+    list_filter = ('category',)
+    search_fields = ('name',)
+
+
 class JobApplicationAdmin(admin.ModelAdmin):
     list_display = ('job', 'fundi', 'status', 'proposed_rate', 'created_at')
+    list_select_related = ('job', 'fundi')
     list_filter = ('status', 'created_at')
     search_fields = ('job__title', 'fundi__user__email', 'fundi__user__first_name')
     readonly_fields = ('created_at',)
@@ -64,15 +72,26 @@ class JobApplicationAdmin(admin.ModelAdmin):
 
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ('job', 'reviewer', 'reviewee', 'rating', 'created_at')
+    list_select_related = ('job', 'reviewer', 'reviewee')
     list_filter = ('rating', 'created_at')
     search_fields = ('job__title', 'reviewer__email', 'reviewee__email')
     readonly_fields = ('created_at',)
 
 
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ('user', 'keywords', 'category', 'location', 'budget_min', 'budget_max', 'created_at')
+    list_select_related = ('user', 'category')
+    list_filter = ('category',)
+    search_fields = ('user__email', 'keywords', 'location')
+    raw_id_fields = ('user', 'place')
+
+
 admin.site.register(Category, CategoryAdmin)
+admin.site.register(Skill, SkillAdmin)
 admin.site.register(Job, JobAdmin)
 admin.site.register(JobApplication, JobApplicationAdmin)
 admin.site.register(Review, ReviewAdmin)
+admin.site.register(SavedSearch, SavedSearchAdmin)
 
 # Customize admin site header and title
 admin.site.site_header = "FundiConnect Admin"
@@ -0,0 +1,192 @@
+"""
+Prefix suggestions for the job search and location boxes.
+
+Each worker keeps one sorted list of normalized terms: words from open job
+titles, category names, and gazetteer places with their aliases. A prefix
+is two bisects into that list, so typing never touches the database. New
+jobs, categories and places are added as they are saved. The whole index
+is rebuilt every REBUILD_SECONDS so that words from closed jobs fade out.
+
+Only a worker's first index is built in a request. Later rebuilds run on
+core.tasks and are swapped in when done; until then readers keep the old
+index, and terms saved meanwhile are replayed onto the new one.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from django.db.models import Count, Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core import tasks
+
+KINDS = ('title', 'category', 'location')
+MIN_WORD = 3
+# Title words that suggest nothing
+STOP_WORDS = {'and', 'the', 'for', 'with', 'from', 'need', 'needed', 'urgent', 'fix', 'new', 'my', 'our'}
+REBUILD_SECONDS = 600
+MAX_SUGGESTIONS = 8
+MAX_PREFIX = 50
+
+_index = None
+_built_at = 0.0
+# Terms added while a rebuild is running, or None when none is
+_pending = None
+_index_lock = threading.Lock()
+# Held while a worker builds its first index
+_first_build_lock = threading.Lock()
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'[a-z0-9]+', str(text or '').lower()))[:MAX_PREFIX]
+
+
+def title_words(title):
+    return {
+        word for word in re.findall(r'[a-z]+', (title or '').lower())
+        if len(word) >= MIN_WORD and word not in STOP_WORDS
+    }
+
+
+class PrefixIndex:
+    """Sorted (term, kind) keys, each with a label and a popularity weight."""
+
+    def __init__(self):
+        self.keys = []
+        self.entries = {}
+
+    def add(self, kind, term, label, weight=1):
+        key = (normalize(term), kind)
+        if not key[0]:
+            return
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = [label, weight]
+            bisect.insort(self.keys, key)
+        else:
+            entry[1] += weight
+
+    def suggest(self, prefix, kinds=KINDS, limit=MAX_SUGGESTIONS):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.keys, (prefix,))
+        end = bisect.bisect_left(self.keys, (prefix + '\uffff',), start)
+        best = {}
+        for key in self.keys[start:end]:
+            if key[1] in kinds:
+                label, weight = self.entries[key]
+                # An alias and the name of the same place count once
+                best[label, key[1]] = max(weight, best.get((label, key[1]), 0))
+        top = heapq.nlargest(limit, best.items(), key=lambda item: (item[1], item[0][1] != 'title'))
+        return [{'label': label, 'kind': kind} for (label, kind), _ in top]
+
+
+def build(job_model=None, category_model=None, place_model=None):
+    from core.models import Place
+    from .models import Category, Job
+    job_model = job_model or Job
+    category_model = category_model or Category
+    place_model = place_model or Place
+    index = PrefixIndex()
+    for (title,) in job_model.objects.filter(status='open').values_list('title').iterator():
+        for word in title_words(title):
+            index.add('title', word, word)
+    for name, jobs in category_model.objects.annotate(
+        open_jobs=Count('job', filter=Q(job__status='open'))
+    ).values_list('name', 'open_jobs'):
+        index.add('category', name, name, jobs + 1)
+    places = place_model.objects.select_related('parent').annotate(
+        open_jobs=Count('jobs', filter=Q(jobs__status='open'))
+    )
+    for place in places:
+        for term in [place.name] + list(place.aliases or []):
+            index.add('location', term, str(place), place.open_jobs + 1)
+    return index
+
+
+def get_index():
+    with _index_lock:
+        index, stale = _index, time.monotonic() - _built_at > REBUILD_SECONDS
+    if index is None:
+        with _first_build_lock:
+            if _index is None:
+                rebuild()
+        return _index
+    if stale:
+        _start_rebuild()
+    return index
+
+
+def _start_rebuild():
+    global _pending
+    with _index_lock:
+        if _pending is not None:
+            return
+        _pending = []
+    tasks.enqueue(rebuild)
+
+
+def rebuild():
+    """Build a new index without holding the lock, then swap it in."""
+    global _index, _built_at, _pending
+    with _index_lock:
+        if _pending is None:
+            _pending = []
+    index = None
+    try:
+        index = build()
+    finally:
+        with _index_lock:
+            if index is not None:
+                for item in _pending:
+                    index.add(*item)
+                _index, _built_at = index, time.monotonic()
+            _pending = None
+
+
+def reset():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def suggest(prefix, kinds=KINDS, limit=MAX_SUGGESTIONS):
+    """Up to ``limit`` suggestions for ``prefix``, most popular first."""
+    index = get_index()
+    with _index_lock:
+        return index.suggest(prefix, kinds, limit)
+
+
+def _add(items):
+    """Fold new terms into this worker's index, and any rebuild in progress."""
+    with _index_lock:
+        if _index is not None:
+            for item in items:
+                _index.add(*item)
+        if _pending is not None:
+            _pending.extend(items)
+
+
+@receiver(post_save, sender='jobs.Job')
+def job_saved(sender, instance, created, **kwargs):
+    if created and instance.status == 'open' and (_index is not None or _pending is not None):
+        items = [('title', word, word) for word in title_words(instance.title)]
+        if instance.category_id:
+            items.append(('category', instance.category.name, instance.category.name))
+        if instance.place_id:
+            items.append(('location', instance.place.name, str(instance.place)))
+        _add(items)
+
+
+@receiver(post_save, sender='jobs.Category')
+def category_saved(sender, instance, created, **kwargs):
+    _add([('category', instance.name, instance.name, int(created))])
+
+
+@receiver(post_save, sender='core.Place')
+def place_saved(sender, instance, created, **kwargs):
+    _add([('location', term, str(instance), int(created)) for term in [instance.name] + list(instance.aliases or [])])
@@ -0,0 +1,120 @@
+"""
+Per-job counters kept on the Job row: applications, pending applications,
+messages, and whether any payment has completed.
+
+Pages that list jobs read them as plain columns instead of running a COUNT
+or EXISTS per job. Saving or deleting an application, message or payment
+adjusts its job's row with a single UPDATE of F() expressions, so
+concurrent writers never lose each other's increments. Job.save leaves the
+columns out of its UPDATE for the same reason. Bulk ``update()``s and raw
+SQL bypass the signals; ``python manage.py recount`` repairs any drift.
+"""
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+FIELDS = ('application_count', 'pending_application_count', 'message_count', 'has_completed_payment')
+RECOUNT_BATCH = 500
+
+
+def _expected(models=None):
+    """Expressions that compute each counter from the rows."""
+    from .models import JobApplication, Message, Payment
+    models = models or {}
+    application_model = models.get('jobs.jobapplication', JobApplication)
+    message_model = models.get('jobs.message', Message)
+    payment_model = models.get('jobs.payment', Payment)
+
+    def count(model, **filters):
+        rows = model.objects.filter(job_id=OuterRef('pk'), **filters).order_by().values('job_id')
+        return Coalesce(Subquery(rows.annotate(rows=Count('pk')).values('rows')), 0)
+    return {
+        'application_count': count(application_model),
+        'pending_application_count': count(application_model, status='pending'),
+        'message_count': count(message_model),
+        'has_completed_payment': _completed_payment(payment_model),
+    }
+
+
+def _completed_payment(payment_model=None):
+    from .models import Payment
+    payment_model = payment_model or Payment
+    return Exists(payment_model.objects.filter(job_id=OuterRef('pk'), status='completed'))
+
+
+def _job(job_id):
+    from .models import Job
+    return Job.objects.filter(pk=job_id)
+
+
+def recount_job(job_id):
+    _job(job_id).update(**_expected())
+
+
+def recount(models=None):
+    """Recompute every job's counters from the rows; returns how many jobs had drifted."""
+    from .models import Job
+    job_model = (models or {}).get('jobs.job', Job)
+    expected = _expected(models)
+    drift = Q()
+    for name in FIELDS:
+        drift |= ~Q(**{name: F(f'expected_{name}')})
+    drifted = list(
+        job_model.objects.annotate(**{f'expected_{name}': value for name, value in expected.items()})
+        .filter(drift).values_list('pk', flat=True)
+    )
+    for start in range(0, len(drifted), RECOUNT_BATCH):
+        job_model.objects.filter(pk__in=drifted[start:start + RECOUNT_BATCH]).update(**expected)
+    return len(drifted)
+
+
+def application_changed(job_id, old_status, new_status):
+    """Count an application going from ``old_status`` to ``new_status`` (None: absent)."""
+    changes = {}
+    applications = (new_status is not None) - (old_status is not None)
+    pending = (new_status == 'pending') - (old_status == 'pending')
+    if applications:
+        changes['application_count'] = F('application_count') + applications
+    if pending:
+        changes['pending_application_count'] = F('pending_application_count') + pending
+    if changes:
+        _job(job_id).update(**changes)
+
+
+@receiver(post_save, sender='jobs.JobApplication')
+def application_saved(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    if created:
+        application_changed(instance.job_id, None, instance.status)
+    elif hasattr(instance, '_loaded_status'):
+        application_changed(instance.job_id, instance._loaded_status, instance.status)
+    else:
+        # Saved without having been loaded: the old status is unknown
+        recount_job(instance.job_id)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender='jobs.JobApplication')
+def application_deleted(sender, instance, **kwargs):
+    application_changed(instance.job_id, getattr(instance, '_loaded_status', instance.status), None)
+
+
+@receiver(post_save, sender='jobs.Message')
+def message_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _job(instance.job_id).update(message_count=F('message_count') + 1)
+
+
+@receiver(post_delete, sender='jobs.Message')
+def message_deleted(sender, instance, **kwargs):
+    _job(instance.job_id).update(message_count=F('message_count') - 1)
+
+
+@receiver(post_save, sender='jobs.Payment')
+@receiver(post_delete, sender='jobs.Payment')
+def payment_changed(sender, instance, raw=False, **kwargs):
+    # Any payment may have been the completed one, so ask the table
+    if instance.job_id and not raw:
+        _job(instance.job_id).update(has_completed_payment=_completed_payment())
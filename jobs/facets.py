@@ -0,0 +1,100 @@
+"""
+Facet counts for the job list sidebar.
+
+All the counts for one search come from a single aggregate query: one
+conditional COUNT per category, urgency and town. Each facet is counted
+with every *other* active filter applied but not its own, so the sidebar
+shows what picking another value would return.
+
+Results are cached per normalized filter set under a version number that
+Job.save bumps (after commit) whenever an open job appears, closes, or
+changes category, urgency or place. Edits to title or description only
+show up when the cache times out.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+FACET_CACHE_TIMEOUT = 300
+VERSION_KEY = 'job-facets-version'
+
+# Columns of Job that the counts depend on
+STATE_FIELDS = ('status', 'category_id', 'urgency', 'place_id')
+
+
+def state(status, category_id, urgency, place_id):
+    """What the counts see of a job: None unless it is open."""
+    if status != 'open':
+        return None
+    return (category_id, urgency, place_id)
+
+
+def version():
+    # Started from the clock, so a version lost from the cache is never reused
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def invalidate():
+    """Retire every cached facet count, once the current transaction commits."""
+    def bump():
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, time.time_ns(), None)
+    transaction.on_commit(bump)
+
+
+@receiver(post_delete, sender='jobs.Job')
+def job_deleted(sender, instance, **kwargs):
+    invalidate()
+
+
+def _count(filters, own, condition):
+    """COUNT of rows matching ``condition`` and every filter but ``own``."""
+    q = condition
+    for name, other in filters.items():
+        if name != own:
+            q &= other
+    return Count('pk', filter=q)
+
+
+def counts(jobs, filters, key):
+    """Category, urgency and town counts for ``jobs`` (the unfaceted search).
+
+    ``filters`` maps 'category', 'urgency' and 'location' to the Q of the
+    active filter (an empty Q when unset); ``key`` is anything JSON-able
+    that identifies the search, e.g. the normalized query string.
+    """
+    from core.models import Place
+    from .models import Category, Job
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+    cache_key = f'job-facets:{version()}:{digest}'
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+    categories = list(Category.objects.order_by('name').values_list('pk', 'name'))
+    towns = list(Place.objects.filter(kind='town').values_list('pk', 'name'))
+    aggregates = {}
+    for pk, _ in categories:
+        aggregates[f'category_{pk}'] = _count(filters, 'category', Q(category_id=pk))
+    for value, _ in Job.URGENCY_CHOICES:
+        aggregates[f'urgency_{value}'] = _count(filters, 'urgency', Q(urgency=value))
+    for pk, _ in towns:
+        aggregates[f'town_{pk}'] = _count(filters, 'location', Q(place_id=pk) | Q(place__parent_id=pk))
+    totals = jobs.aggregate(**aggregates)
+    result = {
+        'categories': [(name, totals[f'category_{pk}']) for pk, name in categories if totals[f'category_{pk}']],
+        'urgency': [(value, label, totals[f'urgency_{value}']) for value, label in Job.URGENCY_CHOICES],
+        'towns': sorted(
+            ((name, totals[f'town_{pk}']) for pk, name in towns if totals[f'town_{pk}']),
+            key=lambda town: -town[1],
+        ),
+    }
+    cache.set(cache_key, result, FACET_CACHE_TIMEOUT)
+    return result
@@ -1,14 +1,23 @@
 from django import forms
 from django.forms import inlineformset_factory
-from .models import Job, JobApplication, JobImage, Category
+from .models import Job, JobApplication, JobImage, Category, SavedSearch
 
 
 class JobForm(forms.ModelForm):
+    # Filled from the browser's geolocation when the poster allows it
+    latitude = forms.DecimalField(
+        max_digits=9, decimal_places=6, min_value=-90, max_value=90, required=False, widget=forms.HiddenInput()
+    )
+    longitude = forms.DecimalField(
+        max_digits=9, decimal_places=6, min_value=-180, max_value=180, required=False, widget=forms.HiddenInput()
+    )
+
     class Meta:
         model = Job
         fields = [
             'title', 'description', 'category', 'location', 
-            'urgency', 'budget_min', 'budget_max', 'deadline'
+            'urgency', 'budget_min', 'budget_max', 'deadline',
+            'latitude', 'longitude'
         ]
         widgets = {
             'title': forms.TextInput(attrs={
@@ -103,4 +112,42 @@ class JobSearchForm(forms.Form):
         choices=[('', 'All Urgency Levels')] + Job.URGENCY_CHOICES,
         required=False,
         widget=forms.Select(attrs={'class': 'form-control'})
-    )
\ No newline at end of file
+    )
+
+
+class SavedSearchForm(forms.ModelForm):
+    class Meta:
+        model = SavedSearch
+        fields = ['keywords', 'category', 'location', 'budget_min', 'budget_max']
+        widgets = {
+            'keywords': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'e.g., leaking pipe'
+            }),
+            'category': forms.Select(attrs={'class': 'form-control'}),
+            'location': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'e.g., Westlands'
+            }),
+            'budget_min': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+            'budget_max': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['category'].empty_label = "Any category"
+
+    def clean_location(self):
+        from core import gazetteer
+        location = self.cleaned_data['location'].strip()
+        # Saved searches match places, not substrings, so the place must be known
+        if location and gazetteer.resolve(location) is None:
+            raise forms.ValidationError('We could not find that place. Try a town or estate name.')
+        return location
+
+    def clean(self):
+        cleaned_data = super().clean()
+        budget_min, budget_max = cleaned_data.get('budget_min'), cleaned_data.get('budget_max')
+        if budget_min is not None and budget_max is not None and budget_min > budget_max:
+            raise forms.ValidationError('The minimum budget is above the maximum.')
+        return cleaned_data
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from jobs import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-job application, message and payment counters from their rows.'
+
+    def handle(self, *args, **options):
+        drifted = counters.recount()
+        self.stdout.write(self.style.SUCCESS(f'Done. Corrected {drifted} jobs.'))
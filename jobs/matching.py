@@ -0,0 +1,71 @@
+"""
+Match fundis to a job and nudge them.
+
+Located jobs are matched on the per-worker nearest-fundi index (the
+category's catalogue skills, availability and distance), so picking
+thousands of fundis costs no queries. The nudge itself is one bulk INSERT of notifications; emails are
+queued on core.tasks once the transaction commits.
+"""
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.urls import reverse
+
+from core import tasks, trigram
+from core.nearest import get_fundi_index
+
+# How far from the job, and how many fundis, a nudge reaches
+NUDGE_RADIUS_KM = 15
+MAX_NUDGED = 5000
+
+
+def match_fundis(job, limit=MAX_NUDGED, radius_km=NUDGE_RADIUS_KM):
+    """Ids of available fundis offering the job's category, nearest first."""
+    from jobs.skills import category_skill_ids
+    from users.models import User
+    if job.latitude is not None and job.longitude is not None:
+        # The same skills the fallback reaches through skill_set__category
+        skill_ids = category_skill_ids(job.category_id) if job.category_id else None
+        ranked = get_fundi_index().nearest(
+            job.latitude, job.longitude, k=limit, skill_ids=skill_ids, available_only=True, max_km=radius_km
+        )
+        return [user_id for user_id, _ in ranked]
+    # Unplaced job: fall back to a typo-tolerant match on the location text
+    fundis = User.objects.filter(
+        trigram.condition(User, 'location', job.location), active_role='fundi', fundi_profile__availability=True
+    )
+    if job.category_id:
+        fundis = fundis.filter(fundi_profile__skill_set__category=job.category_id).distinct()
+    return list(fundis.values_list('pk', flat=True)[:limit])
+
+
+def nudge_fundis(job, request=None):
+    """Notify matching fundis who have neither applied nor been told about
+    the job yet; returns how many.
+
+    ``request`` is only used to put absolute links in the emails.
+    """
+    from users.models import Notification
+    url = reverse('jobs:job_detail_jobs', args=[job.pk])
+    applied = set(job.applications.values_list('fundi_id', flat=True))
+    user_ids = [pk for pk in match_fundis(job) if pk != job.customer_id and pk not in applied]
+    if user_ids:
+        notified = set(Notification.objects.filter(user_id__in=user_ids, url=url).values_list('user_id', flat=True))
+        user_ids = [pk for pk in user_ids if pk not in notified]
+    if not user_ids:
+        return 0
+    category = f'{job.category.name} ' if job.category_id else ''
+    message = f"New {category}job near you: '{job.title}' in {job.location}"
+    Notification.objects.bulk_create([Notification(user_id=pk, message=message, url=url) for pk in user_ids])
+    link = request.build_absolute_uri(url) if request is not None else url
+    transaction.on_commit(lambda: tasks.enqueue(send_nudge_emails, user_ids, message, link))
+    return len(user_ids)
+
+
+def send_nudge_emails(user_ids, message, link):
+    from users.models import User
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', None) or getattr(settings, 'EMAIL_HOST_USER', 'no-reply@example.com')
+    subject = 'A job near you on FundiConnect'
+    body = f'{message}\n\nView it at {link}'
+    emails = User.objects.filter(pk__in=user_ids).exclude(email='').values_list('email', flat=True)
+    send_mass_mail([(subject, body, from_email, [email]) for email in emails.iterator()], fail_silently=True)
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def resolve_job_places(apps, schema_editor):
+    from core import gazetteer
+    Place = apps.get_model('core', 'Place')
+    Job = apps.get_model('jobs', 'Job')
+    names = gazetteer.build_names(Place)
+    for job in Job.objects.exclude(location=''):
+        place_id = gazetteer.match(gazetteer.normalize(job.location), names)
+        if place_id:
+            Job.objects.filter(pk=job.pk).update(place_id=place_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_gazetteer'),
+        ('jobs', '0006_alter_payment_fundi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='place',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='core.place'),
+        ),
+        migrations.RunPython(resolve_job_places, migrations.RunPython.noop),
+    ]
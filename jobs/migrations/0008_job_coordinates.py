@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:22
+
+from django.db import migrations, models
+
+
+def place_jobs(apps, schema_editor):
+    from core import geo
+    Job = apps.get_model('jobs', 'Job')
+    for job in Job.objects.filter(place__isnull=False).select_related('place'):
+        job.latitude, job.longitude = job.place.latitude, job.place.longitude
+        job.geohash = geo.encode(job.latitude, job.longitude)
+        job.save(update_fields=['latitude', 'longitude', 'geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0007_job_place'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.RunPython(place_jobs, migrations.RunPython.noop),
+    ]
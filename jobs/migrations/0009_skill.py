@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def load_skills(apps, schema_editor):
+    from jobs.skills_data import SKILLS
+    Category = apps.get_model('jobs', 'Category')
+    Skill = apps.get_model('jobs', 'Skill')
+    categories = {category.name.lower(): category for category in Category.objects.all()}
+    for name, synonyms in SKILLS:
+        Skill.objects.create(name=name, synonyms=synonyms, category=categories.pop(name.lower(), None))
+    for category in categories.values():
+        Skill.objects.create(name=category.name[:50], category=category)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0008_job_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Skill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('synonyms', models.JSONField(blank=True, default=list)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='skills', to='jobs.category')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(load_skills, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:52
+
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    from jobs import search
+    search.install(schema_editor.connection, rebuild=True)
+
+
+def uninstall_search(apps, schema_editor):
+    from jobs import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0009_skill'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
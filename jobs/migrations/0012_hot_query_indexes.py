@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_trigram'),
+        ('jobs', '0011_savedsearch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['-created_at', '-id'], name='jobs_job_open_created'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='jobs_job_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='jobs_job_customer_created'),
+        ),
+        migrations.AddIndex(
+            model_name='jobapplication',
+            index=models.Index(fields=['fundi', '-created_at', '-id'], name='jobs_app_fundi_created'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['job', 'created_at'], name='jobs_message_job_created'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['job', 'fundi', '-created_at'], name='jobs_payment_job_fundi'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['job', 'status'], name='jobs_payment_job_status'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:46
+
+from django.db import migrations, models
+
+
+def count_existing(apps, schema_editor):
+    from jobs import counters
+    counters.recount({
+        f'jobs.{name.lower()}': apps.get_model('jobs', name) for name in ('Job', 'JobApplication', 'Message', 'Payment')
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0012_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='application_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='has_completed_payment',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='message_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='pending_application_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,5 @@
 from users.models import User
-from django.db import models
+from django.db import models, transaction
 class Message(models.Model):
     job = models.ForeignKey('Job', on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
@@ -8,6 +8,10 @@ class Message(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        # A conversation, oldest first
+        indexes = [models.Index(fields=['job', 'created_at'], name='jobs_message_job_created')]
+
     def __str__(self):
         return f"Message from {self.sender.email} to {self.recipient.email} for job {self.job.title}" 
 from django.db import models
@@ -25,6 +29,29 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from . import skills
+        super().save(*args, **kwargs)
+        skills.link_category(self)
+
+
+class Skill(models.Model):
+    """A trade in the skill catalogue (see jobs.skills)."""
+    name = models.CharField(max_length=50, unique=True)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='skills')
+    synonyms = models.JSONField(default=list, blank=True)  # Other names, e.g. ["plumber"]
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        from . import skills
+        super().save(*args, **kwargs)
+        skills.skills_changed()
+
 
 class Job(models.Model):
     STATUS_CHOICES = [
@@ -47,6 +74,12 @@ class Job(models.Model):
     fundi = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_jobs')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     location = models.CharField(max_length=100)
+    # Gazetteer place resolved from `location` on save
+    place = models.ForeignKey('core.Place', on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    # Job site, from the poster's browser or the resolved place
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
     urgency = models.CharField(max_length=10, choices=URGENCY_CHOICES, default='medium')
     budget_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
@@ -56,13 +89,109 @@ class Job(models.Model):
     deadline = models.DateTimeField(null=True, blank=True)
     rating = models.PositiveSmallIntegerField(null=True, blank=True)  # 1-5 stars
     customer_review_text = models.TextField(blank=True)  # Optional written review
+    # Kept up to date by jobs.counters; `manage.py recount` repairs drift
+    application_count = models.IntegerField(default=0, editable=False)
+    pending_application_count = models.IntegerField(default=0, editable=False)
+    message_count = models.IntegerField(default=0, editable=False)
+    has_completed_payment = models.BooleanField(default=False, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # The open-job lists, newest first. PostgreSQL sees the literal status and
+            # uses the partial index; SQLite binds it as a parameter and needs the other.
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(status='open'), name='jobs_job_open_created'),
+            models.Index(fields=['status', '-created_at', '-id'], name='jobs_job_status_created'),
+            models.Index(fields=['customer', '-created_at', '-id'], name='jobs_job_customer_created'),
+        ]
     
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_location = instance.__dict__.get('location')
+        instance._loaded_point = (instance.__dict__.get('latitude'), instance.__dict__.get('longitude'))
+        # Remember what the demand heatmap and the fundi feeds last saw
+        from core import demand
+        if set(demand.STATE_FIELDS) <= set(field_names):
+            instance._demand_state = instance.demand_state()
+            instance._feed_state = instance.feed_state()
+        from . import facets
+        if set(facets.STATE_FIELDS) <= set(field_names):
+            instance._facet_state = instance.facet_state()
+        from core import trigram
+        instance._indexed_text = trigram.indexed_text(instance)
+        return instance
+
+    def demand_state(self):
+        from core import demand
+        return demand.state(*(getattr(self, field) for field in demand.STATE_FIELDS))
+
+    def feed_state(self):
+        from core import feed
+        return feed.state(*(getattr(self, field) for field in feed.STATE_FIELDS))
+
+    def facet_state(self):
+        from . import facets
+        return facets.state(*(getattr(self, field) for field in facets.STATE_FIELDS))
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        from . import counters
+        if update_fields is None:
+            # Never write back counters that F() updates may have moved since
+            # loading. A save that finds no row still inserts them.
+            values = [value for value in values if value[0].name not in counters.FIELDS]
+        return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
+    def save(self, *args, **kwargs):
+        from core import geo
+        update_fields = kwargs.get('update_fields')
+        changed = set()
+        if (update_fields is None or 'location' in update_fields) and \
+                self.location != getattr(self, '_loaded_location', None):
+            from core import gazetteer
+            self.place = gazetteer.resolve(self.location)
+            changed.add('place')
+            # Coordinates follow the location unless they were set explicitly
+            if self.place and (self.latitude, self.longitude) == getattr(self, '_loaded_point', (None, None)):
+                self.latitude, self.longitude = self.place.latitude, self.place.longitude
+                changed.update(['latitude', 'longitude'])
+        if self.latitude is not None and self.longitude is not None:
+            geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            geohash = ''
+        if geohash != self.geohash:
+            self.geohash = geohash
+            changed.add('geohash')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | changed
+        from core import demand, feed
+        from . import facets
+        if not self._state.adding and not hasattr(self, '_demand_state'):
+            # Loaded with deferred fields: read what the heatmap counted
+            row = Job.objects.filter(pk=self.pk).values_list(*demand.STATE_FIELDS).first()
+            self._demand_state = demand.state(*row) if row else None
+            self._feed_state = feed.state(*row) if row else None
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            old_state, new_state = getattr(self, '_demand_state', None), self.demand_state()
+            if old_state != new_state:
+                demand.apply_change(old_state, new_state)
+            self._demand_state = new_state
+            new_feed_state = self.feed_state()
+            if getattr(self, '_feed_state', None) != new_feed_state:
+                feed.refresh_job_later(self)
+            self._feed_state = new_feed_state
+            # Unknown (deferred) old state counts as a change
+            new_facet_state = self.facet_state()
+            if getattr(self, '_facet_state', ()) != new_facet_state:
+                facets.invalidate()
+            self._facet_state = new_facet_state
+        self._loaded_location = self.location
+        self._loaded_point = (self.latitude, self.longitude)
+
 
 class JobImage(models.Model):
     job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='images')
@@ -91,10 +220,19 @@ class JobApplication(models.Model):
     
     class Meta:
         unique_together = ['job', 'fundi']
+        indexes = [models.Index(fields=['fundi', '-created_at', '-id'], name='jobs_app_fundi_created')]
     
     def __str__(self):
         return f"{self.fundi.email} applied for {self.job.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the job's application counters last saw (jobs.counters)
+        if 'status' in field_names:
+            instance._loaded_status = instance.status
+        return instance
+
 
 class Payment(models.Model):
     STATUS_CHOICES = [
@@ -112,6 +250,13 @@ class Payment(models.Model):
     fundi = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments_received', blank=True, null=True)
     job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='payments', blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # A fundi's latest payment for a job, whatever its status
+            models.Index(fields=['job', 'fundi', '-created_at'], name='jobs_payment_job_fundi'),
+            models.Index(fields=['job', 'status'], name='jobs_payment_job_status'),
+        ]
+
     def __str__(self):
         return f"Payment for {self.job.title} - {self.amount} ({self.status})"
 
@@ -125,3 +270,47 @@ class Review(models.Model):
     
     def __str__(self):
         return f"Review for {self.job.title} - {self.rating} stars"
+
+
+class SavedSearch(models.Model):
+    """A fundi's standing search; new jobs that match it notify them (see jobs.percolate)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='saved_searches')
+    location = models.CharField(max_length=100, blank=True)
+    # Gazetteer place resolved from `location` on save
+    place = models.ForeignKey('core.Place', on_delete=models.CASCADE, null=True, blank=True, related_name='saved_searches')
+    budget_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    budget_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    keywords = models.CharField(max_length=200, blank=True)
+    # Number of SavedSearchTerm rows, all of which a job must match
+    term_count = models.PositiveSmallIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['category', 'place'], name='jobs_saved_category_place')]
+
+    def __str__(self):
+        parts = [str(part) for part in (self.keywords, self.category, self.location) if part]
+        return ' / '.join(parts) or 'Any job'
+
+    def save(self, *args, **kwargs):
+        from core import gazetteer
+        from . import percolate
+        self.place = gazetteer.resolve(self.location) if self.location else None
+        words = percolate.terms(self.keywords, percolate.MAX_KEYWORDS)
+        self.term_count = len(words)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.terms.all().delete()
+            SavedSearchTerm.objects.bulk_create([SavedSearchTerm(search=self, term=word) for word in words])
+
+
+class SavedSearchTerm(models.Model):
+    """Inverted index of saved-search keywords."""
+    search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=50)
+
+    class Meta:
+        unique_together = ['search', 'term']
+        indexes = [models.Index(fields=['term', 'search'], name='jobs_saved_term_search')]
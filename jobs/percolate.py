@@ -0,0 +1,86 @@
+"""
+Match a new job against every fundi's saved searches ("percolation").
+
+Rather than test each SavedSearch against the job, the job picks out its
+candidates from indexes. Category and place go through the (category, place)
+index, where a blank field matches anything and a town matches the estates
+inside it. Keywords go through SavedSearchTerm, an inverted index of one row
+per (keyword, search): a search survives only if the job contains all of its
+keywords. Matching and the bulk INSERT of notifications run on core.tasks
+after the job commits, so posting a job never waits for them.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.urls import reverse
+
+from core import tasks
+
+MIN_TERM = 3
+MAX_KEYWORDS = 8
+# Words of a job looked up in the inverted index
+MAX_JOB_TERMS = 300
+NOTIFY_BATCH = 1000
+
+
+def terms(text, limit=None):
+    """Distinct lower-cased words of ``text``, plurals folded to the singular."""
+    found = []
+    for word in re.findall(r'[a-z0-9]{%d,50}' % MIN_TERM, (text or '').lower()):
+        if len(word) > MIN_TERM and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        if word not in found:
+            found.append(word)
+            if len(found) == limit:
+                break
+    return found
+
+
+def matching_searches(job):
+    """SavedSearches that ``job`` satisfies, found through the indexes."""
+    from .models import SavedSearch, SavedSearchTerm
+    searches = SavedSearch.objects.exclude(user_id=job.customer_id)
+    category = Q(category__isnull=True)
+    if job.category_id:
+        category |= Q(category_id=job.category_id)
+    place = Q(place__isnull=True)
+    if job.place_id:
+        place |= Q(place_id__in=[pk for pk in (job.place_id, job.place.parent_id) if pk])
+    searches = searches.filter(category, place)
+    # Budget ranges only need to overlap; a missing bound is open-ended
+    if job.budget_max is not None:
+        searches = searches.filter(Q(budget_min__isnull=True) | Q(budget_min__lte=job.budget_max))
+    if job.budget_min is not None:
+        searches = searches.filter(Q(budget_max__isnull=True) | Q(budget_max__gte=job.budget_min))
+    words = terms(f'{job.title} {job.description}', MAX_JOB_TERMS)
+    matched = SavedSearchTerm.objects.filter(term__in=words).values('search_id', 'search__term_count').annotate(
+        hits=Count('pk')
+    ).filter(hits=F('search__term_count')).values('search_id')
+    return searches.filter(Q(term_count=0) | Q(pk__in=matched))
+
+
+def percolate(job_id):
+    """Notify everyone with a saved search that the job matches; returns how many."""
+    from users.models import Notification
+    from .models import Job
+    job = Job.objects.select_related('place').filter(pk=job_id, status='open').first()
+    if job is None:
+        return 0
+    # One notification per user, however many of their searches match
+    user_ids = matching_searches(job).order_by().values_list('user_id', flat=True).distinct()
+    message = f"New job for your saved search: '{job.title}' in {job.location}"
+    url = reverse('jobs:job_detail_jobs', args=[job.pk])
+    notified, batch = 0, []
+    for user_id in user_ids.iterator(chunk_size=NOTIFY_BATCH):
+        batch.append(Notification(user_id=user_id, message=message, url=url))
+        if len(batch) == NOTIFY_BATCH:
+            notified += len(Notification.objects.bulk_create(batch))
+            batch = []
+    notified += len(Notification.objects.bulk_create(batch))
+    return notified
+
+
+def job_posted(job):
+    """Percolate ``job`` in the background once it is committed."""
+    transaction.on_commit(lambda: tasks.enqueue(percolate, job.pk))
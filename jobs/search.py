@@ -0,0 +1,148 @@
+"""
+Full-text search over jobs.
+
+On SQLite the jobs_job_fts FTS5 table indexes title, description and
+location (porter-stemmed) as external content over jobs_job, kept in sync
+by triggers, so saves, deletes and queryset updates all reach it. On
+PostgreSQL a generated ``search_vector`` tsvector column (title weighted A,
+description B, location C) carries a GIN index. Either way a search is an
+index lookup ranked by relevance; other databases fall back to icontains.
+
+The triggers are (re)installed after every migrate, because SQLite drops
+them whenever a migration rebuilds the jobs_job table.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'jobs_job_fts'
+COLUMNS = ('title', 'description', 'location')
+# bm25 weight of each column, in COLUMNS order
+WEIGHTS = (10.0, 4.0, 1.0)
+# tsvector weight of each column on PostgreSQL
+PG_WEIGHTS = {'title': 'A', 'description': 'B', 'location': 'C'}
+MAX_TERMS = 8
+
+SQLITE_INSTALL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description, location, content='jobs_job', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON jobs_job BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON jobs_job BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description, location ON jobs_job BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+        INSERT INTO {FTS_TABLE}(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END""",
+]
+
+POSTGRES_INSTALL = [
+    """ALTER TABLE jobs_job ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(location, '')), 'C')
+    ) STORED""",
+    'CREATE INDEX IF NOT EXISTS jobs_job_search_vector ON jobs_job USING GIN (search_vector)',
+]
+
+
+def install(db=connection, rebuild=False):
+    """Create the search index for this database if it is missing."""
+    if db.vendor == 'sqlite':
+        statements = SQLITE_INSTALL
+        if rebuild:
+            statements = statements + [f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"]
+    elif db.vendor == 'postgresql':
+        statements = POSTGRES_INSTALL
+    else:
+        return
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def reinstall(sender, using, **kwargs):
+    """post_migrate: put back triggers lost to a SQLite table rebuild."""
+    from django.db import connections
+    db = connections[using]
+    if db.vendor == 'sqlite' and FTS_TABLE in db.introspection.table_names():
+        install(db)
+
+
+def uninstall(db=connection):
+    if db.vendor == 'sqlite':
+        statements = [f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}' for suffix in ('ai', 'ad', 'au')]
+        statements.append(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif db.vendor == 'postgresql':
+        statements = ['DROP INDEX IF EXISTS jobs_job_search_vector', 'ALTER TABLE jobs_job DROP COLUMN IF EXISTS search_vector']
+    else:
+        return
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def terms(text):
+    """The words of a search box, lower-cased; the last one is a prefix."""
+    return re.findall(r'\w+', (text or '').lower())[:MAX_TERMS]
+
+
+def _fts_query(words, columns):
+    phrases = [f'"{word}"' for word in words]
+    phrases[-1] += '*'
+    return '{%s} : (%s)' % (' '.join(columns), ' '.join(phrases))
+
+
+def _tsquery(words, columns):
+    weights = ''.join(PG_WEIGHTS[column] for column in columns)
+    parts = [f'{word}:{weights}' for word in words]
+    parts[-1] = f'{words[-1]}:*{weights}'
+    return ' & '.join(parts)
+
+
+def search(queryset, text, columns=COLUMNS, fuzzy_threshold=None):
+    """Jobs in ``queryset`` matching ``text``, best first, with ``search_rank``.
+
+    Every word must match one of ``columns``; the last word also matches as
+    a prefix, so results keep up while the user types. With
+    ``fuzzy_threshold``, titles within that trigram similarity of ``text``
+    (see core.trigram) match too, ranked after the full-text hits.
+    """
+    from core import trigram
+    words = terms(text)
+    if not words:
+        return queryset
+    fuzzy = Q() if fuzzy_threshold is None else trigram.condition(queryset.model, 'title', text, fuzzy_threshold)
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        match = _fts_query(words, columns)
+        weights = ', '.join(str(weight) for weight in WEIGHTS)
+        found = Q(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+        queryset = queryset.filter(found | fuzzy).annotate(search_rank=RawSQL(
+            f'COALESCE((SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "jobs_job"."id"), 0)',
+            [match], output_field=FloatField(),
+        ))
+    elif vendor == 'postgresql':
+        tsquery = _tsquery(words, columns)
+        found = Q(RawSQL(
+            "\"jobs_job\".\"search_vector\" @@ to_tsquery('english', %s)", [tsquery], output_field=BooleanField()
+        ))
+        queryset = queryset.filter(found | fuzzy).annotate(search_rank=RawSQL(
+            "ts_rank(\"jobs_job\".\"search_vector\", to_tsquery('english', %s))", [tsquery], output_field=FloatField()
+        ))
+    else:
+        condition = Q()
+        for word in words:
+            condition &= Q(*[(f'{column}__icontains', word) for column in columns], _connector=Q.OR)
+        return queryset.filter(condition | fuzzy)
+    return queryset.order_by('-search_rank', '-created_at')
@@ -0,0 +1,308 @@
+"""
+"Similar jobs" for the job detail page.
+
+The open jobs of each category are kept as TF-IDF vectors of their title
+(counted twice) and description. The vectors are L2-normalized and held as a
+sparse COO matrix in three NumPy arrays (row, column, value). Cosine
+similarity against a whole category is then one vectorized sparse mat-vec
+(a gather plus ``bincount``), and the top k come from ``argpartition``.
+
+Each job's neighbours are cached, so a page view is one cache lookup. A
+page view never computes them: on a miss it shows no similar jobs and queues
+``add_job`` on core.tasks. Posting a job (after commit) queues it too.
+``add_job`` appends the job's row to the category's vectors, fitting the
+category first if it is not cached, and caches its neighbours. It also slips
+the new job into the cached lists of the jobs it now beats. New terms take
+the idf of the moment, so a category is re-fitted from scratch once it has
+grown by REFIT_GROWTH. Everything expires after SIMILAR_CACHE_TIMEOUT.
+
+A category is cached as a header (vocabulary, idf, row count) plus chunks of
+CHUNK_ROWS rows, so no single value nears memcached's 1 MB item limit, and
+the vocabulary is capped at MAX_TERMS. Appending rewrites only the header and
+the last chunk. Every write for a category happens under a lock taken with
+``cache.add``, so workers on other processes never overwrite each other's
+appends or neighbour lists.
+"""
+import math
+import re
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from core import tasks
+
+SIMILAR_LIMIT = 4
+SIMILAR_CACHE_TIMEOUT = 24 * 3600
+# Re-fit a category once appended rows reach this share of the fitted ones
+REFIT_GROWTH = 0.25
+MIN_SCORE = 0.05
+TITLE_WEIGHT = 2
+# Existing jobs, best first, whose cached lists a new job may enter
+MAX_UPDATED = 200
+CHUNK_ROWS = 128
+MAX_TERMS = 20000
+# How long add_job waits for a category's lock, and how long a lock may be held
+LOCK_WAIT = 10
+LOCK_TIMEOUT = 60
+# A page view queues add_job for a cold job at most once per QUEUED_TIMEOUT
+QUEUED_TIMEOUT = 60
+STOP_WORDS = {
+    'the', 'and', 'for', 'with', 'from', 'this', 'that', 'are', 'was', 'will', 'need', 'needed', 'have', 'has',
+    'you', 'your', 'our', 'who', 'can', 'job', 'work', 'please', 'urgent', 'also', 'all', 'not',
+}
+
+
+def tokens(title, description):
+    """Term counts of a job, the title counted TITLE_WEIGHT times."""
+    counts = Counter()
+    for text, weight in ((title, TITLE_WEIGHT), (description, 1)):
+        for word in re.findall(r'[a-z]{3,30}', (text or '').lower()):
+            if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+                word = word[:-1]
+            if word not in STOP_WORDS:
+                counts[word] += weight
+    return counts
+
+
+class Vectors:
+    """TF-IDF rows of one category's open jobs, in COO form."""
+
+    def __init__(self, documents=()):
+        documents = list(documents)
+        df = Counter(term for _, counts in documents for term in counts)
+        self.vocab = {term: column for column, (term, _) in enumerate(df.most_common(MAX_TERMS))}
+        self.fitted = len(documents)
+        self.generation = uuid.uuid4().hex
+        self.idf = np.array(
+            [math.log((1 + self.fitted) / (1 + df[term])) + 1 for term in self.vocab], dtype=np.float32
+        )
+        self.job_ids = np.empty(0, dtype=np.int64)
+        self.rows = np.empty(0, dtype=np.int32)
+        self.columns = np.empty(0, dtype=np.int32)
+        self.values = np.empty(0, dtype=np.float32)
+        self.append_many(documents)
+
+    def __len__(self):
+        return len(self.job_ids)
+
+    def header(self):
+        return {'generation': self.generation, 'vocab': self.vocab, 'idf': self.idf, 'fitted': self.fitted,
+                'rows': len(self)}
+
+    def chunk(self, index):
+        """(job_ids, rows, columns, values) of rows ``index * CHUNK_ROWS`` onwards, rows counted from 0."""
+        first, last = index * CHUNK_ROWS, (index + 1) * CHUNK_ROWS
+        start, end = np.searchsorted(self.rows, [first, last])
+        return (self.job_ids[first:last], self.rows[start:end] - first, self.columns[start:end],
+                self.values[start:end])
+
+    @classmethod
+    def from_parts(cls, header, chunks):
+        vectors = cls()
+        vectors.generation, vectors.vocab = header['generation'], header['vocab']
+        vectors.idf, vectors.fitted = header['idf'], header['fitted']
+        if chunks:
+            vectors.job_ids = np.concatenate([job_ids for job_ids, _, _, _ in chunks])
+            vectors.rows = np.concatenate([rows + i * CHUNK_ROWS for i, (_, rows, _, _) in enumerate(chunks)])
+            vectors.columns = np.concatenate([columns for _, _, columns, _ in chunks])
+            vectors.values = np.concatenate([values for _, _, _, values in chunks])
+        return vectors
+
+    def _vector(self, counts):
+        new = [term for term in counts if term not in self.vocab][:max(MAX_TERMS - len(self.vocab), 0)]
+        if new:
+            # Terms the fit never saw: as rare as they can be
+            self.vocab.update((term, len(self.vocab) + i) for i, term in enumerate(new))
+            rare = math.log((1 + self.fitted) / 2) + 1
+            self.idf = np.concatenate([self.idf, np.full(len(new), rare, dtype=np.float32)])
+        counts = {term: count for term, count in counts.items() if term in self.vocab}
+        columns = np.fromiter((self.vocab[term] for term in counts), dtype=np.int32, count=len(counts))
+        tf = np.fromiter((1 + math.log(count) for count in counts.values()), dtype=np.float32, count=len(counts))
+        values = tf * self.idf[columns]
+        norm = np.linalg.norm(values)
+        return columns, (values / norm if norm else values)
+
+    def append_many(self, documents):
+        rows, columns, values, job_ids = [self.rows], [self.columns], [self.values], [self.job_ids]
+        for job_id, counts in documents:
+            vector_columns, vector_values = self._vector(counts)
+            if not len(vector_columns):
+                continue
+            rows.append(np.full(len(vector_columns), len(self) + len(job_ids) - 1, dtype=np.int32))
+            columns.append(vector_columns)
+            values.append(vector_values)
+            job_ids.append(np.array([job_id], dtype=np.int64))
+        self.rows, self.columns = np.concatenate(rows), np.concatenate(columns)
+        self.values, self.job_ids = np.concatenate(values), np.concatenate(job_ids)
+
+    def stale(self):
+        return len(self) - self.fitted > max(REFIT_GROWTH * self.fitted, 10)
+
+    def row_of(self, job_id):
+        found = np.flatnonzero(self.job_ids == job_id)
+        return int(found[0]) if len(found) else None
+
+    def scores(self, row):
+        """Cosine similarity of row ``row`` with every row."""
+        mask = self.rows == row
+        query = np.zeros(len(self.vocab), dtype=np.float32)
+        query[self.columns[mask]] = self.values[mask]
+        return np.bincount(self.rows, weights=self.values * query[self.columns], minlength=len(self))
+
+    def top(self, row, limit=SIMILAR_LIMIT, scores=None):
+        """[(job_id, score)] of the ``limit`` rows most like ``row``."""
+        scores = self.scores(row) if scores is None else scores.copy()
+        scores[row] = 0
+        if len(scores) > limit:
+            best = np.argpartition(-scores, limit)[:limit]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(self.job_ids[i]), float(scores[i])) for i in best if scores[i] >= MIN_SCORE]
+
+
+def _header_key(category_id):
+    return f'similar-jobs-header:{category_id or 0}'
+
+
+def _chunk_key(category_id, generation, index):
+    return f'similar-jobs-chunk:{category_id or 0}:{generation}:{index}'
+
+
+def _lock_key(category_id):
+    return f'similar-jobs-lock:{category_id or 0}'
+
+
+def _list_key(job_id):
+    return f'similar-jobs:{job_id}'
+
+
+def _queued_key(job_id):
+    return f'similar-jobs-queued:{job_id}'
+
+
+def fit(category_id, job_model=None):
+    from .models import Job
+    job_model = job_model or Job
+    jobs = job_model.objects.filter(status='open', category_id=category_id)
+    return Vectors(
+        (pk, tokens(title, description))
+        for pk, title, description in jobs.values_list('pk', 'title', 'description').iterator()
+    )
+
+
+def _load(category_id):
+    """The category's cached vectors, or None if the header or any chunk has expired."""
+    header = cache.get(_header_key(category_id))
+    if header is None:
+        return None
+    keys = [
+        _chunk_key(category_id, header['generation'], index)
+        for index in range(math.ceil(header['rows'] / CHUNK_ROWS))
+    ]
+    chunks = cache.get_many(keys)
+    if len(chunks) < len(keys):
+        return None
+    return Vectors.from_parts(header, [chunks[key] for key in keys])
+
+
+def _save(category_id, vectors, since=0):
+    """Cache the header and the chunks holding rows ``since`` onwards."""
+    chunks = {
+        _chunk_key(category_id, vectors.generation, index): vectors.chunk(index)
+        for index in range(since // CHUNK_ROWS, math.ceil(len(vectors) / CHUNK_ROWS))
+    }
+    cache.set_many(chunks, SIMILAR_CACHE_TIMEOUT)
+    # Last, so readers never find a header whose chunks are not written yet
+    cache.set(_header_key(category_id), vectors.header(), SIMILAR_CACHE_TIMEOUT)
+
+
+@contextmanager
+def _locked(category_id):
+    key, token = _lock_key(category_id), uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(key, token, LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'Similar jobs for category {category_id} are locked')
+        time.sleep(0.05)
+    try:
+        yield
+    finally:
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def add_job(job_id):
+    """Fold a job into its category's vectors and cache its neighbours."""
+    from .models import Job
+    job = Job.objects.filter(pk=job_id).values('status', 'category_id', 'title', 'description').first()
+    if job is None:
+        return
+    if job['status'] != 'open':
+        cache.set(_list_key(job_id), [], SIMILAR_CACHE_TIMEOUT)
+        return
+    with _locked(job['category_id']):
+        _add(job_id, job)
+
+
+def _add(job_id, job):
+    vectors = _load(job['category_id'])
+    if vectors is None:
+        vectors = fit(job['category_id'])
+        _save(job['category_id'], vectors)
+    row = vectors.row_of(job_id)
+    if row is None:
+        since = len(vectors)
+        vectors.append_many([(job_id, tokens(job['title'], job['description']))])
+        if vectors.stale():
+            vectors, since = fit(job['category_id']), 0
+        _save(job['category_id'], vectors, since)
+        row = vectors.row_of(job_id)
+        if row is None:
+            cache.set(_list_key(job_id), [], SIMILAR_CACHE_TIMEOUT)
+            return
+    scores = vectors.scores(row)
+    cache.set(_list_key(job_id), vectors.top(row, scores=scores), SIMILAR_CACHE_TIMEOUT)
+    # The new job may now belong in its neighbours' lists
+    scores[row] = 0
+    candidates = np.argsort(-scores, kind='stable')[:MAX_UPDATED]
+    candidates = {int(vectors.job_ids[i]): float(scores[i]) for i in candidates if scores[i] >= MIN_SCORE}
+    keys = {_list_key(pk): pk for pk in candidates}
+    updated = {}
+    for key, neighbours in cache.get_many(list(keys)).items():
+        score = candidates[keys[key]]
+        if job_id not in dict(neighbours) and (len(neighbours) < SIMILAR_LIMIT or score > neighbours[-1][1]):
+            neighbours = sorted(neighbours + [(job_id, score)], key=lambda pair: -pair[1])[:SIMILAR_LIMIT]
+            updated[key] = neighbours
+    cache.set_many(updated, SIMILAR_CACHE_TIMEOUT)
+
+
+def job_posted(job):
+    """Add ``job`` to the similar-jobs vectors in the background once it is committed."""
+    transaction.on_commit(lambda: tasks.enqueue(add_job, job.pk))
+
+
+def similar_ids(job):
+    """Ids of the jobs most like ``job``, best first."""
+    neighbours = cache.get(_list_key(job.pk))
+    if neighbours is None:
+        # Worked out in the background; until then the page shows none
+        if cache.add(_queued_key(job.pk), 1, QUEUED_TIMEOUT):
+            transaction.on_commit(lambda: tasks.enqueue(add_job, job.pk))
+        return []
+    return [pk for pk, _ in neighbours]
+
+
+def similar_jobs(job):
+    """The open jobs most like ``job``, best first."""
+    from .models import Job
+    ids = similar_ids(job)
+    if not ids:
+        return []
+    found = Job.objects.filter(pk__in=ids, status='open').in_bulk()
+    return [found[pk] for pk in ids if pk in found]
@@ -0,0 +1,136 @@
+"""
+Resolve typed skills ("plumber", "Fundi wa mabomba", "Plumbers") to the
+Skill catalogue.
+
+Names and synonyms are normalized and held in a per-process dict, so
+resolving is free once warm. Saving a Skill bumps a version number in the
+cache; every worker compares it with the version of its dict and rebuilds
+on a change. Fundis are linked to the skills they list through
+FundiProfile.skill_set, which is what the map and job matching filter on.
+"""
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'skill-names-version'
+
+# (version, names, skill ids by category id) of this worker
+_names = None
+_names_lock = threading.Lock()
+
+
+def normalize(text):
+    words = [w for w in re.split(r'[^a-z0-9]+', str(text or '').lower()) if w]
+    return ' '.join(words)[:50]
+
+
+def build_names(skill_model):
+    """Map normalized names and synonyms to (skill_id, name)."""
+    names = {}
+    for pk, name, synonyms in skill_model.objects.values_list('pk', 'name', 'synonyms'):
+        for label in [name] + list(synonyms or []):
+            names.setdefault(normalize(label), (pk, name))
+    return names
+
+
+def lookup(term, names):
+    key = normalize(term)
+    found = names.get(key)
+    if found is None and key.endswith('s'):
+        found = names.get(key[:-1])
+    return found
+
+
+def version():
+    # Started from the clock, so a version lost from the cache is never reused
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def _bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _get_catalogue():
+    global _names
+    current = version()
+    with _names_lock:
+        if _names is None or _names[0] != current:
+            from .models import Skill
+            categories = {}
+            for pk, category_id in Skill.objects.filter(category__isnull=False).values_list('pk', 'category_id'):
+                categories.setdefault(category_id, []).append(pk)
+            _names = (current, build_names(Skill), categories)
+        return _names[1:]
+
+
+def _get_names():
+    return _get_catalogue()[0]
+
+
+def names():
+    """This worker's normalized names, for looking up many terms at once."""
+    return _get_names()
+
+
+def category_skill_ids(category_id):
+    """Ids of the catalogue skills filed under a category."""
+    return list(_get_catalogue()[1].get(category_id, ()))
+
+
+def skills_changed():
+    """Make every worker rebuild its names after a Skill edit."""
+    # Now, for this transaction, and again once the skill is visible to everyone
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def resolve(term):
+    """Return (skill_id, name) for a typed skill, or None."""
+    return lookup(term, _get_names()) if term else None
+
+
+def canonical_name(term):
+    """The catalogue name for a search term, or the term as typed."""
+    found = resolve(term)
+    return found[1] if found else term
+
+
+def canonical(terms, names=None):
+    """Catalogue names for ``terms`` in order, without duplicates.
+
+    Skills missing from the catalogue are kept as typed.
+    """
+    names = _get_names() if names is None else names
+    labels, seen = [], set()
+    for term in terms:
+        found = lookup(term, names)
+        label = found[1] if found else str(term).strip()
+        if label and label.lower() not in seen:
+            seen.add(label.lower())
+            labels.append(label)
+    return labels
+
+
+def skill_ids(terms, names=None):
+    """Ids of the catalogue skills among ``terms``."""
+    names = _get_names() if names is None else names
+    return sorted({found[0] for found in (lookup(term, names) for term in terms) if found})
+
+
+def link_category(category):
+    """Give a new category its catalogue skill, reusing one of the same name."""
+    from .models import Skill
+    if category.skills.exists():
+        return
+    skill = Skill.objects.filter(name__iexact=category.name).first()
+    if skill is None:
+        Skill.objects.create(name=category.name, category=category)
+    elif skill.category_id is None:
+        skill.category = category
+        skill.save()
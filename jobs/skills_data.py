@@ -0,0 +1,23 @@
+"""
+Starter skill catalogue. Loaded into jobs.Skill by migration and linked to
+the Category of the same name; edit skills and synonyms in the admin after
+that.
+"""
+
+# (name, synonyms)
+SKILLS = [
+    ('Plumbing', ['plumber', 'pipes', 'pipe fitting', 'fundi wa mabomba', 'fundi wa maji']),
+    ('Electrical', ['electrician', 'electric', 'wiring', 'fundi wa stima']),
+    ('Carpentry', ['carpenter', 'joinery', 'furniture', 'fundi wa mbao']),
+    ('Masonry', ['mason', 'builder', 'construction', 'bricklaying', 'fundi wa mawe']),
+    ('Painting', ['painter', 'decorating', 'fundi wa rangi']),
+    ('Welding', ['welder', 'fabrication', 'metal work', 'metalwork', 'fundi wa chuma']),
+    ('Tiling', ['tiler', 'tiles', 'tile fixing']),
+    ('Roofing', ['roofer', 'gutters']),
+    ('Cleaning', ['cleaner', 'house cleaning', 'laundry', 'mama fua']),
+    ('Gardening', ['gardener', 'landscaping', 'landscaper', 'shamba']),
+    ('Auto Repair', ['mechanic', 'car repair', 'motor vehicle repair', 'fundi wa magari']),
+    ('Appliance Repair', ['appliances', 'fridge repair', 'tv repair', 'electronics repair']),
+    ('Moving', ['mover', 'movers', 'relocation', 'transport']),
+    ('Tailoring', ['tailor', 'dressmaker', 'dressmaking', 'fundi wa nguo']),
+]
@@ -1,3 +1,638 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import geo
+from core.nearest import get_fundi_index
+from users.forms import FundiOnboardingForm
+from users.models import User, FundiProfile, Notification
+from . import autocomplete, counters, facets, percolate, search, similar, skills
+from .forms import JobForm
+from .models import Category, Job, JobApplication, Message, Payment, SavedSearch, Skill
+
+
+class JobLocationTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='poster', email='poster@example.com', password='pass')
+        self.customer.active_role = 'customer'
+        self.customer.is_verified = True
+        self.customer.save()
+        self.plumbing = Category.objects.create(name='Plumbing')
+
+    def post(self, location, **fields):
+        return Job.objects.create(
+            title=f'Job in {location}', description='Work', customer=self.customer,
+            category=self.plumbing, location=location, **fields
+        )
+
+    def test_coordinates_come_from_the_resolved_place(self):
+        job = self.post('Kilimani, Nairobi')
+        self.assertEqual((job.latitude, job.longitude), (job.place.latitude, job.place.longitude))
+        self.assertEqual(job.geohash, geo.encode(job.latitude, job.longitude))
+        job.location = 'Karen'
+        job.save()
+        self.assertEqual(job.place.slug, 'nairobi-karen')
+        self.assertEqual(job.latitude, job.place.latitude)
+
+    def test_explicit_coordinates_are_kept(self):
+        job = self.post('Nairobi', latitude=Decimal('-1.250000'), longitude=Decimal('36.900000'))
+        job.refresh_from_db()
+        self.assertEqual((job.latitude, job.longitude), (Decimal('-1.250000'), Decimal('36.900000')))
+
+    def test_job_list_within_km_is_nearest_first(self):
+        westlands = self.post('Westlands')
+        karen = self.post('Karen')
+        self.post('Mombasa')
+        params = {'lat': '-1.2833', 'lng': '36.8219'}
+        for name in ('job_list', 'jobs:jobs'):
+            resp = self.client.get(reverse(name), {**params, 'within_km': '20'})
+            self.assertEqual([job.pk for job in resp.context['page_obj']], [westlands.pk, karen.pk])
+            resp = self.client.get(reverse(name), {**params, 'within_km': '5'})
+            self.assertEqual([job.pk for job in resp.context['page_obj']], [westlands.pk])
+            resp = self.client.get(reverse(name), {**params, 'within_km': 'far'})
+            self.assertEqual(len(resp.context['page_obj']), 3)
+
+    def test_fundi_dashboard_lists_nearby_jobs_first(self):
+        karen = self.post('Karen')
+        westlands = self.post('Westlands')
+        self.post('Mombasa')
+        fundi = User.objects.create_user(username='fixer', email='fixer@example.com', password='pass')
+        fundi.roles = ['customer', 'fundi']
+        fundi.active_role = 'fundi'
+        fundi.is_verified = True
+        fundi.onboarding_complete = True
+        fundi.save()
+        FundiProfile.objects.create(user=fundi, skills=['Plumbing'], latitude=-1.2921, longitude=36.7840)
+        self.client.force_login(fundi)
+        resp = self.client.get(reverse('dashboard'))
+        self.assertEqual([job.pk for job in resp.context['available_jobs']], [westlands.pk, karen.pk])
+
+    def test_job_create_keeps_browser_coordinates(self):
+        self.client.force_login(self.customer)
+        self.client.post(reverse('jobs:job_create'), {
+            'title': 'Fix gate', 'description': 'Hinge broke', 'category': self.plumbing.pk,
+            'location': 'Plot 12', 'urgency': 'medium', 'latitude': '-1.100000', 'longitude': '37.010000',
+        })
+        job = Job.objects.get(title='Fix gate')
+        self.assertEqual((job.latitude, job.longitude), (Decimal('-1.100000'), Decimal('37.010000')))
+        self.assertTrue(job.geohash)
+
+    def test_job_form_rejects_coordinates_off_the_globe(self):
+        data = {
+            'title': 'Fix gate', 'description': 'Hinge broke', 'category': self.plumbing.pk,
+            'location': 'Plot 12', 'urgency': 'medium',
+        }
+        for latitude, longitude in (('95', '37.01'), ('-1.1', '181'), ('-90.5', '-180.5')):
+            form = JobForm({**data, 'latitude': latitude, 'longitude': longitude})
+            self.assertFalse(form.is_valid())
+        self.assertTrue(JobForm({**data, 'latitude': '-90', 'longitude': '180'}).is_valid())
+
+
+class NudgeTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='poster', email='poster@example.com', password='pass')
+        self.customer.active_role = 'customer'
+        self.customer.is_verified = True
+        self.customer.save()
+        self.plumbing = Category.objects.create(name='Plumbing')
+        self.job = Job.objects.create(
+            title='Leaking sink', description='Work', customer=self.customer,
+            category=self.plumbing, location='Westlands',
+        )
+        self.seq = 0
+
+    def fundi(self, skills=('Plumbing',), latitude=-1.2650, longitude=36.8050, available=True):
+        self.seq += 1
+        user = User.objects.create_user(username=f'fundi{self.seq}', email=f'fundi{self.seq}@example.com', password='pass')
+        user.active_role = 'fundi'
+        user.save()
+        FundiProfile.objects.create(
+            user=user, skills=list(skills), latitude=latitude, longitude=longitude, availability=available
+        )
+        return user
+
+    def nudge(self):
+        get_fundi_index().reset()
+        self.client.force_login(self.customer)
+        return self.client.post(reverse('jobs:nudge_fundis', args=[self.job.pk]))
+
+    def test_only_matching_fundis_are_notified(self):
+        near = self.fundi()
+        self.fundi(skills=('Painting',))
+        self.fundi(available=False)
+        self.fundi(latitude=-4.0435, longitude=39.6682)
+        applied = self.fundi()
+        JobApplication.objects.create(job=self.job, fundi=applied)
+        resp = self.nudge()
+        self.assertRedirects(resp, reverse('jobs:job_detail_jobs', args=[self.job.pk]), fetch_redirect_response=False)
+        notes = Notification.objects.all()
+        self.assertEqual([note.user_id for note in notes], [near.pk])
+        self.assertEqual(notes[0].url, reverse('jobs:job_detail_jobs', args=[self.job.pk]))
+
+    def test_located_and_unplaced_jobs_match_the_same_fundis(self):
+        from .matching import match_fundis
+        matching = {self.fundi(skills=('plumber',)), self.fundi(skills=('Fundi wa maji', 'Tiling')), self.fundi()}
+        other = self.fundi(skills=('Painting', 'Plumbing work'))
+        for user in matching | {other}:
+            user.location = 'Kwa Mzee Ndogo'
+            user.save()
+        get_fundi_index().reset()
+        located = Job.objects.create(
+            title='Burst pipe', description='Work', customer=self.customer, category=self.plumbing,
+            location='Westlands', latitude=-1.2650, longitude=36.8050,
+        )
+        unplaced = Job.objects.create(
+            title='Burst pipe', description='Work', customer=self.customer, category=self.plumbing,
+            location='Kwa Mzee Ndogo',
+        )
+        self.assertIsNone(unplaced.latitude)
+        self.assertEqual(set(match_fundis(located)), {user.pk for user in matching})
+        self.assertEqual(set(match_fundis(unplaced)), {user.pk for user in matching})
+
+    def test_query_count_does_not_grow_with_matches(self):
+        from .matching import nudge_fundis
+        for count in (3, 30):
+            for _ in range(count - FundiProfile.objects.count()):
+                self.fundi()
+            Notification.objects.all().delete()
+            get_fundi_index().reset()
+            get_fundi_index().refresh(force=True)
+            with self.assertNumQueries(3):
+                self.assertEqual(nudge_fundis(self.job), count)
+
+    @override_settings(BACKGROUND_TASKS_INLINE=True)
+    def test_gets_repeats_and_closed_jobs_send_nothing(self):
+        near = self.fundi()
+        get_fundi_index().reset()
+        self.client.force_login(self.customer)
+        url = reverse('jobs:nudge_fundis', args=[self.job.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertFalse(Notification.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nudge()
+            self.nudge()
+        self.assertEqual(list(Notification.objects.values_list('user_id', flat=True)), [near.pk])
+        self.assertEqual(len(mail.outbox), 1)
+        self.fundi()
+        self.job.status = 'in_progress'
+        self.job.save()
+        self.assertEqual(self.nudge().status_code, 400)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    @override_settings(BACKGROUND_TASKS_INLINE=True)
+    def test_emails_are_sent_after_commit(self):
+        near = self.fundi()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nudge()
+        self.assertEqual([message.to for message in mail.outbox], [[near.email]])
+        self.assertIn(reverse('jobs:job_detail_jobs', args=[self.job.pk]), mail.outbox[0].body)
+
+
+class SkillCatalogueTests(TestCase):
+    def setUp(self):
+        skills.skills_changed()
+        self.plumbing = Category.objects.create(name='Plumbing')
+
+    def test_other_workers_see_new_skills(self):
+        self.assertIsNone(skills.resolve('kinyozi'))
+        # Another worker's save: only the shared version moves
+        skills._bump()
+        Skill.objects.bulk_create([Skill(name='Barber', synonyms=['kinyozi'])])
+        self.assertEqual(skills.resolve('kinyozi')[1], 'Barber')
+
+    def fundi(self, username, skill_names):
+        user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pass')
+        user.active_role = 'fundi'
+        user.save()
+        return FundiProfile.objects.create(user=user, skills=skill_names, latitude=-1.2650, longitude=36.8050)
+
+    def test_onboarding_maps_synonyms_to_catalogue_names(self):
+        form = FundiOnboardingForm()
+        form.cleaned_data = {'skills': 'plumber, Plumbing, Electricians, drone piloting'}
+        self.assertEqual(form.clean_skills(), ['Plumbing', 'Electrical', 'drone piloting'])
+
+    def test_categories_are_linked_to_their_skill(self):
+        self.assertEqual(Skill.objects.get(name='Plumbing').category, self.plumbing)
+        drones = Category.objects.create(name='Drone Surveys')
+        self.assertEqual(list(drones.skills.values_list('name', flat=True)), ['Drone Surveys'])
+
+    def test_profile_skill_set_follows_skills(self):
+        profile = self.fundi('fixer', ['Plumbing', 'drone piloting'])
+        self.assertEqual([skill.name for skill in profile.skill_set.all()], ['Plumbing'])
+        profile = FundiProfile.objects.get(pk=profile.pk)
+        profile.skills = ['Painting']
+        profile.save()
+        self.assertEqual([skill.name for skill in profile.skill_set.all()], ['Painting'])
+
+    def test_map_skill_filter_joins_on_the_catalogue(self):
+        plumber = self.fundi('plumber', ['Plumbing'])
+        self.fundi('painter', ['Painting'])
+        for term in ('Plumbing', 'plumber', 'Fundi wa mabomba'):
+            resp = self.client.get(reverse('fundi_locations_api'), {'skill': term})
+            self.assertEqual([fundi['id'] for fundi in resp.json()['fundis']], [plumber.user_id])
+        resp = self.client.get(reverse('fundi_locations_api'), {'skill': 'astronaut'})
+        self.assertEqual(resp.json()['fundis'], [])
+
+
+class JobSearchTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='searcher', email='searcher@example.com', password='pass')
+        self.plumbing = Category.objects.create(name='Plumbing')
+        self.sink = self.post('Leaking kitchen sink', 'Water everywhere under the sink', 'Westlands')
+        self.tank = self.post('Clean water tank', 'The sink outlet is fine', 'Karen')
+        self.gate = self.post('Weld a gate', 'Broken hinge', 'Kilimani')
+
+    def post(self, title, description, location):
+        return Job.objects.create(
+            title=title, description=description, customer=self.customer,
+            category=self.plumbing, location=location,
+        )
+
+    def found(self, text, **kwargs):
+        return [job.pk for job in search.search(Job.objects.all(), text, **kwargs)]
+
+    def test_stemmed_prefix_and_ranked(self):
+        self.assertEqual(self.found('leaks'), [self.sink.pk])
+        self.assertEqual(self.found('sink'), [self.sink.pk, self.tank.pk])
+        self.assertEqual(self.found('kitch'), [self.sink.pk])
+        self.assertEqual(self.found('water sink'), [self.sink.pk, self.tank.pk])
+        self.assertEqual(self.found('sink" (*'), [self.sink.pk, self.tank.pk])
+        self.assertEqual(self.found('kilimani'), [self.gate.pk])
+        self.assertEqual(self.found('kilimani', columns=('title', 'description')), [])
+
+    def test_index_follows_saves_updates_and_deletes(self):
+        self.gate.title = 'Fix a leaking roof'
+        self.gate.save()
+        self.assertEqual(self.found('weld'), [])
+        self.assertEqual(set(self.found('leak')), {self.sink.pk, self.gate.pk})
+        Job.objects.filter(pk=self.tank.pk).update(description='Nothing to see')
+        self.assertEqual(self.found('outlet'), [])
+        self.sink.delete()
+        self.assertEqual(self.found('leak'), [self.gate.pk])
+
+    def test_triggers_come_back_after_migrate(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.FTS_TABLE}_ai')
+        search.reinstall(sender=None, using='default')
+        roof = self.post('Roof repair', 'Iron sheets', 'Karen')
+        self.assertEqual(self.found('sheets'), [roof.pk])
+
+    def test_job_lists_search_the_index(self):
+        resp = self.client.get(reverse('job_list'), {'search': 'kilimani'})
+        self.assertEqual([job.pk for job in resp.context['page_obj']], [self.gate.pk])
+        resp = self.client.get(reverse('jobs:jobs'), {'search': 'sinks'})
+        self.assertEqual([job.pk for job in resp.context['page_obj']], [self.sink.pk, self.tank.pk])
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username='facets', email='facets@example.com', password='pass')
+        self.plumbing = Category.objects.create(name='Plumbing')
+        self.welding = Category.objects.create(name='Welding')
+        self.sink = self.post('Leaking sink', self.plumbing, 'urgent', 'Westlands')
+        self.pipe = self.post('Burst pipe', self.plumbing, 'low', 'Nyali')
+        self.gate = self.post('Weld a gate', self.welding, 'urgent', 'Westlands')
+
+    def post(self, title, category, urgency, location):
+        return Job.objects.create(
+            title=title, description='Details', customer=self.customer,
+            category=category, urgency=urgency, location=location,
+        )
+
+    def sidebar(self, **params):
+        return self.client.get(reverse('jobs:jobs'), params).context['facets']
+
+    def test_each_facet_ignores_its_own_filter(self):
+        result = self.sidebar(category='Plumbing', urgency='urgent')
+        # Categories are counted with the urgency filter only
+        self.assertEqual(result['categories'], [('Plumbing', 1), ('Welding', 1)])
+        # Urgencies with the category filter only
+        self.assertEqual(dict((value, count) for value, _, count in result['urgency'])['low'], 1)
+        self.assertEqual(dict((value, count) for value, _, count in result['urgency'])['urgent'], 1)
+        self.assertEqual(result['towns'], [('Nairobi', 1)])
+        self.assertEqual(self.sidebar(search='weld')['categories'], [('Welding', 1)])
+        nearby = self.sidebar(search='leak', within_km=20, lat=-1.2676, lng=36.8108)
+        self.assertEqual(nearby['categories'], [('Plumbing', 1)])
+
+    def test_counts_are_one_query_and_cached(self):
+        jobs = Job.objects.filter(status='open')
+        filters = {'category': Q(), 'urgency': Q(), 'location': Q()}
+        # Category and town names, then a single aggregate
+        with self.assertNumQueries(3):
+            facets.counts(jobs, filters, ['test'])
+        with self.assertNumQueries(0):
+            result = facets.counts(jobs, filters, ['test'])
+        self.assertEqual(result['categories'], [('Plumbing', 2), ('Welding', 1)])
+
+    @override_settings(BACKGROUND_TASKS_INLINE=True)
+    def test_closing_a_job_invalidates_the_counts(self):
+        self.assertEqual(self.sidebar()['categories'], [('Plumbing', 2), ('Welding', 1)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pipe.status = 'completed'
+            self.pipe.save()
+        self.assertEqual(self.sidebar()['categories'], [('Plumbing', 1), ('Welding', 1)])
+        # Edits the counts cannot see leave the cache alone
+        before = facets.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sink.title = 'Leaking kitchen sink'
+            self.sink.save()
+        self.assertEqual(facets.version(), before)
+
+    @override_settings(BACKGROUND_TASKS_INLINE=True)
+    def test_evicted_version_never_serves_old_counts(self):
+        self.assertEqual(self.sidebar()['categories'], [('Plumbing', 2), ('Welding', 1)])
+        before = facets.version()
+        cache.delete(facets.VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pipe.status = 'completed'
+            self.pipe.save()
+        self.assertGreater(facets.version(), before)
+        self.assertEqual(self.sidebar()['categories'], [('Plumbing', 1), ('Welding', 1)])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete.reset()
+        self.customer = User.objects.create_user(username='typer', email='typer@example.com', password='pass')
+        self.plumbing = Category.objects.create(name='Plumbing')
+        for title in ['Leaking pipe', 'Burst pipe', 'Paint a wall']:
+            Job.objects.create(title=title, description='Details', customer=self.customer, category=self.plumbing)
+
+    def labels(self, prefix, kinds=autocomplete.KINDS):
+        return [suggestion['label'] for suggestion in autocomplete.suggest(prefix, kinds)]
+
+    def test_prefixes_ranked_by_popularity(self):
+        self.assertEqual(self.labels('p', ('title', 'category')), ['Plumbing', 'pipe', 'paint'])
+        self.assertEqual(self.labels('PLUM'), ['Plumbing'])
+        self.assertEqual(self.labels('pipes'), [])
+        self.assertIn('Westlands, Nairobi', self.labels('westl', ('location',)))
+        self.assertEqual(self.labels('pi', ('category',)), [])
+
+    def test_answers_from_memory_and_grows_incrementally(self):
+        autocomplete.get_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('wel'), [])
+        Job.objects.create(title='Weld a gate', description='Details', customer=self.customer)
+        Category.objects.create(name='Welding')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('wel'), ['Welding', 'weld'])
+
+    def test_stale_index_is_rebuilt_in_the_background(self):
+        old = autocomplete.get_index()
+        autocomplete._built_at -= autocomplete.REBUILD_SECONDS + 1
+        with mock.patch.object(autocomplete.tasks, 'enqueue') as enqueue, self.assertNumQueries(0):
+            self.assertEqual(self.labels('pipe'), ['pipe'])
+            self.assertEqual(self.labels('pipe'), ['pipe'])
+        enqueue.assert_called_once_with(autocomplete.rebuild)
+        self.assertIs(autocomplete.get_index(), old)
+        # Saved while the rebuild runs: kept by the old index and replayed onto the new one
+        Category.objects.create(name='Welding')
+        with mock.patch.object(autocomplete, 'build', return_value=autocomplete.PrefixIndex()):
+            autocomplete.rebuild()
+        self.assertIsNot(autocomplete.get_index(), old)
+        self.assertEqual(self.labels('p'), [])
+        self.assertEqual(self.labels('wel'), ['Welding'])
+
+    def test_endpoint(self):
+        resp = self.client.get(reverse('autocomplete_api'), {'q': 'pi', 'kind': 'title,bogus'})
+        self.assertEqual(resp.json(), {'suggestions': [{'label': 'pipe', 'kind': 'title'}]})
+        self.assertEqual(self.client.get(reverse('autocomplete_api')).json(), {'suggestions': []})
+
+
+class SavedSearchTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='poster', email='poster@example.com', password='pass')
+        self.customer.active_role = 'customer'
+        self.customer.is_verified = True
+        self.customer.save()
+        self.plumbing = Category.objects.create(name='Plumbing')
+        self.welding = Category.objects.create(name='Welding')
+        self.seq = 0
+
+    def saved(self, **fields):
+        self.seq += 1
+        user = User.objects.create_user(username=f'saver{self.seq}', email=f'saver{self.seq}@example.com', password='pass')
+        return SavedSearch.objects.create(user=user, **fields)
+
+    def job(self, **fields):
+        fields = {
+            'title': 'Leaking pipes', 'description': 'Under the kitchen sink', 'customer': self.customer,
+            'category': self.plumbing, 'location': 'Westlands', 'budget_min': 1000, 'budget_max': 3000, **fields,
+        }
+        return Job.objects.create(**fields)
+
+    def test_searches_matching_a_job(self):
+        matches = [
+            self.saved(),
+            self.saved(category=self.plumbing, location='Nairobi'),
+            self.saved(location='Westlands', keywords='pipe sink'),
+            self.saved(budget_min=2500),
+        ]
+        self.saved(category=self.welding)
+        self.saved(location='Nyali')
+        self.saved(keywords='pipe roof')
+        self.saved(budget_max=500)
+        self.assertEqual(matches[2].term_count, 2)
+        self.assertEqual(
+            set(percolate.matching_searches(self.job())),
+            set(matches),
+        )
+
+    def test_percolating_costs_the_same_for_many_matches(self):
+        for count in (2, 20):
+            for _ in range(count - SavedSearch.objects.count()):
+                self.saved(keywords='leaking')
+            job = self.job()
+            # Load the job, select the users, insert the notifications
+            with self.assertNumQueries(3):
+                self.assertEqual(percolate.percolate(job.pk), count)
+
+    @override_settings(BACKGROUND_TASKS_INLINE=True)
+    def test_posting_a_job_notifies_after_commit(self):
+        search = self.saved(category=self.plumbing, keywords='pipes')
+        SavedSearch.objects.create(user=search.user, location='Karen')
+        self.client.force_login(self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse('jobs:job_create'), {
+                'title': 'Burst pipe', 'description': 'Water everywhere', 'category': self.plumbing.pk,
+                'location': 'Karen', 'urgency': 'high',
+            })
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(list(Notification.objects.values_list('user_id', flat=True)), [search.user_id])
+
+    def test_fundi_saves_a_search_from_the_job_list(self):
+        fundi = User.objects.create_user(username='keen', email='keen@example.com', password='pass')
+        fundi.active_role = 'fundi'
+        fundi.save()
+        self.client.force_login(fundi)
+        resp = self.client.get(reverse('jobs:saved_searches'), {'search': 'sink', 'category': 'Plumbing'})
+        self.assertEqual(resp.context['form'].initial['category'], self.plumbing)
+        resp = self.client.post(reverse('jobs:saved_searches'), {'keywords': 'sink', 'location': 'Atlantis'})
+        self.assertFormError(resp.context['form'], 'location', 'We could not find that place. Try a town or estate name.')
+        self.client.post(reverse('jobs:saved_searches'), {'keywords': 'sinks', 'category': self.plumbing.pk})
+        self.assertEqual(list(fundi.saved_searches.values_list('terms__term', flat=True)), ['sink'])
+
+
+class SimilarJobsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username='similar', email='similar@example.com', password='pass')
+        self.plumbing = Category.objects.create(name='Plumbing')
+        self.sink = self.post('Leaking kitchen sink', 'Water drips from the kitchen sink pipe')
+        self.blocked = self.post('Blocked kitchen sink', 'The sink drains slowly')
+        self.tap = self.post('Bathroom tap leaking', 'Tap drips all night')
+        self.heater = self.post('Install water heater', 'New electric heater in the bathroom')
+        self.stand = self.post('Weld a sink stand', 'Kitchen sink stand', category=Category.objects.create(name='Welding'))
+
+    def post(self, title, description, category=None):
+        return Job.objects.create(
+            title=title, description=description, customer=self.customer, category=category or self.plumbing,
+        )
+
+    def test_neighbours_come_from_the_same_category(self):
+        similar.add_job(self.sink.pk)
+        similar.add_job(self.stand.pk)
+        ids = similar.similar_ids(self.sink)
+        self.assertEqual(ids[0], self.blocked.pk)
+        self.assertNotIn(self.sink.pk, ids)
+        self.assertNotIn(self.stand.pk, ids)
+        self.assertEqual(similar.similar_ids(self.stand), [])
+
+    @override_settings(BACKGROUND_TASKS_INLINE=True)
+    def test_a_cold_page_view_queues_the_work(self):
+        with mock.patch.object(similar, 'fit', wraps=similar.fit) as fit, \
+                mock.patch.object(similar.tasks, 'enqueue', wraps=similar.tasks.enqueue) as enqueue, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(similar.similar_ids(self.sink), [])
+            self.assertEqual(similar.similar_ids(self.tap), [])
+        enqueue.assert_has_calls([mock.call(similar.add_job, self.sink.pk), mock.call(similar.add_job, self.tap.pk)])
+        self.assertEqual(fit.call_count, 1)
+        self.assertEqual(similar.similar_ids(self.sink)[0], self.blocked.pk)
+        with self.assertNumQueries(0):
+            similar.similar_ids(self.sink)
+        resp = self.client.get(reverse('job_detail', args=[self.sink.pk]))
+        self.assertEqual(resp.context['similar_jobs'][0], self.blocked)
+
+    def test_categories_are_cached_in_chunks(self):
+        with mock.patch.object(similar, 'CHUNK_ROWS', 3):
+            similar.add_job(self.sink.pk)
+            header = cache.get('similar-jobs-header:%d' % self.plumbing.pk)
+            key = 'similar-jobs-chunk:%d:%s:%%d' % (self.plumbing.pk, header['generation'])
+            chunks = [cache.get(key % i) for i in range(2)]
+            self.assertEqual([len(job_ids) for job_ids, _, _, _ in chunks], [3, 1])
+            self.assertEqual(list(similar._load(self.plumbing.pk).job_ids), list(similar.fit(self.plumbing.pk).job_ids))
+            cache.delete(key % 1)
+            self.assertIsNone(similar._load(self.plumbing.pk))
+        self.assertEqual(similar.similar_ids(self.sink)[0], self.blocked.pk)
+
+    def test_writes_wait_for_the_category_lock(self):
+        cache.add('similar-jobs-lock:%d' % self.plumbing.pk, 'other', 60)
+        with mock.patch.object(similar, 'LOCK_WAIT', 0), self.assertRaises(TimeoutError):
+            similar.add_job(self.sink.pk)
+        self.assertIsNone(cache.get('similar-jobs:%d' % self.sink.pk))
+        cache.delete('similar-jobs-lock:%d' % self.plumbing.pk)
+        similar.add_job(self.sink.pk)
+        self.assertIsNone(cache.get('similar-jobs-lock:%d' % self.plumbing.pk))
+
+    @override_settings(BACKGROUND_TASKS_INLINE=True)
+    def test_new_jobs_are_folded_in_without_a_refit(self):
+        similar.add_job(self.sink.pk)
+        fitted = similar._load(self.plumbing.pk).fitted
+        with self.captureOnCommitCallbacks(execute=True):
+            leak = self.post('Kitchen sink leaking again', 'Kitchen sink pipe drips water')
+            similar.job_posted(leak)
+        vectors = similar._load(self.plumbing.pk)
+        self.assertEqual((vectors.fitted, len(vectors)), (fitted, 5))
+        self.assertEqual(similar.similar_ids(self.sink)[0], leak.pk)
+        self.assertEqual(similar.similar_ids(leak)[0], self.sink.pk)
+        leak.status = 'completed'
+        leak.save()
+        self.assertNotIn(leak, similar.similar_jobs(self.sink))
+
+
+class JobCounterTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='counted', email='counted@example.com', password='pass')
+        self.customer.active_role = 'customer'
+        self.customer.is_verified = True
+        self.customer.save()
+        self.fundis = [
+            User.objects.create_user(username=f'counter{i}', email=f'counter{i}@example.com', password='pass')
+            for i in range(3)
+        ]
+        self.job = Job.objects.create(title='Fix tap', description='Leaking', customer=self.customer, location='Karen')
+
+    def counts(self):
+        self.job.refresh_from_db()
+        return tuple(getattr(self.job, field) for field in counters.FIELDS)
+
+    def test_applications_are_counted_through_their_lifecycle(self):
+        first = JobApplication.objects.create(job=self.job, fundi=self.fundis[0], message='Hi')
+        JobApplication.objects.create(job=self.job, fundi=self.fundis[1], message='Hi', status='rejected')
+        self.assertEqual(self.counts()[:2], (2, 1))
+        first = JobApplication.objects.get(pk=first.pk)
+        first.status = 'accepted'
+        first.save()
+        self.assertEqual(self.counts()[:2], (2, 0))
+        first.delete()
+        self.assertEqual(self.counts()[:2], (1, 0))
+
+    def test_messages_and_payments(self):
+        message = Message.objects.create(job=self.job, sender=self.customer, recipient=self.fundis[0], content='Hi')
+        Message.objects.create(job=self.job, sender=self.fundis[0], recipient=self.customer, content='Hello')
+        payment = Payment.objects.create(
+            amount=100, commission=0, fundi_amount=0, customer=self.customer, fundi=self.fundis[0], job=self.job
+        )
+        self.assertEqual(self.counts()[2:], (2, False))
+        payment.status = 'completed'
+        payment.save()
+        message.delete()
+        self.assertEqual(self.counts()[2:], (1, True))
+        payment.delete()
+        self.assertFalse(self.counts()[3])
+
+    def test_saving_a_stale_job_keeps_the_counters(self):
+        stale = Job.objects.get(pk=self.job.pk)
+        JobApplication.objects.create(job=self.job, fundi=self.fundis[0], message='Hi')
+        stale.title = 'Fix kitchen tap'
+        stale.save()
+        self.assertEqual(self.counts()[:2], (1, 1))
+        self.assertEqual(self.job.title, 'Fix kitchen tap')
+
+    def test_saving_a_deleted_job_inserts_it_again(self):
+        job = Job.objects.get(pk=self.job.pk)
+        Job.objects.filter(pk=job.pk).delete()
+        job.title = 'Fix kitchen tap'
+        job.save()
+        self.assertEqual(Job.objects.get(pk=job.pk).title, 'Fix kitchen tap')
+        self.assertEqual(self.counts(), (0, 0, 0, False))
+
+    def test_recount_repairs_drift(self):
+        JobApplication.objects.create(job=self.job, fundi=self.fundis[0], message='Hi')
+        Message.objects.create(job=self.job, sender=self.customer, recipient=self.fundis[0], content='Hi')
+        Job.objects.update(application_count=7, pending_application_count=0, message_count=0, has_completed_payment=True)
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn('Corrected 1 jobs', out.getvalue())
+        self.assertEqual(self.counts(), (1, 1, 1, False))
+        self.assertEqual(counters.recount(), 0)
+
+    def test_my_jobs_shows_the_counts(self):
+        for fundi in self.fundis[:2]:
+            JobApplication.objects.create(job=self.job, fundi=fundi, message='Hi')
+        self.client.force_login(self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('jobs:my_jobs'))
+        self.assertContains(response, '2 applications (2 pending)')
+        self.assertFalse([query for query in queries if 'jobs_jobapplication' in query['sql']])
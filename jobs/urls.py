@@ -13,6 +13,8 @@ urlpatterns = [
     path('<int:job_id>/delete/', views.job_delete, name='job_delete'),
     path('applications/', views.my_applications, name='my_applications'),
     path('my-jobs/', views.my_jobs, name='my_jobs'),
+    path('saved-searches/', views.saved_searches, name='saved_searches'),
+    path('saved-searches/<int:search_id>/delete/', views.saved_search_delete, name='saved_search_delete'),
     path('<int:job_id>/nudge/', views.nudge_fundis, name='nudge_fundis'),
     path('apply/<int:job_id>/', views.apply, name='apply'),
     path('<int:job_id>/messages/<int:fundi_id>/', views.job_messages, name='job_messages'),
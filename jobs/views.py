@@ -64,10 +64,13 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.http import JsonResponse
-from django.core.paginator import Paginator
+from core.pagination import CursorPaginator
 from users.models import User
 from django.db.models import Q
 
+# Most rows counted for the totals on my jobs / my applications
+MAX_COUNTED = 1000
+
 @login_required
 def job_messages(request, job_id, fundi_id):
     from .models import Message
@@ -176,38 +179,40 @@ def my_applications(request):
         return redirect('/')
     applications = JobApplication.objects.filter(fundi=request.user).select_related('job').order_by('-created_at')
     # Paginate applications
-    paginator = Paginator(applications, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = CursorPaginator(applications, 10, count_limit=MAX_COUNTED).page(request.GET.get('cursor'))
     return render(request, 'jobs/my_applications.html', {'page_obj': page_obj})
 
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse
-from django.core.paginator import Paginator
+from django.http import HttpResponseBadRequest, JsonResponse
+from core.pagination import CursorPaginator
 from users.models import User
+from . import facets, matching, percolate, search, similar
 
 @login_required
+@require_POST
 def nudge_fundis(request, job_id):
-    job = get_object_or_404(Job, id=job_id)
-    if request.user.active_role != 'customer' or job.customer != request.user:
+    job = get_object_or_404(Job.objects.select_related('category'), id=job_id)
+    if request.user.active_role != 'customer' or job.customer_id != request.user.id:
         messages.error(request, 'You are not authorized to nudge fundis for this job.')
-        return redirect('job_detail_jobs', job_id=job_id)
-    # Find fundis matching job location and category
-    fundis = User.objects.filter(active_role='fundi', location__icontains=job.location)
-    notified_count = 0
-    for fundi in fundis:
-        # For demo: use Django messages, but can be replaced with email/in-app notification
-        # Optionally filter by skills/category
-        notified_count += 1
+        return redirect('jobs:job_detail_jobs', job_id=job_id)
+    if job.status != 'open':
+        return HttpResponseBadRequest('Only open jobs can be nudged.')
+    # Available fundis with the job's skill nearby get an in-app notification and an email
+    notified_count = matching.nudge_fundis(job, request)
     messages.success(request, f'Nudged {notified_count} fundis near {job.location}.')
-    return redirect('job_detail_jobs', job_id=job_id)
+    return redirect('jobs:job_detail_jobs', job_id=job_id)
 from django.db.models import Q
-from .models import Job, JobApplication, Category, JobImage
-from .forms import JobForm, JobApplicationForm
+from core import gazetteer, geo, trigram
+from core.querybudget import query_budget
+from core.replicas import reads_from_replica
+from .models import Job, JobApplication, Category, JobImage, SavedSearch
+from .forms import JobForm, JobApplicationForm, SavedSearchForm
 
 
+@query_budget(12)
+@reads_from_replica
 def job_list(request):
     """List all jobs with filtering"""
     jobs = Job.objects.filter(status='open').order_by('-created_at')
@@ -219,25 +224,43 @@ def job_list(request):
     location_filter = request.GET.get('location', '')
     urgency_filter = request.GET.get('urgency', '')
     
+    similarity = trigram.parse_threshold(request.GET.get('similarity'))
     if search_query:
-        jobs = jobs.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        jobs = search.search(jobs, search_query, columns=('title', 'description'), fuzzy_threshold=similarity)
     
+    # Faceted filters are applied after the sidebar counts below
+    filters = {'category': Q(), 'urgency': Q(), 'location': Q()}
     if category_filter:
-        jobs = jobs.filter(category__name=category_filter)
+        filters['category'] = Q(category__name=category_filter)
     
+    location_key = None
     if location_filter:
-        jobs = jobs.filter(location__icontains=location_filter)
+        # Match the place and the estates inside it, not just the substring
+        place = gazetteer.resolve(location_filter, persist=False)
+        if place is not None:
+            filters['location'] = Q(place__in=place.area_ids())
+            location_key = place.pk
+        else:
+            filters['location'] = trigram.condition(Job, 'location', location_filter, similarity)
+            location_key = location_filter.lower()
         
     if urgency_filter:
-        jobs = jobs.filter(urgency=urgency_filter)
+        filters['urgency'] = Q(urgency=urgency_filter)
+    
+    # Distance filter, nearest first
+    within_km = geo.parse_km(request.GET.get('within_km'))
+    origin = geo.request_origin(request) if within_km else None
+    if origin:
+        jobs = geo.within_km(jobs, *origin, within_km)
+    
+    facet_counts = facets.counts(jobs, filters, [
+        'jobs', search.terms(search_query), category_filter, urgency_filter, location_key, within_km, origin,
+        similarity,
+    ])
+    jobs = jobs.filter(*filters.values())
     
     # Pagination
-    paginator = Paginator(jobs, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = CursorPaginator(jobs, 12).page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
@@ -246,6 +269,8 @@ def job_list(request):
         'category_filter': category_filter,
         'location_filter': location_filter,
         'urgency_filter': urgency_filter,
+        'within_km': within_km,
+        'facets': facet_counts,
     }
     
     return render(request, 'jobs/job_list.html', context)
@@ -263,7 +288,7 @@ def job_detail(request, job_id):
     payment_completed = False
     if request.user.is_authenticated and request.user.role == 'customer' and job.customer == request.user:
         # Check if payment for this job is completed
-        payment_completed = job.payments.filter(status='completed').exists()
+        payment_completed = job.has_completed_payment
         if payment_completed:
             applicants = job.applications.select_related('fundi').all()
 
@@ -272,6 +297,7 @@ def job_detail(request, job_id):
         'user_has_applied': user_has_applied,
         'applicants': applicants,
         'payment_completed': payment_completed,
+        'similar_jobs': similar.similar_jobs(job),
     }
     return render(request, 'jobs/job_detail.html', context)
 
@@ -295,8 +321,11 @@ def job_create(request):
             images = request.FILES.getlist('images')
             for image in images:
                 JobImage.objects.create(job=job, image=image)
+            # Alert fundis whose saved searches match, and find similar jobs, in the background
+            percolate.job_posted(job)
+            similar.job_posted(job)
             messages.success(request, 'Job posted successfully!')
-            return redirect('job_detail_jobs', job_id=job.id)
+            return redirect('jobs:job_detail_jobs', job_id=job.id)
     else:
         form = JobForm()
     return render(request, 'jobs/job_create.html', {'form': form})
@@ -309,7 +338,7 @@ def job_apply(request, job_id):
     
     if request.user.active_role != 'fundi':
         messages.error(request, 'Only Fundis can apply for jobs.')
-        return redirect('job_detail_jobs', job_id=job_id)
+        return redirect('jobs:job_detail_jobs', job_id=job_id)
     
     if not request.user.onboarding_complete:
         messages.error(request, 'Please complete your profile first.')
@@ -318,7 +347,7 @@ def job_apply(request, job_id):
     # Check if already applied
     if job.applications.filter(fundi=request.user).exists():
         messages.warning(request, 'You have already applied for this job.')
-        return redirect('job_detail_jobs', job_id=job_id)
+        return redirect('jobs:job_detail_jobs', job_id=job_id)
     
     if request.method == 'POST':
         form = JobApplicationForm(request.POST)
@@ -335,7 +364,7 @@ def job_apply(request, job_id):
                 url=f"/jobs/{job.id}/"
             )
             messages.success(request, 'Application submitted successfully!')
-            return redirect('job_detail_jobs', job_id=job_id)
+            return redirect('jobs:job_detail_jobs', job_id=job_id)
     else:
         form = JobApplicationForm()
     
@@ -352,7 +381,7 @@ def job_edit(request, job_id):
         if form.is_valid():
             form.save()
             messages.success(request, 'Job updated successfully!')
-            return redirect('job_detail_jobs', job_id=job.id)
+            return redirect('jobs:job_detail_jobs', job_id=job.id)
     else:
         form = JobForm(instance=job)
     
@@ -372,6 +401,7 @@ def job_delete(request, job_id):
     return render(request, 'jobs/job_delete.html', {'job': job})
 
 
+@query_budget(8)
 @login_required
 def my_applications(request):
     """Show user's job applications"""
@@ -379,14 +409,13 @@ def my_applications(request):
         messages.error(request, 'Only Fundis can view applications.')
         return redirect('dashboard')
     
-    applications = request.user.job_applications.all().order_by('-created_at')
-    paginator = Paginator(applications, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    applications = request.user.job_applications.select_related('job').order_by('-created_at')
+    page_obj = CursorPaginator(applications, 10, count_limit=MAX_COUNTED).page(request.GET.get('cursor'))
     
     return render(request, 'jobs/my_applications.html', {'page_obj': page_obj})
 
 
+@query_budget(8)
 @login_required
 def my_jobs(request):
     """Show user's posted jobs"""
@@ -395,8 +424,45 @@ def my_jobs(request):
         return redirect('dashboard')
     
     jobs = request.user.posted_jobs.all().order_by('-created_at')
-    paginator = Paginator(jobs, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = CursorPaginator(jobs, 10, count_limit=MAX_COUNTED).page(request.GET.get('cursor'))
     
     return render(request, 'jobs/my_jobs.html', {'page_obj': page_obj})
+
+
+@query_budget(12)
+@login_required
+def saved_searches(request):
+    """List a fundi's saved searches and save a new one"""
+    if request.user.active_role != 'fundi':
+        messages.error(request, 'Only Fundis can save searches.')
+        return redirect('dashboard')
+    
+    if request.method == 'POST':
+        form = SavedSearchForm(request.POST)
+        if form.is_valid():
+            saved_search = form.save(commit=False)
+            saved_search.user = request.user
+            saved_search.save()
+            messages.success(request, "Search saved. We'll let you know when a matching job is posted.")
+            return redirect('jobs:saved_searches')
+    else:
+        # Prefilled from the job list's filters
+        category = Category.objects.filter(name=request.GET.get('category', '')).first()
+        form = SavedSearchForm(initial={
+            'keywords': request.GET.get('search', ''),
+            'category': category,
+            'location': request.GET.get('location', ''),
+        })
+    
+    searches = request.user.saved_searches.select_related('category')
+    return render(request, 'jobs/saved_searches.html', {'form': form, 'searches': searches})
+
+
+@login_required
+@require_POST
+def saved_search_delete(request, search_id):
+    """Delete one of the user's saved searches"""
+    saved_search = get_object_or_404(SavedSearch, id=search_id, user=request.user)
+    saved_search.delete()
+    messages.success(request, 'Saved search deleted.')
+    return redirect('jobs:saved_searches')
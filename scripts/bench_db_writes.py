@@ -0,0 +1,124 @@
+"""Write throughput of the SQLite profile under concurrent writers.
+
+Usage:
+  python scripts/bench_db_writes.py --writers 8 --requests 200
+  python scripts/bench_db_writes.py --writers 8 --requests 200 --baseline
+
+Each writer thread plays one fundi sending messages about a job. A
+"request" is one transaction shaped like the send-message view: read the
+job, insert a Message, insert a Notification for the customer and touch the
+fundi's last_login. The script reports requests/sec, latency percentiles
+and how many requests failed (e.g. "database is locked").
+
+It runs against a throwaway database in a temporary file, created with the
+project's migrations, so it never touches real data. The profile is run
+with WAL on, as for a configured SQLITE_PATH. --baseline drops the
+profile's OPTIONS to compare against Django's stock settings (rollback
+journal, deferred transactions, 5 s timeout). The PostgreSQL profile has
+no benchmark.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fundiconnect.settings')
+os.environ['DATABASE_ENGINE'] = 'sqlite'
+os.environ['SQLITE_WAL'] = 'True'
+
+
+def writer(fundi_id, customer_id, job_id, requests, start, latencies, errors):
+    from django.db import OperationalError, connection, transaction
+    from django.utils import timezone
+    from jobs.models import Job, Message
+    from users.models import Notification, User
+
+    start.wait()
+    try:
+        for i in range(requests):
+            began = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    job = Job.objects.only('pk', 'title').get(pk=job_id)
+                    Message.objects.create(
+                        job_id=job.pk, sender_id=fundi_id, recipient_id=customer_id, content=f'Update {i}'
+                    )
+                    Notification.objects.create(user_id=customer_id, message=f'New message about {job.title}')
+                    User.objects.filter(pk=fundi_id).update(last_login=timezone.now())
+            except OperationalError:
+                errors.append(1)
+                continue
+            latencies.append(time.perf_counter() - began)
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per writer')
+    parser.add_argument('--baseline', action='store_true', help="Use Django's stock OPTIONS")
+    args = parser.parse_args()
+
+    import django
+    from django.conf import settings
+    django.setup()
+    from django.db import connection
+
+    database = settings.DATABASES['default']
+    workdir = tempfile.TemporaryDirectory()
+    database['TEST']['NAME'] = os.path.join(workdir.name, 'bench.sqlite3')
+    if args.baseline:
+        database['OPTIONS'] = {}
+        connection.settings_dict['OPTIONS'] = {}
+    profile = f"sqlite{' (baseline)' if args.baseline else ''}"
+    print(f'Creating the test database for {profile}...')
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        from jobs.models import Job
+        from users.models import User
+        customer = User.objects.create_user(username='bench-customer', email='bench-customer@example.com')
+        fundis = [
+            User.objects.create_user(username=f'bench-fundi-{n}', email=f'bench-fundi-{n}@example.com')
+            for n in range(args.writers)
+        ]
+        job = Job.objects.create(title='Fix leaking tap', description='Kitchen sink', customer=customer, location='Nairobi')
+        connection.close()
+
+        start = threading.Barrier(args.writers + 1)
+        latencies, errors = [], []
+        threads = [
+            threading.Thread(
+                target=writer, args=(fundi.pk, customer.pk, job.pk, args.requests, start, latencies, errors)
+            )
+            for fundi in fundis
+        ]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        workdir.cleanup()
+
+    done = len(latencies)
+    latencies.sort()
+    print(f'profile:      {profile}')
+    print(f'writers:      {args.writers} x {args.requests} requests')
+    print(f'requests/sec: {done / elapsed:.0f} ({done} ok in {elapsed:.2f} s)')
+    print(f'failed:       {len(errors)}')
+    if latencies:
+        p95 = latencies[min(done - 1, int(done * 0.95))]
+        print(f'latency:      p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+// Search-box suggestions from /api/autocomplete/ (see jobs/autocomplete.py).
+// Fills a <datalist> for every input with a data-autocomplete attribute;
+// its value picks the kinds of suggestion, e.g. "location".
+(function() {
+  document.querySelectorAll('input[data-autocomplete]').forEach(function(input) {
+    var list = document.createElement('datalist');
+    list.id = input.id + '-suggestions';
+    input.setAttribute('list', list.id);
+    input.after(list);
+    var timer = null;
+    input.addEventListener('input', function() {
+      clearTimeout(timer);
+      timer = setTimeout(function() {
+        var params = 'q=' + encodeURIComponent(input.value);
+        if (input.dataset.autocomplete) params += '&kind=' + encodeURIComponent(input.dataset.autocomplete);
+        fetch('/api/autocomplete/?' + params)
+          .then(response => response.json())
+          .then(data => {
+            list.replaceChildren.apply(list, data.suggestions.map(function(suggestion) {
+              var option = document.createElement('option');
+              option.value = suggestion.label;
+              return option;
+            }));
+          });
+      }, 150);
+    });
+  });
+})();
@@ -0,0 +1,79 @@
+// Decoder for the packed fundi map payloads (format=packed, /api/fundi-tiles/).
+// The layout is documented in core/packed.py; decode() returns the same
+// shape as the JSON responses.
+var FundiPacked = (function() {
+  var COORD_SCALE = 100000;
+  var FLAG_DELTA = 1;
+  var FLAG_CLUSTERS = 2;
+  var utf8 = new TextDecoder();
+
+  function decode(buffer) {
+    var view = new DataView(buffer);
+    var bytes = new Uint8Array(buffer);
+    var flags = view.getUint8(4);
+    var indexSize = view.getUint8(5);
+    var stringCount = view.getUint32(6, true);
+    var rows = view.getUint32(10, true);
+    var removedCount = view.getUint32(14, true);
+    var result = {
+      cursor: Number(view.getBigUint64(18, true)),
+      delta: !!(flags & FLAG_DELTA)
+    };
+    var offset = 26;
+    var strings = [];
+    for (var s = 0; s < stringCount; s++) {
+      var length = bytes[offset];
+      strings.push(utf8.decode(bytes.subarray(offset + 1, offset + 1 + length)));
+      offset += 1 + length;
+    }
+    function column(size, read, count) {
+      var values = new Array(count === undefined ? rows : count);
+      for (var i = 0; i < values.length; i++) {
+        values[i] = read(offset, size);
+        offset += size;
+      }
+      return values;
+    }
+    function u8(at) { return view.getUint8(at); }
+    function u32(at) { return view.getUint32(at, true); }
+    function i32(at) { return view.getInt32(at, true); }
+    function index(at) { return indexSize === 2 ? view.getUint16(at, true) : view.getUint32(at, true); }
+    var i;
+    if (flags & FLAG_CLUSTERS) {
+      var counts = column(4, u32), clat = column(4, i32), clng = column(4, i32), cskill = column(indexSize, index);
+      result.clusters = [];
+      for (i = 0; i < rows; i++) {
+        result.clusters.push({
+          count: counts[i],
+          latitude: clat[i] / COORD_SCALE,
+          longitude: clng[i] / COORD_SCALE,
+          skill: strings[cskill[i]] || null
+        });
+      }
+      return result;
+    }
+    var ids = column(4, u32), lat = column(4, i32), lng = column(4, i32), available = column(1, u8);
+    var names = column(indexSize, index), locations = column(indexSize, index), skillCounts = column(1, u8);
+    var total = skillCounts.reduce(function(a, b) { return a + b; }, 0);
+    var skillIds = column(indexSize, index, total);
+    var next = 0;
+    result.fundis = [];
+    for (i = 0; i < rows; i++) {
+      var skills = [];
+      for (var k = 0; k < skillCounts[i]; k++) skills.push(strings[skillIds[next++]]);
+      result.fundis.push({
+        id: ids[i],
+        name: strings[names[i]],
+        latitude: lat[i] / COORD_SCALE,
+        longitude: lng[i] / COORD_SCALE,
+        skills: skills,
+        location: strings[locations[i]],
+        available: available[i] === 1
+      });
+    }
+    if (result.delta) result.removed = column(4, u32, removedCount);
+    return result;
+  }
+
+  return {decode: decode};
+})();
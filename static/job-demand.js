@@ -0,0 +1,29 @@
+// Job-demand heatmap layer, fed by /api/job-demand/ (see core/demand.py).
+// Needs Leaflet and leaflet.heat. ``controls`` may hold category and
+// urgency <select> elements whose values filter the counts.
+var JobDemand = (function() {
+  function attach(map, controls) {
+    controls = controls || {};
+    var layer = L.heatLayer([], {radius: 30, blur: 20, maxZoom: 14});
+    function refresh() {
+      if (!map.hasLayer(layer)) return;
+      var params = ['bbox=' + map.getBounds().toBBoxString(), 'zoom=' + map.getZoom()];
+      if (controls.category && controls.category.value) params.push('category=' + encodeURIComponent(controls.category.value));
+      if (controls.urgency && controls.urgency.value) params.push('urgency=' + encodeURIComponent(controls.urgency.value));
+      fetch('/api/job-demand/?' + params.join('&'))
+        .then(response => response.json())
+        .then(data => {
+          var max = Math.max.apply(null, data.cells.map(cell => cell.count).concat([1]));
+          layer.setLatLngs(data.cells.map(cell => [cell.latitude, cell.longitude, cell.count / max]));
+        });
+    }
+    map.on('moveend', refresh);
+    map.on('overlayadd', function(e) { if (e.layer === layer) refresh(); });
+    [controls.category, controls.urgency].forEach(function(select) {
+      if (select) select.addEventListener('change', refresh);
+    });
+    return layer;
+  }
+
+  return {attach: attach};
+})();
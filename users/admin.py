@@ -43,7 +43,7 @@ class UserAdmin(BaseUserAdmin):
 
 class FundiProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'availability', 'rating', 'total_jobs_completed', 'hourly_rate', 'verification_status', 'verified_at')
-    list_filter = ('availability', 'rating', 'experience_years', 'verification_status')
+    list_filter = ('availability', 'rating', 'experience_years', 'verification_status', 'skill_set')
     search_fields = ('user__email', 'user__first_name', 'user__last_name', 'skills')
     readonly_fields = ('rating', 'total_jobs_completed', 'verified_at')
     inlines = [PortfolioImageInline]
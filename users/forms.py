@@ -97,8 +97,10 @@ class FundiOnboardingForm(forms.Form):
         # Handle portfolio images separately in the view
     
     def clean_skills(self):
+        from jobs import skills
         skills_str = self.cleaned_data['skills']
         skills_list = [skill.strip() for skill in skills_str.split(',') if skill.strip()]
         if len(skills_list) < 1:
             raise forms.ValidationError('Please enter at least one skill.')
-        return skills_list
\ No newline at end of file
+        # Catalogue names for known skills and synonyms ("plumber" -> "Plumbing")
+        return skills.canonical(skills_list)
\ No newline at end of file
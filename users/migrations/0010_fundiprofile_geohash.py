@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:03
+
+from django.db import migrations, models
+
+
+def backfill_geohash(apps, schema_editor):
+    from core import geo
+    FundiProfile = apps.get_model('users', 'FundiProfile')
+    profiles = list(FundiProfile.objects.filter(latitude__isnull=False, longitude__isnull=False))
+    for profile in profiles:
+        profile.geohash = geo.encode(profile.latitude, profile.longitude)
+    FundiProfile.objects.bulk_update(profiles, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_remove_user_role_user_active_role_user_roles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fundiprofile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='active_role',
+            field=models.CharField(default='customer', max_length=10),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
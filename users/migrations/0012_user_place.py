@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def resolve_user_places(apps, schema_editor):
+    from core import gazetteer
+    Place = apps.get_model('core', 'Place')
+    User = apps.get_model('users', 'User')
+    names = gazetteer.build_names(Place)
+    places = Place.objects.in_bulk()
+    for user in User.objects.exclude(location=''):
+        place = places.get(gazetteer.match(gazetteer.normalize(user.location), names))
+        if place is None:
+            continue
+        user.place = place
+        if user.latitude is None or user.longitude is None:
+            user.latitude, user.longitude = place.latitude, place.longitude
+        user.save(update_fields=['place', 'latitude', 'longitude'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_gazetteer'),
+        ('users', '0011_fundi_location_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='place',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='residents', to='core.place'),
+        ),
+        migrations.RunPython(resolve_user_places, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_user_place'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='url',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:35
+
+from django.db import migrations, models
+
+
+def link_skills(apps, schema_editor):
+    from core import clustering
+    from jobs import skills
+    FundiProfile = apps.get_model('users', 'FundiProfile')
+    names = skills.build_names(apps.get_model('jobs', 'Skill'))
+    for profile in FundiProfile.objects.all():
+        labels = skills.canonical(profile.skills or [], names)
+        if labels != profile.skills:
+            profile.skills = labels
+            profile.save(update_fields=['skills'])
+        profile.skill_set.set(skills.skill_ids(labels, names))
+    # Cluster rows are keyed by catalogue skill, so recount with the catalogue
+    clustering.rebuild(FundiProfile, apps.get_model('core', 'FundiCluster'), names)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_fundi_cluster'),
+        ('jobs', '0009_skill'),
+        ('users', '0013_notification_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fundiprofile',
+            name='skill_set',
+            field=models.ManyToManyField(blank=True, related_name='fundis', to='jobs.skill'),
+        ),
+        migrations.RunPython(link_skills, migrations.RunPython.noop),
+    ]
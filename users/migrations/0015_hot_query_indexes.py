@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_fundiprofile_skill_set'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='users_notif_user_created'),
+        ),
+    ]
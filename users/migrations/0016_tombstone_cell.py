@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:06
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def keep_latest_tombstones(apps, schema_editor):
+    # Older rows carry no cell: keep one per fundi, the latest
+    RemovedFundiLocation = apps.get_model('users', 'RemovedFundiLocation')
+    latest = RemovedFundiLocation.objects.values('user_id').annotate(latest=Max('pk')).values_list('latest', flat=True)
+    RemovedFundiLocation.objects.exclude(pk__in=list(latest)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='removedfundilocation',
+            name='cell',
+            field=models.CharField(blank=True, max_length=5),
+        ),
+        migrations.RunPython(keep_latest_tombstones, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='removedfundilocation',
+            unique_together={('user_id', 'cell')},
+        ),
+    ]
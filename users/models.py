@@ -8,9 +8,13 @@ from PIL import Image
 class Notification(models.Model):
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='notifications')
     message = models.TextField()
+    url = models.CharField(max_length=255, blank=True)  # Where the notification leads
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', '-created_at'], name='users_notif_user_created')]
+
     def __str__(self):
         return f"Notification for {self.user.email}: {self.message[:30]}"
 
@@ -20,11 +24,15 @@ class Notification(models.Model):
 from django.db import models
 
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from PIL import Image
 
 
 class User(AbstractUser):
+    # Shown on the fundi map, or deciding who is on it
+    MAP_FIELDS = ('active_role', 'first_name', 'last_name', 'location')
+
     email = models.EmailField(unique=True)
     roles = models.JSONField(default=list)  # e.g. ["customer", "fundi"]
     # Default to 'customer' so newly created customer accounts don't start in fundi mode
@@ -36,6 +44,8 @@ class User(AbstractUser):
     location = models.CharField(max_length=100, blank=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Gazetteer place resolved from `location` on save
+    place = models.ForeignKey('core.Place', on_delete=models.SET_NULL, null=True, blank=True, related_name='residents')
     profile_photo = models.ImageField(upload_to='customer_photos/', null=True, blank=True)
     id_document = models.ImageField(upload_to='customer_ids/', null=True, blank=True)
     date_joined = models.DateTimeField(auto_now_add=True)
@@ -48,6 +58,60 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_location = instance.__dict__.get('location')
+        from core import trigram
+        instance._indexed_text = trigram.indexed_text(instance)
+        if set(cls.MAP_FIELDS) <= set(field_names):
+            instance._loaded_map_fields = instance.map_fields()
+        return instance
+
+    def map_fields(self):
+        return tuple(getattr(self, name) for name in self.MAP_FIELDS)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is None or 'location' in update_fields) and \
+                self.location != getattr(self, '_loaded_location', None):
+            self.resolve_location()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'place', 'latitude', 'longitude'}
+        loaded = getattr(self, '_loaded_map_fields', None)
+        map_changed = (
+            not self._state.adding
+            and (update_fields is None or not set(update_fields).isdisjoint(self.MAP_FIELDS))
+            and self.map_fields() != loaded
+        )
+        # Switching in or out of fundi mode puts the fundi on the map or takes them off
+        role_changed = map_changed and loaded is not None and (
+            (loaded[0] == 'fundi') != (self.active_role == 'fundi')
+        )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if map_changed:
+                # Map clients polling with a cursor pick the fundi up again, or drop them
+                profile = FundiProfile.objects.filter(user_id=self.pk).first()
+                if profile is not None:
+                    profile.user = self
+                    profile.location_version = next_location_version()
+                    FundiProfile.objects.filter(pk=profile.pk).update(location_version=profile.location_version)
+                    state = profile.map_state()
+                    if role_changed and state is not None:
+                        from .signals import fundi_location_changed
+                        old, new = (None, state) if profile.on_map() else (state, None)
+                        fundi_location_changed.send(sender=FundiProfile, profile=profile, old=old, new=new)
+        self._loaded_location = self.location
+        self._loaded_map_fields = self.map_fields()
+
+    def resolve_location(self):
+        """Match `location` against the gazetteer and backfill missing coordinates."""
+        from core import gazetteer
+        self.place = gazetteer.resolve(self.location)
+        if self.place and (self.latitude is None or self.longitude is None):
+            self.latitude, self.longitude = self.place.latitude, self.place.longitude
+
     def has_role(self, role):
         return role in self.roles
 
@@ -62,6 +126,8 @@ class User(AbstractUser):
 class FundiProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='fundi_profile')
     skills = models.JSONField(default=list)  # Store skills as JSON array
+    # Catalogue skills matched from `skills`; filter on this, not the JSON
+    skill_set = models.ManyToManyField('jobs.Skill', blank=True, related_name='fundis')
     description = models.TextField(blank=True)
     experience_years = models.PositiveIntegerField(default=0)
     hourly_rate = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
@@ -70,6 +136,11 @@ class FundiProfile(models.Model):
     total_jobs_completed = models.PositiveIntegerField(default=0)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Spatial index for map viewport queries, derived from latitude/longitude on save
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
+    # Bumped whenever what the map shows of the fundi changes, so map clients
+    # can ask for changes since their last cursor
+    location_version = models.PositiveBigIntegerField(default=0, db_index=True, editable=False)
     # Verification fields
     profile_photo = models.ImageField(upload_to='fundi_photos/', null=True, blank=True)
     id_document = models.ImageField(upload_to='fundi_ids/', null=True, blank=True)
@@ -80,6 +151,106 @@ class FundiProfile(models.Model):
     def __str__(self):
         return f"{self.user.email} - Fundi Profile"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the map last saw so save() can report the difference
+        if {'latitude', 'longitude', 'availability', 'skills'} <= set(field_names):
+            instance._map_state = instance.map_state()
+        if 'skills' in field_names:
+            instance._loaded_skills = list(instance.skills or [])
+        return instance
+
+    def map_state(self):
+        """(latitude, longitude, available, skills) as shown on the map, or None."""
+        if self.latitude is None or self.longitude is None:
+            return None
+        return (float(self.latitude), float(self.longitude), self.availability, tuple(self.skills or ()))
+
+    def on_map(self):
+        """Whether the map shows the fundi at all: only while they are in fundi mode."""
+        return self.user.active_role == 'fundi'
+
+    def save(self, *args, **kwargs):
+        from core import geo
+        from jobs.skills import skill_ids
+        from .signals import fundi_location_changed
+        if (self.latitude is None or self.longitude is None) and self.user.place_id:
+            # No GPS fix yet: place the fundi at the centre of their gazetteer area
+            self.latitude, self.longitude = self.user.place.latitude, self.user.place.longitude
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'latitude', 'longitude'}
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        old_state, new_state = getattr(self, '_map_state', None), self.map_state()
+        # Only a change the map shows moves the fundi past map clients' cursors
+        moved = old_state != new_state or not hasattr(self, '_map_state')
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'geohash'} | ({'location_version'} if moved else set())
+        skills_changed = list(self.skills or []) != getattr(self, '_loaded_skills', None) and (
+            update_fields is None or 'skills' in update_fields
+        )
+        with transaction.atomic():
+            if moved:
+                self.location_version = next_location_version()
+            super().save(*args, **kwargs)
+            if skills_changed:
+                self.skill_set.set(skill_ids(self.skills or []))
+                self._loaded_skills = list(self.skills or [])
+            if old_state != new_state and self.on_map():
+                fundi_location_changed.send(sender=FundiProfile, profile=self, old=old_state, new=new_state)
+            self._map_state = new_state
+
+
+class LocationSequence(models.Model):
+    """Single-row counter handing out FundiProfile.location_version values."""
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Location sequence at {self.value}"
+
+
+# Geohash precision of RemovedFundiLocation cells (~5km)
+TOMBSTONE_PRECISION = 5
+
+
+class RemovedFundiLocation(models.Model):
+    """Tombstone so delta map clients learn which fundis to drop.
+
+    One row per fundi and map cell they have been shown in, holding the
+    location_version at which they last moved, changed or were deleted
+    there. A viewport only hears about the tombstones of its own cells.
+    """
+    user_id = models.BigIntegerField()
+    cell = models.CharField(max_length=TOMBSTONE_PRECISION, blank=True)
+    location_version = models.PositiveBigIntegerField(db_index=True)
+
+    class Meta:
+        unique_together = ['user_id', 'cell']
+
+    def __str__(self):
+        return f"Fundi {self.user_id} removed at {self.location_version}"
+
+
+def current_location_version():
+    return LocationSequence.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+
+
+def next_location_version(count=1):
+    """Advance the location sequence by ``count`` and return the new value,
+    the last of the ``count`` versions handed out.
+
+    Must run inside a transaction: the UPDATE holds the row lock until commit,
+    so versions become visible in the order they were handed out.
+    """
+    if not LocationSequence.objects.filter(pk=1).update(value=F('value') + count):
+        LocationSequence.objects.get_or_create(pk=1)
+        LocationSequence.objects.filter(pk=1).update(value=F('value') + count)
+    return LocationSequence.objects.values_list('value', flat=True).get(pk=1)
+
 
 class PortfolioImage(models.Model):
     fundi = models.ForeignKey(FundiProfile, on_delete=models.CASCADE, related_name='portfolio_images')
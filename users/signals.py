@@ -0,0 +1,64 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import Signal, receiver
+
+from .models import TOMBSTONE_PRECISION, FundiProfile, RemovedFundiLocation, next_location_version
+
+# Sent inside the saving transaction whenever a fundi's map state changes.
+# ``old`` and ``new`` are FundiProfile.map_state() tuples (None when the
+# fundi has no coordinates, was deleted or is not in fundi mode). Nothing is
+# sent for fundis out of fundi mode until User.save puts them back on.
+fundi_location_changed = Signal()
+
+
+@receiver(post_delete, sender=FundiProfile)
+def record_removed_fundi(sender, instance, **kwargs):
+    old_state = getattr(instance, '_map_state', None)
+    if old_state is not None and instance.on_map():
+        with transaction.atomic():
+            instance.location_version = next_location_version()
+            fundi_location_changed.send(sender=FundiProfile, profile=instance, old=old_state, new=None)
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_tombstones():
+    """Collect the tombstones of the changes signalled inside the block and
+    write them together on exit (used by batched location writes)."""
+    _deferred.tombstones = []
+    try:
+        yield
+        tombstones = _deferred.tombstones
+    finally:
+        _deferred.tombstones = None
+    _write_tombstones(tombstones)
+
+
+def _write_tombstones(tombstones):
+    # One row per (fundi, cell), carrying the latest version
+    rows = {(row.user_id, row.cell): row for row in tombstones}
+    RemovedFundiLocation.objects.bulk_create(
+        rows.values(), batch_size=500, update_conflicts=True,
+        unique_fields=['user_id', 'cell'], update_fields=['location_version'],
+    )
+
+
+@receiver(fundi_location_changed)
+def record_left_cell(sender, profile, old, new, **kwargs):
+    from core import geo
+    if old is None:
+        return
+    tombstone = RemovedFundiLocation(
+        user_id=profile.user_id, cell=geo.encode(old[0], old[1], TOMBSTONE_PRECISION),
+        location_version=profile.location_version,
+    )
+    tombstones = getattr(_deferred, 'tombstones', None)
+    if tombstones is not None:
+        tombstones.append(tombstone)
+    else:
+        _write_tombstones([tombstone])
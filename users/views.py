@@ -199,6 +199,7 @@ from django.contrib import messages
 from django.http import JsonResponse
 from allauth.account.views import SignupView
 from .models import User, FundiProfile, PortfolioImage
+from core.querybudget import query_budget
 from .forms import FundiSignupForm, FundiOnboardingForm
 import json
 
@@ -243,11 +244,12 @@ def fundi_onboarding(request):
             fundi_profile.profile_photo = form.cleaned_data['profile_photo']
             fundi_profile.id_document = form.cleaned_data['id_document']
             fundi_profile.verification_status = 'pending'
-            fundi_profile.save()
-            # Update user location and mark onboarding complete
+            # Update user location and mark onboarding complete; saved first so
+            # the profile can take its map position from the resolved place
             request.user.location = form.cleaned_data['location']
             request.user.onboarding_complete = True
             request.user.save()
+            fundi_profile.save()
             # Handle portfolio images
             portfolio_images = request.FILES.getlist('portfolio_images')
             for image in portfolio_images:
@@ -259,6 +261,7 @@ def fundi_onboarding(request):
     return render(request, 'users/fundi_onboarding.html', {'form': form})
 
 
+@query_budget(8)
 @login_required
 def profile_view(request):
     context = {'user': request.user}